@@ -631,7 +631,7 @@ async function tryTcpConnect({ ip, port, timeoutMs }) {
   });
 }
 
-async function scanTcpPort({ port, timeoutMs = 120, concurrency = 64 }) {
+async function scanTcpPort({ port, timeoutMs = 120, concurrency = 64, onDevice = null }) {
   const subnet = findDefaultSubnet();
   if (!subnet) return { subnet: null, devices: [] };
 
@@ -649,7 +649,10 @@ async function scanTcpPort({ port, timeoutMs = 120, concurrency = 64 }) {
       const ip = ips[idx++];
       if (!ip) return;
       const ok = await tryTcpConnect({ ip, port, timeoutMs });
-      if (ok) devices.push({ ip, port });
+      if (ok) {
+        devices.push({ ip, port });
+        if (onDevice) onDevice({ ip, port });
+      }
     }
   }
 
@@ -660,7 +663,7 @@ async function scanTcpPort({ port, timeoutMs = 120, concurrency = 64 }) {
   return { subnet, devices };
 }
 
-async function scanTcpPorts({ ports, timeoutMs = 120, concurrency = 64 }) {
+async function scanTcpPorts({ ports, timeoutMs = 120, concurrency = 64, onDevice = null }) {
   const list = normalizePorts(ports);
   if (!list.length) return { subnet: null, devices: [], portsTried: [] };
 
@@ -685,6 +688,7 @@ async function scanTcpPorts({ ports, timeoutMs = 120, concurrency = 64 }) {
         const ok = await tryTcpConnect({ ip, port, timeoutMs });
         if (ok) {
           devices.push({ ip, port });
+          if (onDevice) onDevice({ ip, port });
           break;
         }
       }
@@ -855,8 +859,12 @@ function main() {
     enabled: Boolean(agentCfg.enabled),
     pollEndpoint: envStr('ERP_RPC_POLL_ENDPOINT', '/api/method/rfidenter.rfidenter.api.agent_poll'),
     replyEndpoint: envStr('ERP_RPC_REPLY_ENDPOINT', '/api/method/rfidenter.rfidenter.api.agent_reply'),
+    replyBulkEndpoint: envStr('ERP_RPC_REPLY_BULK_ENDPOINT', '/api/method/rfidenter.rfidenter.api.agent_reply_bulk'),
+    progressEndpoint: envStr('ERP_RPC_PROGRESS_ENDPOINT', '/api/method/rfidenter.rfidenter.api.agent_progress'),
     pollMs: Math.max(150, envInt('ERP_RPC_POLL_MS', 800)),
     max: Math.max(1, envInt('ERP_RPC_POLL_MAX', 5)),
+    // >0: ERP holds agent_poll open until a command arrives (long poll) instead of us re-polling.
+    waitSec: Math.max(0, Math.min(55, envInt('ERP_RPC_WAIT_SEC', 20))),
   };
 
   function applyErpEffective(next, { broadcast = false } = {}) {
@@ -1048,23 +1056,100 @@ function main() {
   }
 
   async function rpcPollOnce() {
-    const msg = await erpPost(rpcCfg.pollEndpoint, { agent_id: agentCfg.agentId, max: rpcCfg.max, ts: Date.now() });
+    const msg = await erpPost(rpcCfg.pollEndpoint, {
+      agent_id: agentCfg.agentId,
+      max: rpcCfg.max,
+      wait_sec: rpcCfg.waitSec,
+      ts: Date.now(),
+    });
     const commands = Array.isArray(msg?.commands) ? msg.commands : [];
-    return commands;
+    // `waited` is only set by servers that support long polls and actually blocked (not `busy`).
+    return { commands, waited: Boolean(msg?.waited) };
   }
 
-  async function rpcReply({ requestId, ok, result, error }) {
-    await erpPost(rpcCfg.replyEndpoint, {
-      agent_id: agentCfg.agentId,
+  // Group commit: items pushed while a send is in flight go out together in the next send.
+  function createBatcher(send) {
+    let items = [];
+    let inflight = null;
+    const run = async () => {
+      while (items.length) {
+        const batch = items;
+        items = [];
+        try {
+          // eslint-disable-next-line no-await-in-loop
+          await send(batch);
+        } catch (e) {
+          try {
+            sseBroadcast('log', { level: 'warn', message: `RPC yuborish xatosi: ${String(e && e.message ? e.message : e)}` });
+          } catch {
+            // ignore
+          }
+        }
+      }
+      inflight = null;
+    };
+    return {
+      push(item) {
+        items.push(item);
+        if (!inflight) inflight = run();
+        return inflight;
+      },
+      flush() {
+        return inflight || Promise.resolve();
+      },
+    };
+  }
+
+  // After a failed bulk/progress call (e.g. an older ERP without the endpoint) retry it only later.
+  const ENDPOINT_RETRY_MS = 5 * 60 * 1000;
+  let bulkReplyRetryAt = 0;
+  const replyBatcher = createBatcher(async (batch) => {
+    if (batch.length > 1 && Date.now() >= bulkReplyRetryAt) {
+      try {
+        await erpPost(rpcCfg.replyBulkEndpoint, { agent_id: agentCfg.agentId, replies: batch });
+        return;
+      } catch (e) {
+        bulkReplyRetryAt = Date.now() + ENDPOINT_RETRY_MS;
+      }
+    }
+    for (const r of batch) {
+      // eslint-disable-next-line no-await-in-loop
+      await erpPost(rpcCfg.replyEndpoint, { agent_id: agentCfg.agentId, ...r, ts: Date.now() });
+    }
+  });
+
+  let progressRetryAt = 0;
+  const progressBatcher = createBatcher(async (batch) => {
+    if (Date.now() < progressRetryAt) return;
+    const byRequest = new Map();
+    for (const { requestId, chunk } of batch) {
+      if (!byRequest.has(requestId)) byRequest.set(requestId, []);
+      byRequest.get(requestId).push(chunk);
+    }
+    for (const [requestId, chunks] of byRequest) {
+      try {
+        // eslint-disable-next-line no-await-in-loop
+        await erpPost(rpcCfg.progressEndpoint, { agent_id: agentCfg.agentId, request_id: requestId, chunks });
+      } catch (e) {
+        // Progress is best-effort; the final reply still carries the full result.
+        progressRetryAt = Date.now() + ENDPOINT_RETRY_MS;
+        return;
+      }
+    }
+  });
+
+  async function queueReply({ requestId, ok, result, error }) {
+    // Partial results must reach ERP before the final reply.
+    await progressBatcher.flush();
+    replyBatcher.push({
       request_id: requestId,
       ok: Boolean(ok),
       result: ok ? result : null,
       error: ok ? '' : String(error || 'Unknown error'),
-      ts: Date.now(),
     });
   }
 
-  async function execRpcCommand({ cmd, args }) {
+  async function execRpcCommand({ cmd, args, progress = () => {} }) {
     const c = String(cmd || '').trim();
     const a = args && typeof args === 'object' ? args : {};
 
@@ -1074,9 +1159,10 @@ function main() {
       const ports = normalizePorts(a?.ports);
       const fallback = normalizePorts([a?.port, ...DEFAULT_TCP_PORTS]);
       const list = ports.length ? ports : fallback.length ? fallback : DEFAULT_TCP_PORTS;
+      const onDevice = (device) => progress({ device });
       return list.length <= 1
-        ? await scanTcpPort({ port: list[0] || DEFAULT_TCP_PORTS[0], timeoutMs: 120, concurrency: 64 })
-        : await scanTcpPorts({ ports: list, timeoutMs: 120, concurrency: 64 });
+        ? await scanTcpPort({ port: list[0] || DEFAULT_TCP_PORTS[0], timeoutMs: 120, concurrency: 64, onDevice })
+        : await scanTcpPorts({ ports: list, timeoutMs: 120, concurrency: 64, onDevice });
     }
 
     if (c === 'ANTENNA_SCAN') {
@@ -1091,6 +1177,7 @@ function main() {
         // eslint-disable-next-line no-await-in-loop
         const r = await bridge.request('MEASURE_RETURN_LOSS', { freqKhz, ant: i });
         results.push(r);
+        progress({ ant: i, result: r });
       }
       return { freqKhz, results };
     }
@@ -1112,12 +1199,12 @@ function main() {
         }
 
         try {
-          const commands = await rpcPollOnce();
+          const { commands, waited } = await rpcPollOnce();
           if (!commands.length) {
             failCount = 0;
-            // Small idle sleep to reduce CPU/network
+            // A long poll already waited server-side; otherwise a small idle sleep to reduce CPU/network.
             // eslint-disable-next-line no-await-in-loop
-            await sleep(rpcCfg.pollMs);
+            if (!waited) await sleep(rpcCfg.pollMs);
             continue;
           }
 
@@ -1135,20 +1222,24 @@ function main() {
               if (issuedAt && Date.now() - issuedAt > (timeoutSec + 5) * 1000) {
                 // Don't execute stale commands if the agent was offline.
                 // eslint-disable-next-line no-await-in-loop
-                await rpcReply({ requestId, ok: false, error: 'Expired (agent offline?)' });
+                await queueReply({ requestId, ok: false, error: 'Expired (agent offline?)' });
                 continue;
               }
 
+              const progress = (chunk) => progressBatcher.push({ requestId, chunk });
               // eslint-disable-next-line no-await-in-loop
-              const result = await execRpcCommand({ cmd, args });
+              const result = await execRpcCommand({ cmd, args, progress });
               // eslint-disable-next-line no-await-in-loop
-              await rpcReply({ requestId, ok: true, result });
+              await queueReply({ requestId, ok: true, result });
             } catch (e) {
               const msg = String(e && e.message ? e.message : e);
               // eslint-disable-next-line no-await-in-loop
-              await rpcReply({ requestId, ok: false, error: msg });
+              await queueReply({ requestId, ok: false, error: msg });
             }
           }
+          // Deliver this batch's replies before claiming more work.
+          // eslint-disable-next-line no-await-in-loop
+          await replyBatcher.flush();
         } catch (e) {
           failCount += 1;
           const wait = Math.min(5000, 300 + failCount * 200);
@@ -37,6 +37,11 @@ def edge_product_switch(**kwargs):
 	return _api.edge_product_switch(**kwargs)
 
 
+@frappe.whitelist()
+def query_edge_events(**kwargs):
+	return _api.query_edge_events(**kwargs)
+
+
 @frappe.whitelist()
 def agent_enqueue(**kwargs):
 	return _api.agent_enqueue(**kwargs)
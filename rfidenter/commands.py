@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rfidenter-rebuild-batch-state")
+@click.option(
+	"--device", "devices", multiple=True, help="Device ID to rebuild (repeatable). Default: all devices."
+)
+@click.option("--repair", is_flag=True, default=False, help="Overwrite RFID Batch State rows that drifted.")
+@click.option(
+	"--inline", is_flag=True, default=False, help="Replay in this process instead of background workers."
+)
+@pass_context
+def rebuild_batch_state(context, devices, repair, inline):
+	"""Replay RFID Edge Event logs to verify (and optionally repair) RFID Batch State."""
+	import frappe
+
+	from rfidenter.rfidenter import batch_projection
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		result = batch_projection.rebuild_all(list(devices) or None, repair=repair, enqueue=not inline)
+		frappe.db.commit()
+	finally:
+		frappe.destroy()
+
+	if not inline:
+		click.echo(f"Queued {result.get('queued', 0)} device rebuild job(s) on the long queue.")
+		return
+	for row in result.get("results") or []:
+		status = "ok" if row.get("consistent") else ("repaired" if row.get("repaired") else "DRIFT")
+		click.echo(f"{row.get('device_id')}: {status} ({row.get('events', 0)} events)")
+		for field, values in (row.get("diff") or {}).items():
+			click.echo(f"  {field}: {values.get('current')!r} -> {values.get('projected')!r}")
+
+
+@click.command("rfidenter-scale-fsm-bench")
+@click.option("--placements", default=200, type=int, help="Synthetic placements when no --device is given.")
+@click.option("--seed", default=0, type=int, help="Random seed for the synthetic stream.")
+@click.option("--device", default=None, help="Replay this scale's recorded readings instead (needs --site).")
+@click.option("--since", default=None, help="Replay readings received at or after this datetime.")
+@click.option(
+	"--source",
+	type=click.Choice(["readings", "events", "history"]),
+	default="history",
+	help="Recorded data source: history is the raw ring buffer; readings and events are deadband-filtered.",
+)
+@pass_context
+def scale_fsm_bench(context, placements, seed, device, since, source):
+	"""Benchmark stable-weight FSM filter settings (lock latency, false-lock rate)."""
+	from rfidenter.rfidenter import scale_fsm
+
+	grid = scale_fsm.default_grid()
+	if not device:
+		rows = scale_fsm.benchmark(grid, placements=placements, seed=seed)
+		for row in rows:
+			p = row["params"]
+			click.echo(
+				f"slow_tau={p['slow_tau_ms']:.0f}ms band={p['settle_band_kg']}kg settle={p['settle_ms']:.0f}ms: "
+				f"locks={row['locks']} missed={row['missed']} false={row['false_lock_rate']:.2%} "
+				f"latency mean={row['latency_ms_mean']}ms p95={row['latency_ms_p95']}ms "
+				f"({row['samples_per_sec']} samples/s)"
+			)
+		return
+
+	import frappe
+
+	from rfidenter.rfidenter import scale_stream
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		stream = scale_stream.load_recorded_stream(device, since=since, source=source)
+	finally:
+		frappe.destroy()
+
+	# Recorded data has no ground truth: report lock/pause counts so settings can be compared.
+	click.echo(f"{device}: {len(stream['ts'])} readings ({source})")
+	if source != "history":
+		click.echo(
+			f"Warning: {source} only holds readings the deadband let through, so settle times and "
+			"false locks differ from the raw stream. Use --source history for raw readings."
+		)
+	filters: dict[tuple, list[float]] = {}
+	for overrides in grid:
+		result = scale_fsm.run(stream["ts"], stream["weights"], overrides, filters=filters)
+		p = scale_fsm.make_params(overrides)
+		click.echo(
+			f"slow_tau={p['slow_tau_ms']:.0f}ms band={p['settle_band_kg']}kg settle={p['settle_ms']:.0f}ms: "
+			f"locks={len(result['locks'])} pauses={len(result['pauses'])}"
+		)
+
+
+commands = [rebuild_batch_state, scale_fsm_bench]
@@ -171,6 +171,22 @@ before_migrate = "rfidenter.install.before_migrate"
 # 	],
 # }
 
+scheduler_events = {
+	"cron": {
+		"* * * * *": [
+			"rfidenter.rfidenter.edge_seq.detect_stalls",
+			"rfidenter.rfidenter.edge_consumer.dispatch",
+		],
+		"*/5 * * * *": [
+			"rfidenter.rfidenter.agent_registry.prune_stale",
+		],
+	},
+	"daily_long": [
+		"rfidenter.rfidenter.edge_archive.archive_closed_months",
+		"rfidenter.rfidenter.retention.run_retention",
+	],
+}
+
 # Testing
 # -------
 
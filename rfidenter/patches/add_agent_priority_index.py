@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import frappe
+
+from rfidenter.patches.add_edge_event_indexes import _add_index
+from rfidenter.rfidenter import agent_queue
+
+
+def execute() -> None:
+	if not frappe.db.table_exists("RFID Agent Request"):
+		return
+	# Index first: ALTER TABLE after a write in the same transaction is refused as an implicit commit.
+	# agent_poll hands out queued requests by priority class, oldest first within a class.
+	_add_index(
+		"tabRFID Agent Request",
+		"idx_agent_status_priority_created",
+		["agent_id", "status", "priority", "creation"],
+	)
+	# Rows from before the column existed are normal priority; left NULL they would sort ahead of
+	# urgent ones.
+	frappe.db.sql(
+		"UPDATE `tabRFID Agent Request` SET `priority`=%s WHERE `priority` IS NULL",
+		(agent_queue.DEFAULT_PRIORITY,),
+	)
@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+import frappe
+
+from rfidenter.patches.add_edge_event_indexes import _add_index
+
+
+def execute() -> None:
+	# Keyset pagination in query_edge_events walks (received_at, name), optionally per event_type.
+	if frappe.db.table_exists("RFID Edge Event"):
+		_add_index("tabRFID Edge Event", "idx_received_name", ["received_at", "name"])
+		_add_index("tabRFID Edge Event", "idx_type_received_name", ["event_type", "received_at", "name"])
@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+import frappe
+
+from rfidenter.patches.add_edge_event_indexes import _add_index
+
+
+def execute() -> None:
+	# Batch state projection replays each device's events in (received_at, seq) order.
+	if frappe.db.table_exists("RFID Edge Event"):
+		_add_index("tabRFID Edge Event", "idx_device_received_seq", ["device_id", "received_at", "seq"])
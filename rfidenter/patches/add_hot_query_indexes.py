@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import frappe
+
+from rfidenter.patches.add_edge_event_indexes import _add_index
+
+
+def execute() -> None:
+	# zebra_list_epcs: newest first filtered by status, answered from the index alone.
+	if frappe.db.table_exists("RFID Zebra Tag"):
+		_add_index("tabRFID Zebra Tag", "idx_modified_status_epc", ["modified", "status", "epc"])
+
+	# get_saved_tags without a date orders the whole table by last_seen or reads.
+	if frappe.db.table_exists("RFID Saved Tag"):
+		_add_index("tabRFID Saved Tag", "idx_last_seen", ["last_seen"])
+		_add_index("tabRFID Saved Tag", "idx_reads", ["reads"])
+
+	# get_saved_tags for one day, in each supported order; (day, ...) also serves retention's day range.
+	if frappe.db.table_exists("RFID Saved Tag Day"):
+		_add_index("tabRFID Saved Tag Day", "idx_day_last_seen", ["day", "last_seen"])
+		_add_index("tabRFID Saved Tag Day", "idx_day_reads", ["day", "reads"])
+		_add_index("tabRFID Saved Tag Day", "idx_day_epc", ["day", "epc"])
+
+	# agent_poll reclaims Sent requests whose lease expired.
+	if frappe.db.table_exists("RFID Agent Request"):
+		_add_index(
+			"tabRFID Agent Request", "idx_agent_status_lease", ["agent_id", "status", "lease_expires_at"]
+		)
@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+import frappe
+
+from rfidenter.patches.add_edge_event_indexes import _add_index
+
+
+def execute() -> None:
+	# Retention purges walk these columns in index order (`modified` is indexed by Frappe already;
+	# RFID Saved Tag Day's `day` range is served by the (day, ...) indexes from add_hot_query_indexes).
+	if frappe.db.table_exists("RFID Edge Event"):
+		_add_index("tabRFID Edge Event", "idx_processed_received", ["processed", "received_at"])
@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+import frappe
+
+from rfidenter.patches.add_edge_event_indexes import _add_index
+
+
+def execute() -> None:
+	if not frappe.db.table_exists("RFID Scale Reading"):
+		return
+	# Rollups and replays scan one device's time range; retention walks creation.
+	_add_index("tabRFID Scale Reading", "idx_device_ts", ["device", "ts_ms"])
+	_add_index("tabRFID Scale Reading", "idx_creation", ["creation"])
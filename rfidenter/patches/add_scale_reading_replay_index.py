@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+import frappe
+
+from rfidenter.patches.add_edge_event_indexes import _add_index
+
+
+def execute() -> None:
+	# Batch state projection reads one device's readings in (creation, seq) order next to its edge events.
+	if frappe.db.table_exists("RFID Scale Reading"):
+		_add_index("tabRFID Scale Reading", "idx_device_creation_seq", ["device", "creation", "seq"])
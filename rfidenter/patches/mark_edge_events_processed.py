@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import frappe
+
+from rfidenter.patches.add_edge_event_indexes import _add_index
+
+
+def execute() -> None:
+	if not frappe.db.table_exists("RFID Edge Event"):
+		return
+
+	# edge_consumer claims pending events per device in (received_at, seq) order.
+	_add_index(
+		"tabRFID Edge Event",
+		"idx_processed_device_received",
+		["processed", "device_id", "received_at", "seq"],
+	)
+
+	# Events recorded before the consumer existed were already handled inline during ingestion.
+	while True:
+		frappe.db.sql("UPDATE `tabRFID Edge Event` SET `processed`=1 WHERE `processed`=0 LIMIT 5000")
+		affected = int(frappe.db._cursor.rowcount or 0)
+		frappe.db.commit()
+		if affected < 5000:
+			break
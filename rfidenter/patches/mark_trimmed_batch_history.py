@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import frappe
+
+from rfidenter.rfidenter import retention
+
+
+def execute() -> None:
+	if not frappe.db.table_exists("RFID Batch State"):
+		return
+	# Devices that existed before the oldest event still in the live tables may have lost history
+	# to archival or retention before it was tracked per device.
+	floors = []
+	if frappe.db.table_exists("RFID Edge Event Archive"):
+		archived = frappe.db.sql("SELECT MAX(`last_received_at`) FROM `tabRFID Edge Event Archive`")
+		if archived and archived[0][0]:
+			floors.append(archived[0][0])
+	for policy in retention.get_policies().values():
+		if policy.get("device") and int(policy.get("days") or 0) > 0:
+			floors.append(frappe.utils.add_days(frappe.utils.now_datetime(), -int(policy["days"])))
+	if not floors:
+		return
+	frappe.db.sql(
+		"""
+		UPDATE `tabRFID Batch State` SET `history_trimmed_at`=%s
+		WHERE `history_trimmed_at` IS NULL AND `creation` < %s
+		""",
+		(frappe.utils.now_datetime(), max(floors)),
+	)
@@ -0,0 +1,551 @@
+from __future__ import annotations
+
+import datetime
+import json
+import math
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+import frappe
+
+from rfidenter.rfidenter import site_settings
+
+# Redis transport for agent RPC. Per agent:
+#   QUEUE_PREFIX + agent                 queued "normal" request ids (RPUSH / claimed from the left)
+#   QUEUE_PREFIX + agent + ":urgent"     same for "urgent" requests, drained before the others
+#   QUEUE_PREFIX + agent + ":bulk"       same for "bulk" requests, drained last
+#   QUEUE_PREFIX + agent + ":processing" ids handed to the agent and not yet replied
+#   QUEUE_PREFIX + agent + ":leases"     sorted set id -> lease expiry (ms); expired ids are requeued
+#   REQ_PREFIX + request_id              request snapshot (JSON), expires after timeout + grace
+#   REPLY_PREFIX + request_id            reply (JSON), kept REPLY_TTL_SEC for agent_result
+#   QUEUE_PREFIX + agent + ":notify"     wake-up tokens for long-polling agent_poll calls
+#   REPLY_PREFIX + request_id + ":notify" wake-up token for agent_wait_result calls
+#   PROGRESS_PREFIX + request_id         partial results (JSON list items) of a long-running request
+#   BROADCAST_PREFIX + broadcast_id      agent -> request_id map of one agent_broadcast call
+# RFID Agent Request rows are written by a background job as an audit log only.
+# The reply keys are also used by the DB transport, as a cache of terminal results.
+QUEUE_PREFIX = "rfidenter_agent_queue:"
+REQ_PREFIX = "rfidenter_agent_req:"
+REPLY_PREFIX = "rfidenter_agent_reply:"
+PROGRESS_PREFIX = "rfidenter_agent_progress:"
+BROADCAST_PREFIX = "rfidenter_agent_broadcast:"
+DOCTYPE = "RFID Agent Request"
+REQ_GRACE_SEC = 300
+REPLY_TTL_SEC = 600
+PROGRESS_MAX_CHUNKS = 5000
+STATUS_RANK = {"Queued": 0, "Sent": 1, "Done": 2, "Failed": 2}
+# Priority classes, lowest value first. Commands without an explicit priority get one from
+# COMMAND_PRIORITY (or the `rfidenter_agent_command_priority` site setting), else "normal".
+PRIORITIES = {"urgent": 0, "normal": 1, "bulk": 2}
+DEFAULT_PRIORITY = PRIORITIES["normal"]
+COMMAND_PRIORITY = {
+	"ZEBRA_PRINT_ZPL": "urgent",
+	"ZEBRA_ENCODE_BATCH": "urgent",
+	"STOP_READ": "urgent",
+	"DISCONNECT": "urgent",
+	"SCAN_TCP": "bulk",
+	"ANTENNA_SCAN": "bulk",
+	"LIST_SERIAL": "bulk",
+	"MEASURE_RETURN_LOSS": "bulk",
+	"ZEBRA_USB_DEVICES": "bulk",
+}
+LONG_POLL_SLOTS_KEY = "rfidenter_agent_long_poll_slots"
+RESULT_WAIT_SLOTS_KEY = "rfidenter_agent_result_wait_slots"
+# Blocking waits park a web worker. Agents (agent_poll) and UI pages (agent_wait_result) get
+# separate slot pools so open pages can never starve the agents' long polls.
+SLOT_POOLS = {
+	"poll": (LONG_POLL_SLOTS_KEY, "rfidenter_agent_long_poll_workers"),
+	"result": (RESULT_WAIT_SLOTS_KEY, "rfidenter_agent_result_wait_workers"),
+}
+NOTIFY_TTL_SEC = 60
+
+# Move one id from the first non-empty lane (KEYS[1..n-2], in priority order) to the processing
+# list and lease it in the same step, so a worker dying between the two can never leave an id
+# that is neither queued nor leased. LPOP + RPUSH inside the script is as atomic as LMOVE and,
+# like the whole-second BLPOP in wait_notify, works on Redis servers older than 6.2.
+_CLAIM_LUA = """
+local n = #KEYS - 2
+for i = 1, n do
+	local rid = redis.call('LPOP', KEYS[i])
+	if rid then
+		redis.call('RPUSH', KEYS[n + 1], rid)
+		redis.call('ZADD', KEYS[n + 2], ARGV[1], rid)
+		return rid
+	end
+end
+return false
+"""
+
+# Requeue ids whose lease ran out, oldest first, at the head of the given lane (the urgent one:
+# these were due already).
+_REAP_LUA = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1], 'LIMIT', 0, 100)
+for i = #ids, 1, -1 do
+	redis.call('ZREM', KEYS[3], ids[i])
+	redis.call('LREM', KEYS[2], 0, ids[i])
+	redis.call('LPUSH', KEYS[1], ids[i])
+end
+return #ids
+"""
+
+_scripts: dict[str, Any] = {}
+
+
+def is_enabled() -> bool:
+	"""`rfidenter_agent_transport: "redis"` routes agent RPC through Redis instead of the DocType."""
+
+	return str(site_settings.get("rfidenter_agent_transport", "db") or "").strip().lower() == "redis"
+
+
+def _now_ms() -> int:
+	return int(datetime.datetime.now(tz=datetime.timezone.utc).timestamp() * 1000)
+
+
+def _str(raw: Any) -> str:
+	return raw.decode() if isinstance(raw, (bytes, bytearray)) else str(raw)
+
+
+def _keys(agent_id: str) -> list[bytes]:
+	cache = frappe.cache()
+	base = f"{QUEUE_PREFIX}{agent_id}"
+	return [cache.make_key(base), cache.make_key(f"{base}:processing"), cache.make_key(f"{base}:leases")]
+
+
+def _lane_keys(agent_id: str) -> list[bytes]:
+	"""Queue keys per priority class, in PRIORITIES order (the normal lane is the plain queue key)."""
+
+	cache = frappe.cache()
+	base = f"{QUEUE_PREFIX}{agent_id}"
+	return [cache.make_key(f"{base}:urgent"), cache.make_key(base), cache.make_key(f"{base}:bulk")]
+
+
+def priority_for(command: str, requested: Any = None) -> int:
+	"""Priority class (0 = urgent .. 2 = bulk) from an explicit name/number or the command's default."""
+
+	if requested not in (None, ""):
+		name = str(requested).strip().lower()
+		if name in PRIORITIES:
+			return PRIORITIES[name]
+		try:
+			return max(0, min(len(PRIORITIES) - 1, int(name)))
+		except Exception:
+			frappe.throw(f"priority noto‘g‘ri: {requested}", frappe.ValidationError)
+	overrides = site_settings.get("rfidenter_agent_command_priority", None)
+	mapping = {**COMMAND_PRIORITY, **(overrides if isinstance(overrides, dict) else {})}
+	return PRIORITIES.get(str(mapping.get(command) or "").strip().lower(), DEFAULT_PRIORITY)
+
+
+def deadline_passed(request: dict[str, Any], now_ms: int | None = None) -> bool:
+	"""True once the requester stopped waiting (request_ts + timeout_sec), so delivery is pointless."""
+
+	timeout = int(request.get("timeout_sec") or 0)
+	request_ts = int(request.get("request_ts") or 0)
+	if timeout <= 0 or not request_ts:
+		return False
+	return (now_ms if now_ms is not None else _now_ms()) - request_ts > timeout * 1000
+
+
+def _script(name: str, source: str):
+	script = _scripts.get(name)
+	if script is None:
+		script = _scripts[name] = frappe.cache().register_script(source)
+	return script
+
+
+def _dump(value: dict[str, Any]) -> str:
+	return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def _load(raw: Any) -> dict[str, Any] | None:
+	if raw is None:
+		return None
+	try:
+		value = json.loads(_str(raw))
+	except Exception:
+		return None
+	return value if isinstance(value, dict) else None
+
+
+def get_request(request_id: str) -> dict[str, Any] | None:
+	cache = frappe.cache()
+	return _load(cache.get(cache.make_key(f"{REQ_PREFIX}{request_id}")))
+
+
+def get_reply(request_id: str) -> dict[str, Any] | None:
+	cache = frappe.cache()
+	return _load(cache.get(cache.make_key(f"{REPLY_PREFIX}{request_id}")))
+
+
+def _mget(prefix: str, ids: list[str]) -> list[dict[str, Any] | None]:
+	if not ids:
+		return []
+	cache = frappe.cache()
+	return [_load(raw) for raw in cache.mget([cache.make_key(f"{prefix}{i}") for i in ids])]
+
+
+def get_requests(request_ids: list[str]) -> list[dict[str, Any] | None]:
+	return _mget(REQ_PREFIX, request_ids)
+
+
+def get_replies(request_ids: list[str]) -> list[dict[str, Any] | None]:
+	return _mget(REPLY_PREFIX, request_ids)
+
+
+def save_broadcast(broadcast_id: str, record: dict[str, Any], ttl_sec: int) -> None:
+	cache = frappe.cache()
+	cache.set(cache.make_key(f"{BROADCAST_PREFIX}{broadcast_id}"), _dump(record), ex=ttl_sec)
+
+
+def get_broadcast(broadcast_id: str) -> dict[str, Any] | None:
+	cache = frappe.cache()
+	return _load(cache.get(cache.make_key(f"{BROADCAST_PREFIX}{broadcast_id}")))
+
+
+def _reply_notify_key(request_id: str) -> bytes:
+	return frappe.cache().make_key(f"{REPLY_PREFIX}{request_id}:notify")
+
+
+def _save_reply(pipe, request_id: str, reply: dict[str, Any], requested_by: str | None) -> None:
+	cache = frappe.cache()
+	pipe.set(
+		cache.make_key(f"{REPLY_PREFIX}{request_id}"),
+		_dump({**reply, "requested_by": requested_by}),
+		ex=REPLY_TTL_SEC,
+	)
+	notify_key = _reply_notify_key(request_id)
+	pipe.rpush(notify_key, 1)
+	pipe.expire(notify_key, REPLY_TTL_SEC)
+
+
+def store_expired(request_id: str, requested_by: str | None) -> None:
+	store_reply(request_id, {"request_id": request_id, "expired": True}, requested_by)
+
+
+def store_reply(request_id: str, reply: dict[str, Any], requested_by: str | None) -> None:
+	"""Cache a terminal result (a reply, or `{"expired": True}`) and wake agent_wait_result callers."""
+
+	try:
+		pipe = frappe.cache().pipeline(transaction=True)
+		_save_reply(pipe, request_id, reply, requested_by)
+		pipe.execute()
+	except Exception:
+		frappe.log_error(title="RFIDenter agent reply cache failed", message=frappe.get_traceback())
+
+
+def wait_reply(request_id: str, timeout_sec: float) -> bool:
+	"""Block until a terminal result is stored for the request or the timeout passes."""
+
+	if timeout_sec <= 0:
+		return False
+	cache = frappe.cache()
+	key = _reply_notify_key(request_id)
+	if cache.blpop([key], timeout=max(1, math.ceil(timeout_sec))) is None:
+		return False
+	# Put the token back so every other caller waiting on the same request wakes as well.
+	pipe = cache.pipeline(transaction=False)
+	pipe.rpush(key, 1)
+	pipe.expire(key, REPLY_TTL_SEC)
+	pipe.execute()
+	return True
+
+
+def append_progress(request_id: str, chunks: list[Any]) -> tuple[int, int]:
+	"""Append partial results. Returns (offset of the first new chunk, chunks kept).
+
+	Only the first PROGRESS_MAX_CHUNKS are kept, so offsets handed to readers never shift.
+	"""
+
+	cache = frappe.cache()
+	key = cache.make_key(f"{PROGRESS_PREFIX}{request_id}")
+	pipe = cache.pipeline(transaction=True)
+	pipe.rpush(key, *(json.dumps(c, separators=(",", ":"), default=str) for c in chunks))
+	pipe.ltrim(key, 0, PROGRESS_MAX_CHUNKS - 1)
+	pipe.expire(key, REPLY_TTL_SEC)
+	total = int(pipe.execute()[0])
+	return total - len(chunks), min(total, PROGRESS_MAX_CHUNKS)
+
+
+def get_progress(request_id: str, offset: int, limit: int) -> tuple[list[Any], int]:
+	cache = frappe.cache()
+	key = cache.make_key(f"{PROGRESS_PREFIX}{request_id}")
+	pipe = cache.pipeline(transaction=False)
+	pipe.lrange(key, offset, offset + limit - 1)
+	pipe.llen(key)
+	raw_chunks, total = pipe.execute()
+	chunks = []
+	for raw in raw_chunks:
+		try:
+			chunks.append(json.loads(_str(raw)))
+		except Exception:
+			chunks.append(None)
+	return chunks, int(total or 0)
+
+
+def _save_request(pipe, request: dict[str, Any]) -> None:
+	ttl = int(request.get("timeout_sec") or 30) + REQ_GRACE_SEC
+	pipe.set(frappe.cache().make_key(f"{REQ_PREFIX}{request['request_id']}"), _dump(request), ex=ttl)
+
+
+def push(request: dict[str, Any]) -> None:
+	"""Queue one request (request_id, agent_id, command, args, timeout_sec, request_ts, requested_by)."""
+
+	push_many([request])
+
+
+def push_many(requests: list[dict[str, Any]]) -> None:
+	"""Queue many requests (e.g. one per agent for a broadcast) in a single round trip."""
+
+	requests = [{**r, "status": "Queued"} for r in requests]
+	if not requests:
+		return
+	cache = frappe.cache()
+	pipe = cache.pipeline(transaction=True)
+	for request in requests:
+		_save_request(pipe, request)
+		lane = int(request.get("priority", DEFAULT_PRIORITY))
+		pipe.rpush(_lane_keys(request["agent_id"])[lane], request["request_id"])
+		_notify(pipe, request["agent_id"])
+	pipe.execute()
+	audit(requests)
+
+
+def requeue_expired(agent_id: str, now_ms: int | None = None) -> int:
+	now_ms = now_ms if now_ms is not None else _now_ms()
+	keys = [_lane_keys(agent_id)[0], *_keys(agent_id)[1:]]
+	return int(_script("reap", _REAP_LUA)(keys=keys, args=[now_ms], client=frappe.cache()) or 0)
+
+
+def claim(agent_id: str, limit: int) -> list[dict[str, Any]]:
+	"""Hand out up to `limit` requests, urgent lane first, each leased for its own timeout_sec.
+
+	Requests whose requester already gave up (deadline_passed) are expired here instead of
+	being delivered.
+	"""
+
+	now_ms = _now_ms()
+	requeue_expired(agent_id, now_ms)
+	keys = _keys(agent_id)
+	lanes_and_keys = [*_lane_keys(agent_id), *keys[1:]]
+	cache = frappe.cache()
+	claim_script = _script("claim", _CLAIM_LUA)
+
+	claimed: list[dict[str, Any]] = []
+	# Bounded so a long run of stale requests cannot keep one poll busy.
+	for _ in range(limit * 4):
+		if len(claimed) >= limit:
+			break
+		# Provisional lease with the longest allowed timeout; replaced below once the request is read.
+		rid = claim_script(keys=lanes_and_keys, args=[now_ms + 120_000], client=cache)
+		if not rid:
+			break
+		rid = _str(rid)
+		request = get_request(rid)
+		if request is None:
+			# Request snapshot expired while queued: nothing to deliver.
+			pipe = cache.pipeline(transaction=False)
+			pipe.zrem(keys[2], rid)
+			pipe.lrem(keys[1], 0, rid)
+			pipe.execute()
+			continue
+		if deadline_passed(request, now_ms):
+			expire(request)
+			continue
+		lease_ms = now_ms + max(1, int(request.get("timeout_sec") or 30)) * 1000
+		request.update({"status": "Sent", "sent_ms": now_ms, "lease_expires_ms": lease_ms})
+		pipe = cache.pipeline(transaction=False)
+		pipe.zadd(keys[2], {rid: lease_ms})
+		_save_request(pipe, request)
+		pipe.execute()
+		claimed.append(request)
+
+	if claimed:
+		audit(claimed)
+	return claimed
+
+
+def complete(request_id: str, reply: dict[str, Any]) -> dict[str, Any] | None:
+	"""Store the reply and release the lease. Returns the request, or None if Redis never had it."""
+
+	request = get_request(request_id)
+	if request is None:
+		return None
+	ok = bool(reply.get("ok"))
+	request.update(
+		{
+			"status": "Done" if ok else "Failed",
+			"ok": ok,
+			"result": reply.get("result") if ok else None,
+			"error": str(reply.get("error") or "") if not ok else "",
+			"replied_ms": int(reply.get("ts") or _now_ms()),
+		}
+	)
+	keys = _keys(request["agent_id"])
+	cache = frappe.cache()
+	pipe = cache.pipeline(transaction=True)
+	_save_reply(pipe, request_id, reply, request.get("requested_by"))
+	_save_request(pipe, request)
+	pipe.zrem(keys[2], request_id)
+	pipe.lrem(keys[1], 0, request_id)
+	pipe.execute()
+	audit([request])
+	return request
+
+
+def expire(request: dict[str, Any]) -> None:
+	"""Mark a request that outlived its timeout as failed and drop it from the agent's lists."""
+
+	if request.get("status") in ("Done", "Failed"):
+		return
+	request.update({"status": "Failed", "ok": False, "error": "timeout"})
+	rid = request["request_id"]
+	keys = _keys(request["agent_id"])
+	cache = frappe.cache()
+	pipe = cache.pipeline(transaction=True)
+	_save_request(pipe, request)
+	_save_reply(pipe, rid, {"request_id": rid, "expired": True}, request.get("requested_by"))
+	for lane in _lane_keys(request["agent_id"]):
+		pipe.lrem(lane, 0, rid)
+	pipe.zrem(keys[2], request["request_id"])
+	pipe.lrem(keys[1], 0, request["request_id"])
+	pipe.execute()
+	audit([request])
+
+
+def audit(requests: list[dict[str, Any]]) -> None:
+	try:
+		frappe.enqueue(
+			"rfidenter.rfidenter.agent_queue.record_audit",
+			queue="short",
+			snapshots=[dict(r) for r in requests],
+		)
+	except Exception:
+		frappe.log_error(title="RFIDenter agent audit enqueue failed", message=frappe.get_traceback())
+
+
+def _dt(ms: Any) -> datetime.datetime | None:
+	if not ms:
+		return None
+	utc_dt = datetime.datetime.fromtimestamp(int(ms) / 1000, tz=datetime.timezone.utc)
+	try:
+		local_dt = frappe.utils.data.convert_utc_to_timezone(utc_dt, frappe.utils.get_system_timezone())
+	except Exception:
+		local_dt = utc_dt
+	return local_dt.replace(tzinfo=None)
+
+
+def record_audit(snapshots: list[dict[str, Any]]) -> None:
+	"""Background job: upsert request snapshots into RFID Agent Request.
+
+	Jobs may run out of order, so a row only ever moves forward (Queued -> Sent -> Done/Failed).
+	"""
+
+	for snap in snapshots:
+		rid = str(snap.get("request_id") or "")
+		if not rid:
+			continue
+		status = str(snap.get("status") or "Queued")
+		fields: dict[str, Any] = {
+			"agent_id": snap.get("agent_id"),
+			"command": snap.get("command"),
+			"args_json": _dump(snap.get("args") or {}),
+			"requested_by": snap.get("requested_by") or None,
+			"status": status,
+			"timeout_sec": snap.get("timeout_sec"),
+			"priority": snap.get("priority", DEFAULT_PRIORITY),
+			"request_ts": snap.get("request_ts"),
+			"sent_at": _dt(snap.get("sent_ms")),
+			"lease_expires_at": _dt(snap.get("lease_expires_ms")) if status == "Sent" else None,
+		}
+		if status in ("Done", "Failed"):
+			fields.update(
+				{
+					"ok": 1 if snap.get("ok") else 0,
+					"result_json": _dump(snap.get("result")) if snap.get("ok") else "",
+					"error": snap.get("error") or "",
+					"replied_at": _dt(snap.get("replied_ms")),
+				}
+			)
+
+		current = frappe.db.get_value(DOCTYPE, rid, "status")
+		try:
+			if current is None:
+				frappe.get_doc({"doctype": DOCTYPE, "request_id": rid, **fields}).insert(
+					ignore_permissions=True
+				)
+			elif STATUS_RANK.get(status, 0) > STATUS_RANK.get(current, 0) or (status == current == "Sent"):
+				doc = frappe.get_doc(DOCTYPE, rid)
+				doc.update({k: v for k, v in fields.items() if v is not None or k == "lease_expires_at"})
+				doc.save(ignore_permissions=True)
+			frappe.db.commit()
+		except frappe.DuplicateEntryError:
+			# A later snapshot of the same request was recorded by a parallel job first.
+			frappe.db.rollback()
+
+
+def _notify_key(agent_id: str) -> bytes:
+	return frappe.cache().make_key(f"{QUEUE_PREFIX}{agent_id}:notify")
+
+
+def _notify(pipe, agent_id: str) -> None:
+	key = _notify_key(agent_id)
+	pipe.rpush(key, 1)
+	# A handful of tokens is enough to wake every poller of one agent; stale ones only cause an
+	# early empty claim.
+	pipe.ltrim(key, -10, -1)
+	pipe.expire(key, NOTIFY_TTL_SEC)
+
+
+def notify(*agent_ids: str) -> None:
+	"""Wake long-polling agent_poll calls of these agents (the DB transport calls it after commit)."""
+
+	try:
+		pipe = frappe.cache().pipeline(transaction=False)
+		for agent_id in agent_ids:
+			_notify(pipe, agent_id)
+		pipe.execute()
+	except Exception:
+		frappe.log_error(title="RFIDenter agent notify failed", message=frappe.get_traceback())
+
+
+def wait_notify(agent_id: str, timeout_sec: float) -> bool:
+	"""Block until agent_enqueue signals this agent or the timeout passes. True when signalled."""
+
+	if timeout_sec <= 0:
+		return False
+	# Whole seconds keep BLPOP compatible with Redis servers older than 6.0.
+	return frappe.cache().blpop([_notify_key(agent_id)], timeout=max(1, math.ceil(timeout_sec))) is not None
+
+
+def long_poll_max_sec() -> int:
+	return site_settings.get_int("rfidenter_agent_long_poll_max_sec", 25, lo=1, hi=55)
+
+
+@contextmanager
+def long_poll_slot(wait_sec: float, pool: str = "poll") -> Iterator[bool]:
+	"""Reserve a slot in `pool` for a blocking wait: `rfidenter_agent_long_poll_workers` slots for
+	agent polls, `rfidenter_agent_result_wait_workers` for UI result waits.
+
+	Slots are sorted-set members scored by their deadline, so a worker killed mid-wait frees its
+	slot when the deadline passes. Yields False when all slots are taken.
+	"""
+
+	slots_key, workers_setting = SLOT_POOLS[pool]
+	cache = frappe.cache()
+	key = cache.make_key(slots_key)
+	token = frappe.generate_hash(length=12)
+	now_ms = _now_ms()
+	pipe = cache.pipeline(transaction=True)
+	pipe.zremrangebyscore(key, "-inf", now_ms)
+	pipe.zadd(key, {token: now_ms + int((wait_sec + 5) * 1000)})
+	pipe.zcard(key)
+	pipe.expire(key, 3600)
+	taken = pipe.execute()[2]
+	if taken > site_settings.get_int(workers_setting, 4, lo=0, hi=1000):
+		cache.zrem(key, token)
+		yield False
+		return
+	try:
+		yield True
+	finally:
+		cache.zrem(key, token)
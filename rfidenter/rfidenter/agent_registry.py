@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import pickle
+import time
+from typing import Any
+
+import frappe
+
+from rfidenter.rfidenter import site_settings
+
+# Registry of agents that call register_agent() on every heartbeat:
+#   AGENT_CACHE_HASH    agent -> payload (pickled, the format frappe.cache().hset writes)
+#   FINGERPRINT_HASH    agent -> hash of the payload without last_seen
+#   SEEN_KEY            sorted set agent -> last_seen (ms)
+# A heartbeat only moves the agent's score; the payload is rewritten when a field changes.
+# Liveness reads are ZRANGEBYSCORE, and stale agents are pruned by a scheduler job.
+AGENT_CACHE_HASH = "rfidenter_agents"
+FINGERPRINT_HASH = "rfidenter_agents_fp"
+SEEN_KEY = "rfidenter_agents_seen"
+LIVE_MAX_AGENTS = 5000
+
+_TOUCH_LUA = """
+redis.call('ZADD', KEYS[3], ARGV[4], ARGV[1])
+if redis.call('HGET', KEYS[2], ARGV[1]) == ARGV[2] then
+	return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+return 1
+"""
+
+_scripts: dict[str, Any] = {}
+
+
+def _str(raw: Any) -> str:
+	return raw.decode() if isinstance(raw, (bytes, bytearray)) else str(raw)
+
+
+def _keys() -> list[bytes]:
+	cache = frappe.cache()
+	return [cache.make_key(AGENT_CACHE_HASH), cache.make_key(FINGERPRINT_HASH), cache.make_key(SEEN_KEY)]
+
+
+def _fingerprint(payload: dict[str, Any]) -> str:
+	stable = {k: v for k, v in payload.items() if k != "last_seen"}
+	return hashlib.sha1(json.dumps(stable, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def touch(payload: dict[str, Any]) -> bool:
+	"""Record a heartbeat. Returns True when the stored payload had to be rewritten."""
+
+	script = _scripts.get("touch")
+	if script is None:
+		script = _scripts["touch"] = frappe.cache().register_script(_TOUCH_LUA)
+	args = [payload["agent_id"], _fingerprint(payload), pickle.dumps(payload), int(payload["last_seen"])]
+	return bool(script(keys=_keys(), args=args, client=frappe.cache()))
+
+
+def live(ttl_sec: int, *, now_ms: int, limit: int = LIVE_MAX_AGENTS) -> list[dict[str, Any]]:
+	"""Agents seen within `ttl_sec`, newest first, with last_seen taken from the sorted set."""
+
+	payload_key, _fp_key, seen_key = _keys()
+	cache = frappe.cache()
+	pipe = cache.pipeline(transaction=False)
+	pipe.zrevrangebyscore(seen_key, "+inf", now_ms - ttl_sec * 1000, start=0, num=limit, withscores=True)
+	seen = pipe.execute()[0]
+	if not seen:
+		return []
+
+	ids = [_str(agent) for agent, _score in seen]
+	pipe = cache.pipeline(transaction=False)
+	pipe.hmget(payload_key, ids)
+	raw_payloads = pipe.execute()[0]
+
+	agents: list[dict[str, Any]] = []
+	for (_agent, score), raw in zip(seen, raw_payloads, strict=True):
+		try:
+			payload = pickle.loads(raw) if raw is not None else None
+		except Exception:
+			payload = None
+		if isinstance(payload, dict):
+			agents.append({**payload, "last_seen": int(score)})
+	return agents
+
+
+def prune(ttl_sec: int, *, now_ms: int) -> int:
+	"""Drop agents not seen within `ttl_sec`, plus payloads without a score (written before the
+	sorted set existed). Returns the number of agents removed."""
+
+	payload_key, fp_key, seen_key = _keys()
+	cache = frappe.cache()
+	cutoff = now_ms - ttl_sec * 1000
+	pipe = cache.pipeline(transaction=False)
+	pipe.zrangebyscore(seen_key, "-inf", f"({cutoff}")
+	pipe.hkeys(payload_key)
+	pipe.zrange(seen_key, 0, -1)
+	stale_raw, stored_raw, scored_raw = pipe.execute()
+
+	stale = {_str(a) for a in stale_raw}
+	orphans = {_str(a) for a in stored_raw} - {_str(a) for a in scored_raw}
+	gone = sorted(stale | orphans)
+	if not gone:
+		return 0
+	pipe = cache.pipeline(transaction=True)
+	pipe.hdel(payload_key, *gone)
+	pipe.hdel(fp_key, *gone)
+	pipe.zrem(seen_key, *gone)
+	pipe.execute()
+	return len(gone)
+
+
+def prune_stale() -> None:
+	"""Scheduler job: keep the registry to agents seen within `rfidenter_agent_ttl_sec`."""
+
+	ttl = site_settings.get_int("rfidenter_agent_ttl_sec", 60, lo=10, hi=3600)
+	try:
+		prune(ttl, now_ms=int(time.time() * 1000))
+	except Exception:
+		frappe.log_error(title="RFIDenter agent registry prune failed", message=frappe.get_traceback())
@@ -1,39 +1,69 @@
 from __future__ import annotations
 
+import base64
 import datetime
 import hashlib
 import json
 import re
 import time
+from collections.abc import Callable
 from typing import Any
 
 import frappe
+from frappe.utils.password import get_decrypted_password
 
+from rfidenter.rfidenter import (
+	agent_queue,
+	agent_registry,
+	batch_projection,
+	batch_summary,
+	edge_archive,
+	edge_consumer,
+	edge_seq,
+	payload_codec,
+	replica,
+	retention,
+	scale_readings,
+	scale_stream,
+	site_settings,
+	zebra_items,
+)
 from rfidenter.rfidenter.permissions import has_rfidenter_access
-from rfidenter.rfidenter import zebra_items
-from frappe.utils.password import get_decrypted_password
 
-AGENT_CACHE_HASH = "rfidenter_agents"
-AGENT_QUEUE_PREFIX = "rfidenter_agent_queue:"
-AGENT_REQ_PREFIX = "rfidenter_agent_req:"
-AGENT_REPLY_PREFIX = "rfidenter_agent_reply:"
+AGENT_CACHE_HASH = agent_registry.AGENT_CACHE_HASH
+AGENT_QUEUE_PREFIX = agent_queue.QUEUE_PREFIX
+AGENT_REQ_PREFIX = agent_queue.REQ_PREFIX
+AGENT_REPLY_PREFIX = agent_queue.REPLY_PREFIX
+AGENT_REPLY_BULK_MAX = 100
+AGENT_PROGRESS_MAX_CHUNKS = 200
+AGENT_BROADCAST_MAX = 500
+AGENT_INSERT_FIELDS = (
+	"name",
+	"request_id",
+	"agent_id",
+	"command",
+	"args_json",
+	"requested_by",
+	"status",
+	"timeout_sec",
+	"priority",
+	"request_ts",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+)
 SEEN_PREFIX = "rfidenter_seen:"
 SCALE_CACHE_PREFIX = "rfidenter_scale_weight:"
 SCALE_LAST_KEY = "rfidenter_scale_last"
+SCALE_BATCH_MAX_READINGS = 500
+SCALE_MULTI_MAX_DEVICES = 500
 ANT_STATS_INDEX = "rfidenter_ant_stats_index"
 ANT_STATS_PREFIX = "rfidenter_ant_stats:"
 
 
 def _get_rfidenter_conf(key: str, default: object) -> object:
-    conf = getattr(frappe, "conf", None) or {}
-    if isinstance(conf, dict) and key in conf:
-        return conf[key]
-
-    site_conf = frappe.get_site_config() or {}
-    if isinstance(site_conf, dict) and key in site_conf:
-        return site_conf[key]
-
-    return default
+	return site_settings.get(key, default)
 
 
 def _get_site_token() -> str:
@@ -408,6 +438,22 @@ def _get_batch_state(device_id: str) -> frappe.model.document.Document:
 	return doc
 
 
+def _touch_scale_batch_state(device_id: str, seqs: list[int]) -> None:
+	"""Refresh last_seen_at and raise last_event_seq with one UPDATE instead of a document save."""
+	if not frappe.db.exists("RFID Batch State", {"device_id": device_id}):
+		_get_batch_state(device_id)
+	top = max(seqs) if seqs else None
+	frappe.db.sql(
+		"""
+		UPDATE `tabRFID Batch State`
+		SET `last_seen_at`=%s,
+			`last_event_seq`=IF(%s IS NULL, `last_event_seq`, GREATEST(COALESCE(`last_event_seq`, -1), %s))
+		WHERE `device_id`=%s
+		""",
+		(frappe.utils.now_datetime(), top, top, device_id),
+	)
+
+
 def _get_batch_state_for_update(device_id: str) -> frappe.model.document.Document:
 	name = frappe.db.get_value(
 		"RFID Batch State",
@@ -483,6 +529,42 @@ def _update_batch_state(
 	doc.save(ignore_permissions=True)
 
 
+def _device_state_payload(
+	state: frappe.model.document.Document, *, event_type: str | None = None
+) -> dict[str, Any]:
+	return {
+		"device_id": state.device_id,
+		"status": state.status,
+		"pause_reason": state.pause_reason,
+		"current_batch_id": state.current_batch_id,
+		"current_product": state.current_product,
+		"pending_product": state.pending_product,
+		"last_event_seq": state.last_event_seq,
+		"last_seen_at": state.last_seen_at,
+		"last_event_type": event_type,
+	}
+
+
+def _publish_device_state(state: frappe.model.document.Document, *, event_type: str | None = None) -> bool:
+	"""
+	Push compact batch state to pages subscribed to this device (`RFID Batch State` doc room).
+
+	Published after commit so subscribers never see state that was rolled back.
+	"""
+	try:
+		frappe.publish_realtime(
+			"rfidenter_device_state",
+			_device_state_payload(state, event_type=event_type),
+			doctype="RFID Batch State",
+			docname=state.name,
+			after_commit=True,
+		)
+		return True
+	except Exception:
+		frappe.log_error(title="RFIDenter device state publish failed", message=frappe.get_traceback())
+		return False
+
+
 def _insert_edge_event(
 	*,
 	event_id: str,
@@ -507,6 +589,8 @@ def _insert_edge_event(
 
 	payload_json = _json_dump(payload)
 	payload_hash = _payload_hash(payload_json)
+	# Inline mode does the ERP-side work during ingestion; async mode leaves it to edge_consumer.
+	deferred = edge_consumer.is_async()
 
 	doc = frappe.get_doc(
 		{
@@ -519,11 +603,28 @@ def _insert_edge_event(
 			"payload_json": payload_json,
 			"payload_hash": payload_hash,
 			"received_at": frappe.utils.now_datetime(),
-			"processed": 0,
+			"processed": 0 if deferred else 1,
 		}
 	)
 	doc.insert(ignore_permissions=True)
-	return {"inserted": True, "duplicate": False, "name": doc.name}
+
+	try:
+		edge_seq.track_event(device_id, batch_id, seq, doc.received_at)
+	except Exception:
+		frappe.log_error(title="RFIDenter seq tracking failed", message=frappe.get_traceback())
+	if not deferred:
+		try:
+			batch_summary.record_event(
+				device_id=device_id,
+				batch_id=batch_id,
+				event_type=event_type,
+				payload=payload,
+				received_at=doc.received_at,
+			)
+		except Exception:
+			frappe.log_error(title="RFIDenter batch summary update failed", message=frappe.get_traceback())
+
+	return {"inserted": True, "duplicate": False, "name": doc.name, "deferred": deferred}
 
 
 def _ensure_seq(
@@ -535,6 +636,10 @@ def _ensure_seq(
 	if allow_batch_reset and state.current_batch_id and batch_id and batch_id != state.current_batch_id:
 		last_seq = -1
 	if seq <= last_seq:
+		try:
+			edge_seq.record_regression(state.device_id, batch_id or state.current_batch_id, seq, last_seq)
+		except Exception:
+			frappe.log_error(title="RFIDenter seq regression tracking failed", message=frappe.get_traceback())
 		raise RFIDConflictError("Event seq regression.", "SEQ_REGRESSION")
 	return seq
 
@@ -569,6 +674,20 @@ def _scale_cache_ttl_sec() -> int:
 	return max(5, min(3600, ttl))
 
 
+def _cache_scale_reading(device_key: str, payload: dict[str, Any]) -> None:
+	"""Cache the device's latest reading (stamped with the server receive time) and mark it active."""
+	ttl = _scale_cache_ttl_sec()
+	now_ms = _now_ms()
+	cached = {**payload, "received_ms": now_ms}
+	cache = frappe.cache()
+	cache.set_value(f"{SCALE_CACHE_PREFIX}{device_key}", cached, expires_in_sec=ttl, shared=False)
+	cache.set_value(SCALE_LAST_KEY, cached, expires_in_sec=ttl, shared=False)
+	try:
+		scale_stream.mark_active(device_key, now_ms=now_ms, ttl_sec=ttl)
+	except Exception:
+		frappe.log_error(title="RFIDenter scale device index failed", message=frappe.get_traceback())
+
+
 def _rpc_timeout_sec(raw: Any | None = None) -> int:
 	fallback = _get_rfidenter_conf("rfidenter_rpc_timeout_sec", 30)
 
@@ -591,6 +710,48 @@ def ping() -> dict[str, Any]:
 	return {"ok": True, "site": frappe.local.site}
 
 
+def _aggregate_tags(
+	tags: list[Any], device: str, on_read: Callable[[str, int, int], None] | None = None
+) -> list[dict[str, Any]]:
+	# Aggregate within this request: same EPC+ANT -> single row with `count`.
+	# This keeps ERP UI counts close to the local UI while reducing realtime payload size.
+	agg: dict[str, dict[str, Any]] = {}
+	for tag in tags:
+		if not isinstance(tag, dict):
+			continue
+
+		epc = _normalize_hex(tag.get("epcId") or tag.get("EPC") or "")
+		if not epc:
+			continue
+		ant = _normalize_ant(tag.get("antId") or tag.get("ANT") or 0)
+		cnt = _normalize_count(tag.get("count") or tag.get("reads") or tag.get("readCount") or 1)
+		if on_read:
+			on_read(epc, ant, cnt)
+
+		agg_key = f"{epc}:{ant}"
+		prev = agg.get(agg_key)
+		if not prev:
+			agg[agg_key] = {
+				"epcId": epc,
+				"memId": _normalize_hex(tag.get("memId") or tag.get("TID") or ""),
+				"rssi": tag.get("rssi"),
+				"antId": ant,
+				"phaseBegin": tag.get("phaseBegin"),
+				"phaseEnd": tag.get("phaseEnd"),
+				"freqKhz": tag.get("freqKhz"),
+				"devName": tag.get("devName") or device,
+				"count": cnt,
+			}
+			continue
+
+		prev["count"] = int(prev.get("count") or 0) + cnt
+		for field in ("memId", "rssi", "phaseBegin", "phaseEnd", "freqKhz", "devName"):
+			if tag.get(field) is not None:
+				prev[field] = tag.get(field)
+
+	return list(agg.values())
+
+
 @frappe.whitelist(allow_guest=True)
 def ingest_tags(**kwargs) -> dict[str, Any]:
 	"""
@@ -694,65 +855,37 @@ def ingest_tags(**kwargs) -> dict[str, Any]:
 	dedup_ttl = _dedup_ttl_sec()
 	dedup_device = _normalize_device_id(device) or device
 
-	# Aggregate within this request: same EPC+ANT -> single row with `count`.
-	# This keeps ERP UI counts close to the local UI while reducing realtime payload size.
-	agg: dict[str, dict[str, Any]] = {}
 	seen_before = 0
-
 	cache = frappe.cache() if dedup_enabled else None
 
-	for tag in tags:
-		if not isinstance(tag, dict):
-			continue
-
-		epc = _normalize_hex(tag.get("epcId") or tag.get("EPC") or "")
-		if not epc:
-			continue
-		ant = _normalize_ant(tag.get("antId") or tag.get("ANT") or 0)
-		cnt = _normalize_count(tag.get("count") or tag.get("reads") or tag.get("readCount") or 1)
-
-		if dedup_enabled and cache and ant > 0:
-			key = f"{SEEN_PREFIX}{dedup_device}:{ant}:{epc}"
-			if cache.get_value(key, expires=True):
-				seen_before += cnt
-			else:
-				cache.set_value(key, 1, expires_in_sec=dedup_ttl)
-
-		agg_key = f"{epc}:{ant}"
-		prev = agg.get(agg_key)
-		if not prev:
-			agg[agg_key] = {
-				"epcId": epc,
-				"memId": _normalize_hex(tag.get("memId") or tag.get("TID") or ""),
-				"rssi": tag.get("rssi"),
-				"antId": ant,
-				"phaseBegin": tag.get("phaseBegin"),
-				"phaseEnd": tag.get("phaseEnd"),
-				"freqKhz": tag.get("freqKhz"),
-				"devName": tag.get("devName") or device,
-				"count": cnt,
-			}
-			continue
-
-		prev["count"] = int(prev.get("count") or 0) + cnt
-		for field in ("memId", "rssi", "phaseBegin", "phaseEnd", "freqKhz", "devName"):
-			if tag.get(field) is not None:
-				prev[field] = tag.get(field)
+	def _check_seen(epc: str, ant: int, cnt: int) -> None:
+		nonlocal seen_before
+		if not cache or ant <= 0:
+			return
+		key = f"{SEEN_PREFIX}{dedup_device}:{ant}:{epc}"
+		if cache.get_value(key, expires=True):
+			seen_before += cnt
+		else:
+			cache.set_value(key, 1, expires_in_sec=dedup_ttl)
 
-	agg_tags = list(agg.values())
+	agg_tags = _aggregate_tags(tags, device, on_read=_check_seen if dedup_enabled else None)
 	try:
 		_update_antenna_stats(agg_tags, device=device, ts=ts)
 	except Exception:
 		pass
 
+	# With a recorded event in async mode, saved tags and Zebra consumption run in edge_consumer.
+	deferred = bool(event_id) and edge_consumer.is_async()
+
 	saved_count = 0
 	saved_updated = False
-	try:
-		saved_count = _upsert_saved_tags(agg_tags, device, ts)
-		saved_updated = True
-	except Exception:
-		saved_updated = False
-		frappe.log_error(title="RFIDenter saved tags update failed", message=frappe.get_traceback())
+	if not deferred:
+		try:
+			saved_count = _upsert_saved_tags(agg_tags, device, ts)
+			saved_updated = True
+		except Exception:
+			saved_updated = False
+			frappe.log_error(title="RFIDenter saved tags update failed", message=frappe.get_traceback())
 
 	payload = {"device": device, "ts": ts, "tags": agg_tags}
 	# Broadcast to all logged-in desk users.
@@ -765,7 +898,7 @@ def ingest_tags(**kwargs) -> dict[str, Any]:
 
 	# Zebra item-tags: auto-submit Stock Entry (best-effort).
 	zebra_processed = 0
-	if event_id:
+	if event_id and not deferred:
 		try:
 			zebra_result = zebra_items.process_tag_reads(
 				agg_tags,
@@ -791,9 +924,24 @@ def ingest_tags(**kwargs) -> dict[str, Any]:
 		"saved_updated": saved_updated,
 		"saved_count": saved_count,
 		"zebra_processed": zebra_processed,
+		"deferred": deferred,
 	}
 
 
+def _consume_ingest_tags(event: dict[str, Any], payload: dict[str, Any]) -> None:
+	"""edge_consumer handler: the saved-tag and Zebra work ingest_tags skips in async mode."""
+	device = str(payload.get("device") or event.get("device_id") or "unknown")
+	agg_tags = _aggregate_tags(payload.get("tags") or [], device)
+	_upsert_saved_tags(agg_tags, device, payload.get("ts"))
+	zebra_items.process_tag_reads(
+		agg_tags,
+		device=device,
+		event_id=event.get("event_id"),
+		batch_id=event.get("batch_id") or None,
+		seq=event.get("seq"),
+	)
+
+
 @frappe.whitelist()
 def list_antenna_stats() -> dict[str, Any]:
 	if not has_rfidenter_access():
@@ -853,6 +1001,7 @@ def list_antenna_stats() -> dict[str, Any]:
 
 
 @frappe.whitelist()
+@replica.read_only
 def list_antenna_rules() -> dict[str, Any]:
 	if not has_rfidenter_access():
 		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
@@ -916,6 +1065,7 @@ def upsert_antenna_rule(
 
 
 @frappe.whitelist()
+@replica.read_only
 def list_delivery_note_settings() -> dict[str, Any]:
 	if not has_rfidenter_access():
 		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
@@ -936,6 +1086,35 @@ def list_delivery_note_settings() -> dict[str, Any]:
 	)
 	return {"ok": True, "items": rows}
 
+
+def _normalize_scale_reading(raw: Any, defaults: dict[str, Any] | None = None) -> dict[str, Any] | None:
+	"""Normalize one scale reading; `defaults` supplies batch-level unit/batch_id. None if weight is invalid."""
+	if not isinstance(raw, dict):
+		return None
+	defaults = defaults or {}
+
+	weight = _normalize_weight(raw.get("weight") or raw.get("value") or raw.get("kg") or raw.get("qty"))
+	if weight is None:
+		return None
+
+	ts = _now_ms()
+	try:
+		if raw.get("ts") is not None:
+			ts = int(float(raw.get("ts")))
+	except Exception:
+		ts = _now_ms()
+
+	return {
+		"weight": weight,
+		"unit": _normalize_unit(raw.get("unit") or raw.get("uom") or defaults.get("unit")) or "kg",
+		"stable": _normalize_bool(raw.get("stable") or raw.get("is_stable")),
+		"ts": ts,
+		"event_id": _normalize_event_id(raw.get("event_id")),
+		"batch_id": _normalize_batch_id(raw.get("batch_id") or defaults.get("batch_id")),
+		"seq": _normalize_seq(raw.get("seq")),
+	}
+
+
 @frappe.whitelist(allow_guest=True)
 def ingest_scale_weight(**kwargs) -> dict[str, Any]:
 	"""
@@ -971,58 +1150,62 @@ def ingest_scale_weight(**kwargs) -> dict[str, Any]:
 	device = str(body.get("device") or body.get("devName") or "scale").strip() or "scale"
 	device_key = _normalize_device_id(device) or "scale"
 
-	weight = _normalize_weight(body.get("weight") or body.get("value") or body.get("kg") or body.get("qty"))
-	if weight is None:
+	reading = _normalize_scale_reading(body)
+	if reading is None:
 		frappe.throw("Scale weight noto‘g‘ri yoki yo‘q.", frappe.ValidationError)
 
-	unit = _normalize_unit(body.get("unit") or body.get("uom")) or "kg"
-	stable = _normalize_bool(body.get("stable") or body.get("is_stable"))
+	weight = reading["weight"]
+	unit = reading["unit"]
+	stable = reading["stable"]
+	ts = reading["ts"]
 	port = str(body.get("port") or "").strip()
 
-	event_id = _normalize_event_id(body.get("event_id"))
-	batch_id = _normalize_batch_id(body.get("batch_id"))
-	seq = _normalize_seq(body.get("seq"))
+	event_id = reading["event_id"]
+	batch_id = reading["batch_id"]
+	seq = reading["seq"]
 
-	ts_raw = body.get("ts")
-	ts = _now_ms()
+	payload = {"device": device, "weight": weight, "unit": unit, "stable": stable, "port": port, "ts": ts}
+
+	# A retry of a stored reading is answered before it can move the deadband or the ring buffer.
+	if event_id and scale_readings.existing_event_ids([event_id]):
+		return {"ok": True, "duplicate": True, "device": device, "published": False}
+
+	# The ring buffer keeps every raw reading, including the ones the deadband drops below.
 	try:
-		if ts_raw is not None:
-			ts = int(float(ts_raw))
+		scale_stream.push_history(device_key, [reading])
 	except Exception:
-		ts = _now_ms()
-
-	payload = {"device": device, "weight": weight, "unit": unit, "stable": stable, "port": port, "ts": ts}
+		frappe.log_error(title="RFIDenter scale history failed", message=frappe.get_traceback())
+
+	gate = scale_stream.apply_deadband(device_key, weight=weight, unit=unit, stable=stable, ts=ts)
+	if not gate["passed"]:
+		# Within the deadband: no cache write, realtime event or edge event. The seq is still
+		# recorded (once per seq, so retries are not counted) so the batch tracker does not report
+		# the dropped reading as a gap.
+		if event_id and batch_id and seq is not None:
+			_track_suppressed_scale_seqs(device, [reading])
+		return {
+			"ok": True,
+			"device": device,
+			"published": False,
+			"suppressed": True,
+			"suppressed_total": gate["suppressed_total"],
+		}
+	payload["suppressed"] = gate["suppressed_since"]
 
 	if event_id:
-		payload_event = dict(payload)
-		payload_event["batch_id"] = batch_id
-		payload_event["seq"] = seq
-		event_result = _insert_edge_event(
-			event_id=event_id,
-			device_id=device,
-			batch_id=batch_id,
-			seq=seq,
-			event_type="ingest_scale_weight",
-			payload=payload_event,
-		)
-		if event_result.get("duplicate"):
+		stored = scale_readings.insert_readings(device, [reading])
+		if not stored["inserted"]:
 			return {"ok": True, "duplicate": True, "device": device, "published": False}
+		# The deadband state follows the stored row: if this transaction rolls back, the retry must
+		# pass again instead of being compared against a reading that was never kept.
+		frappe.db.after_rollback.add(lambda: scale_stream.undo_deadband(device_key, gate))
 
 		try:
-			state = _get_batch_state(device)
-			state.last_seen_at = frappe.utils.now_datetime()
-			if seq is not None:
-				last_seq = int(state.last_event_seq) if state.last_event_seq is not None else -1
-				if seq > last_seq:
-					state.last_event_seq = seq
-			state.save(ignore_permissions=True)
+			_touch_scale_batch_state(device, [seq] if seq is not None else [])
 		except Exception:
 			pass
 
-	ttl = _scale_cache_ttl_sec()
-	cache = frappe.cache()
-	cache.set_value(f"{SCALE_CACHE_PREFIX}{device_key}", payload, expires_in_sec=ttl, shared=False)
-	cache.set_value(SCALE_LAST_KEY, payload, expires_in_sec=ttl, shared=False)
+	_cache_scale_reading(device_key, payload)
 
 	published = True
 	try:
@@ -1031,96 +1214,350 @@ def ingest_scale_weight(**kwargs) -> dict[str, Any]:
 		published = False
 		frappe.log_error(title="RFIDenter scale realtime failed", message=frappe.get_traceback())
 
-	return {"ok": True, "device": device, "published": published}
-
+	return {"ok": True, "device": device, "published": published, "reason": gate["reason"]}
 
-@frappe.whitelist()
-def get_scale_weight(device: str | None = None) -> dict[str, Any]:
-	if frappe.session.user and not has_rfidenter_access():
-		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
 
-	device_key = _normalize_device_id(device or "")
-	cache = frappe.cache()
-	reading = cache.get_value(f"{SCALE_CACHE_PREFIX}{device_key}") if device_key else None
-	if not reading:
-		reading = cache.get_value(SCALE_LAST_KEY)
+def _track_suppressed_scale_seqs(device: str, readings: list[dict[str, Any]]) -> None:
+	"""Count deadband-dropped readings in the seq tracker, each (batch, seq) only the first time."""
 
-	return {"ok": bool(reading), "reading": reading or {}}
+	if not readings:
+		return
+	by_batch: dict[str, list[int]] = {}
+	for reading in readings:
+		by_batch.setdefault(reading["batch_id"], []).append(reading["seq"])
+	try:
+		for batch_id, seqs in by_batch.items():
+			for seq, first in zip(seqs, scale_stream.claim_seqs(device, batch_id, seqs), strict=True):
+				if first:
+					edge_seq.track_event(device, batch_id, seq)
+	except Exception:
+		frappe.log_error(title="RFIDenter seq tracking failed", message=frappe.get_traceback())
 
 
-def _upsert_saved_tags(tags: list[dict[str, Any]], device: str, ts: Any | None = None) -> int:
-	if not tags:
-		return 0
-	device_norm = str(device or "").strip()[:64]
-	now = _datetime_from_ts_ms(ts)
-	day = now.date().isoformat()
-	rows: list[tuple[Any, ...]] = []
-	day_rows: list[tuple[Any, ...]] = []
-	for tag in tags:
-		if not isinstance(tag, dict):
-			continue
-		epc = _normalize_hex(tag.get("epcId") or tag.get("EPC") or "")
-		if not epc:
-			continue
-		cnt = _normalize_count(tag.get("count") or tag.get("reads") or tag.get("readCount") or 1)
-		rows.append((epc, epc, cnt, now, device_norm))
-		day_name = f"{epc}-{day}"
-		day_rows.append((day_name, epc, day, cnt, now, device_norm))
+@frappe.whitelist(allow_guest=True)
+def ingest_scale_weights(**kwargs) -> dict[str, Any]:
+	"""
+	Ingest a batch of timestamped scale readings from one device in a single call.
 
-	if not rows:
-		return 0
+	Expected JSON body:
+	{
+	  "device": "zebra-pc",
+	  "unit": "kg",
+	  "port": "/dev/ttyUSB0",
+	  "batch_id": "b-1",
+	  "readings": [
+	    {"weight": 1.234, "stable": false, "ts": 1730000000000, "event_id": "...", "seq": 10},
+	    {"weight": 1.236, "stable": true, "ts": 1730000000100}
+	  ]
+	}
 
-	values_sql = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
-	flat: list[Any] = [item for row in rows for item in row]
-	frappe.db.sql(
-		f"""
-		INSERT INTO `tabRFID Saved Tag` (`name`, `epc`, `reads`, `last_seen`, `device`)
-		VALUES {values_sql}
-		ON DUPLICATE KEY UPDATE
-			`reads` = `reads` + VALUES(`reads`),
-			`last_seen` = VALUES(`last_seen`),
-			`device` = VALUES(`device`)
-		""",
-		flat,
-	)
+	Readings go through the same deadband as ingest_scale_weight. The newest passed reading
+	becomes the cached value, one realtime event carries all passed readings, and readings
+	with event_id are appended to RFID Scale Reading with one multi-row insert.
+	"""
+	_require_auth_for_ingest()
+	if frappe.session.user and frappe.session.user != "Guest" and not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
 
-	if day_rows:
-		values_day_sql = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(day_rows))
-		flat_day: list[Any] = [item for row in day_rows for item in row]
-		frappe.db.sql(
-			f"""
-			INSERT INTO `tabRFID Saved Tag Day` (`name`, `epc`, `day`, `reads`, `last_seen`, `device`)
-			VALUES {values_day_sql}
-			ON DUPLICATE KEY UPDATE
-				`reads` = `reads` + VALUES(`reads`),
-				`last_seen` = VALUES(`last_seen`),
-				`device` = VALUES(`device`)
-			""",
-			flat_day,
-		)
+	body = _get_request_body(kwargs)
+	device = str(body.get("device") or body.get("devName") or "scale").strip() or "scale"
+	device_key = _normalize_device_id(device) or "scale"
+	port = str(body.get("port") or "").strip()
 
-	return len(rows)
+	raw_readings = body.get("readings") or []
+	if isinstance(raw_readings, str):
+		try:
+			raw_readings = json.loads(raw_readings)
+		except Exception:
+			raw_readings = []
+	if not isinstance(raw_readings, list):
+		frappe.throw("readings ro‘yxat bo‘lishi kerak.", frappe.ValidationError)
 
+	# Safety limits
+	raw_readings = raw_readings[:SCALE_BATCH_MAX_READINGS]
+	defaults = {"unit": body.get("unit") or body.get("uom"), "batch_id": body.get("batch_id")}
+	readings = [r for r in (_normalize_scale_reading(raw, defaults) for raw in raw_readings) if r]
+	readings.sort(key=lambda r: r["ts"])
+	rejected = len(raw_readings) - len(readings)
 
-@frappe.whitelist()
-def get_saved_tags(limit: Any | None = None, order: Any | None = None, date: Any | None = None) -> dict[str, Any]:
-	"""Fetch saved unique EPCs from DB."""
-	if not has_rfidenter_access():
-		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+	# Retries of stored readings are duplicates, not deadband input.
+	known = scale_readings.existing_event_ids([r["event_id"] for r in readings if r["event_id"]])
+	readings = [r for r in readings if r["event_id"] not in known]
 
 	try:
-		lim = int(limit) if limit is not None else 200
+		scale_stream.push_history(device_key, readings)
 	except Exception:
-		lim = 200
-	lim = max(50, min(10_000, lim))
+		frappe.log_error(title="RFIDenter scale history failed", message=frappe.get_traceback())
+
+	passed: list[dict[str, Any]] = []
+	dropped: list[dict[str, Any]] = []
+	gates: list[dict[str, Any]] = []
+	for reading in readings:
+		gate = scale_stream.apply_deadband(
+			device_key,
+			weight=reading["weight"],
+			unit=reading["unit"],
+			stable=reading["stable"],
+			ts=reading["ts"],
+		)
+		if gate["passed"]:
+			reading["suppressed"] = gate["suppressed_since"]
+			passed.append(reading)
+			gates.append(gate)
+		else:
+			dropped.append(reading)
+	suppressed = len(dropped)
+	_track_suppressed_scale_seqs(
+		device, [r for r in dropped if r["event_id"] and r["batch_id"] and r["seq"] is not None]
+	)
 
-	order_raw = str(order or "last").lower()
-	if order_raw == "reads":
-		order_by = "reads desc"
-	elif order_raw == "epc":
-		order_by = "epc asc"
-	else:
-		order_by = "last_seen desc"
+	def _payload(reading: dict[str, Any]) -> dict[str, Any]:
+		return {
+			"device": device,
+			"weight": reading["weight"],
+			"unit": reading["unit"],
+			"stable": reading["stable"],
+			"port": port,
+			"ts": reading["ts"],
+			"suppressed": reading["suppressed"],
+		}
+
+	bulk = scale_readings.insert_readings(device, passed)
+	if bulk["inserted"]:
+		# On rollback, put the deadband back to where it was before this batch's first passed reading
+		# (undo_deadband leaves it alone if a later request has moved it on).
+		undo = {**gates[0], "ts": gates[-1]["ts"]}
+		frappe.db.after_rollback.add(lambda: scale_stream.undo_deadband(device_key, undo))
+		inserted_ids = set(bulk["inserted_ids"])
+		try:
+			_touch_scale_batch_state(
+				device, [r["seq"] for r in passed if r["event_id"] in inserted_ids and r["seq"] is not None]
+			)
+		except Exception:
+			pass
+
+	published = False
+	if passed:
+		latest = _payload(passed[-1])
+		_cache_scale_reading(device_key, latest)
+
+		# One event per batch: the newest reading at the top level (same shape as the single-reading
+		# event) plus the compact series of every passed reading.
+		message = {
+			**latest,
+			"readings": [{"weight": r["weight"], "stable": r["stable"], "ts": r["ts"]} for r in passed],
+		}
+		try:
+			frappe.publish_realtime("rfidenter_scale_weight", message, after_commit=False)
+			published = True
+		except Exception:
+			frappe.log_error(title="RFIDenter scale realtime failed", message=frappe.get_traceback())
+
+	return {
+		"ok": True,
+		"device": device,
+		"received": len(raw_readings),
+		"rejected": rejected,
+		"passed": len(passed),
+		"suppressed": suppressed,
+		"inserted": bulk["inserted"],
+		"duplicates": bulk["duplicates"] + len(known),
+		"published": published,
+	}
+
+
+@frappe.whitelist()
+def get_scale_weight(device: str | None = None) -> dict[str, Any]:
+	if frappe.session.user and not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	device_key = _normalize_device_id(device or "")
+	cache = frappe.cache()
+	# The global "last reading" is only a fallback when no device is asked for; a named device
+	# that has gone quiet must not show another scale's weight.
+	if device_key:
+		reading = cache.get_value(f"{SCALE_CACHE_PREFIX}{device_key}")
+	else:
+		reading = cache.get_value(SCALE_LAST_KEY)
+
+	stats = scale_stream.deadband_stats(device_key) if device_key else {}
+	return {
+		"ok": bool(reading),
+		"reading": reading or {},
+		"suppressed_total": stats.get("suppressed_total", 0),
+	}
+
+
+@frappe.whitelist()
+def get_scale_weights(devices: Any | None = None) -> dict[str, Any]:
+	"""
+	Latest reading of many scales with a single cache round trip.
+
+	`devices` is a list (or JSON / comma-separated string) of device ids; "*" or empty returns
+	every scale that sent a reading within `rfidenter_scale_ttl_sec`. Each item carries
+	`age_ms` since the server received the reading; devices without a live reading come back
+	with `ok: false` instead of another scale's value.
+	"""
+	if frappe.session.user and not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	raw = devices
+	if isinstance(raw, str):
+		raw = raw.strip()
+		if raw.startswith("["):
+			try:
+				raw = json.loads(raw)
+			except Exception:
+				frappe.throw("devices noto‘g‘ri.", frappe.ValidationError)
+		else:
+			raw = raw.split(",")
+	if raw is not None and not isinstance(raw, (list, tuple)):
+		frappe.throw("devices ro‘yxat bo‘lishi kerak.", frappe.ValidationError)
+
+	now_ms = _now_ms()
+	ttl = _scale_cache_ttl_sec()
+	keys = [k for k in dict.fromkeys(_normalize_device_id(d) for d in (raw or [])) if k]
+	wildcard = not keys or "*" in keys
+	if wildcard:
+		keys = scale_stream.active_devices(now_ms=now_ms, ttl_sec=ttl)
+	keys = keys[:SCALE_MULTI_MAX_DEVICES]
+
+	values = scale_stream.get_values([f"{SCALE_CACHE_PREFIX}{k}" for k in keys])
+	items = []
+	for key, reading in zip(keys, values, strict=True):
+		if not isinstance(reading, dict):
+			items.append({"device": key, "ok": False, "reading": {}, "age_ms": None})
+			continue
+		received = reading.get("received_ms")
+		age = max(0, now_ms - int(received)) if received is not None else None
+		items.append({"device": key, "ok": True, "reading": reading, "age_ms": age})
+	return {"ok": True, "wildcard": wildcard, "ttl_sec": ttl, "count": len(items), "items": items}
+
+
+@frappe.whitelist()
+def get_scale_history(
+	device: str | None = None, since_ms: Any | None = None, bucket_ms: Any | None = None
+) -> dict[str, Any]:
+	"""Recent readings of one scale from its ring buffer, downsampled to min/max/mean buckets."""
+	if frappe.session.user and not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	device_key = _normalize_device_id(device or "")
+	if not device_key:
+		frappe.throw("device kerak.", frappe.ValidationError)
+
+	try:
+		since = int(float(since_ms)) if since_ms not in (None, "") else None
+	except Exception:
+		frappe.throw("since_ms noto‘g‘ri.", frappe.ValidationError)
+	try:
+		bucket = int(float(bucket_ms)) if bucket_ms not in (None, "") else None
+	except Exception:
+		frappe.throw("bucket_ms noto‘g‘ri.", frappe.ValidationError)
+
+	return scale_stream.get_history(device_key, since_ms=since, bucket_ms=bucket)
+
+
+@frappe.whitelist()
+@replica.read_only
+def get_scale_rollup(
+	device: str | None = None,
+	since_ms: Any | None = None,
+	until_ms: Any | None = None,
+	bucket_ms: Any | None = None,
+) -> dict[str, Any]:
+	"""Time-bucketed min/max/mean of stored RFID Scale Reading rows (default: last 24 hours, 1-minute buckets)."""
+	if frappe.session.user and not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	device = str(device or "").strip()
+	if not device:
+		frappe.throw("device kerak.", frappe.ValidationError)
+
+	try:
+		until = int(float(until_ms)) if until_ms not in (None, "") else _now_ms()
+		since = int(float(since_ms)) if since_ms not in (None, "") else until - 24 * 3600 * 1000
+		bucket = int(float(bucket_ms)) if bucket_ms not in (None, "") else 60_000
+	except Exception:
+		frappe.throw("since_ms/until_ms/bucket_ms noto‘g‘ri.", frappe.ValidationError)
+
+	return scale_readings.rollup(device, since_ms=since, until_ms=until, bucket_ms=bucket)
+
+
+def _upsert_saved_tags(tags: list[dict[str, Any]], device: str, ts: Any | None = None) -> int:
+	if not tags:
+		return 0
+	device_norm = str(device or "").strip()[:64]
+	now = _datetime_from_ts_ms(ts)
+	day = now.date().isoformat()
+	rows: list[tuple[Any, ...]] = []
+	day_rows: list[tuple[Any, ...]] = []
+	for tag in tags:
+		if not isinstance(tag, dict):
+			continue
+		epc = _normalize_hex(tag.get("epcId") or tag.get("EPC") or "")
+		if not epc:
+			continue
+		cnt = _normalize_count(tag.get("count") or tag.get("reads") or tag.get("readCount") or 1)
+		rows.append((epc, epc, cnt, now, device_norm))
+		day_name = f"{epc}-{day}"
+		day_rows.append((day_name, epc, day, cnt, now, device_norm))
+
+	if not rows:
+		return 0
+
+	values_sql = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+	flat: list[Any] = [item for row in rows for item in row]
+	frappe.db.sql(
+		f"""
+		INSERT INTO `tabRFID Saved Tag` (`name`, `epc`, `reads`, `last_seen`, `device`)
+		VALUES {values_sql}
+		ON DUPLICATE KEY UPDATE
+			`reads` = `reads` + VALUES(`reads`),
+			`last_seen` = VALUES(`last_seen`),
+			`device` = VALUES(`device`)
+		""",
+		flat,
+	)
+
+	if day_rows:
+		values_day_sql = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(day_rows))
+		flat_day: list[Any] = [item for row in day_rows for item in row]
+		frappe.db.sql(
+			f"""
+			INSERT INTO `tabRFID Saved Tag Day` (`name`, `epc`, `day`, `reads`, `last_seen`, `device`)
+			VALUES {values_day_sql}
+			ON DUPLICATE KEY UPDATE
+				`reads` = `reads` + VALUES(`reads`),
+				`last_seen` = VALUES(`last_seen`),
+				`device` = VALUES(`device`)
+			""",
+			flat_day,
+		)
+
+	return len(rows)
+
+
+@frappe.whitelist()
+@replica.read_only
+def get_saved_tags(limit: Any | None = None, order: Any | None = None, date: Any | None = None) -> dict[str, Any]:
+	"""Fetch saved unique EPCs from DB."""
+	if not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	try:
+		lim = int(limit) if limit is not None else 200
+	except Exception:
+		lim = 200
+	lim = max(50, min(10_000, lim))
+
+	order_raw = str(order or "last").lower()
+	if order_raw == "reads":
+		order_by = "reads desc"
+	elif order_raw == "epc":
+		order_by = "epc asc"
+	else:
+		order_by = "last_seen desc"
 
 	date_raw = str(date or "").strip()
 	if date_raw:
@@ -1173,6 +1610,7 @@ def clear_saved_tags(date: Any | None = None) -> dict[str, Any]:
 	return {"ok": True}
 
 @frappe.whitelist()
+@replica.read_only
 def get_tag_notes(epcs: Any | None = None, limit: Any | None = None) -> dict[str, Any]:
 	"""Fetch EPC notes from DB. If `epcs` provided, returns only those."""
 	if not has_rfidenter_access():
@@ -1357,6 +1795,7 @@ def edge_batch_start(**kwargs) -> dict[str, Any]:
 	state.last_seen_at = frappe.utils.now_datetime()
 	state.last_event_seq = seq_val
 	state.save(ignore_permissions=True)
+	_publish_device_state(state, event_type="batch_start")
 
 	return {"ok": True, "event_id": event_id}
 
@@ -1417,6 +1856,7 @@ def edge_batch_stop(**kwargs) -> dict[str, Any]:
 	state.last_seen_at = frappe.utils.now_datetime()
 	state.last_event_seq = seq_val
 	state.save(ignore_permissions=True)
+	_publish_device_state(state, event_type="batch_stop")
 
 	return {"ok": True, "event_id": event_id}
 
@@ -1471,6 +1911,7 @@ def edge_product_switch(**kwargs) -> dict[str, Any]:
 	state.last_seen_at = frappe.utils.now_datetime()
 	state.last_event_seq = seq_val
 	state.save(ignore_permissions=True)
+	_publish_device_state(state, event_type="product_switch")
 
 	return {"ok": True, "event_id": event_id}
 
@@ -1536,6 +1977,7 @@ def device_status(**kwargs) -> dict[str, Any]:
 		state.pause_reason = pause_reason or None
 	state.last_seen_at = frappe.utils.now_datetime()
 	state.save(ignore_permissions=True)
+	_publish_device_state(state, event_type="device_status")
 
 	return {"ok": True, "event_id": event_id}
 
@@ -1676,117 +2118,438 @@ def edge_event_report(**kwargs) -> dict[str, Any]:
 	state.last_seen_at = frappe.utils.now_datetime()
 	state.last_event_seq = seq_val
 	state.save(ignore_permissions=True)
+	_publish_device_state(state, event_type="event_report")
 
 	return {"ok": True, "event_id": event_id}
 
 
-@frappe.whitelist(allow_guest=True)
-def register_agent(**kwargs) -> dict[str, Any]:
+EDGE_EVENT_QUERY_FIELDS = (
+	"name",
+	"event_id",
+	"device_id",
+	"batch_id",
+	"seq",
+	"event_type",
+	"received_at",
+	"processed",
+	"error",
+)
+
+
+def _encode_cursor(values: list[Any]) -> str:
+	raw = json.dumps(
+		[str(v) if isinstance(v, datetime.datetime) else v for v in values], separators=(",", ":")
+	)
+	return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(raw: Any, size: int) -> list[Any] | None:
+	s = str(raw or "").strip()
+	if not s:
+		return None
+	try:
+		values = json.loads(base64.urlsafe_b64decode(s + "=" * (-len(s) % 4)).decode("utf-8"))
+	except Exception:
+		frappe.throw("cursor noto‘g‘ri.", frappe.ValidationError)
+	if not isinstance(values, list) or len(values) != size:
+		frappe.throw("cursor noto‘g‘ri.", frappe.ValidationError)
+	return values
+
+
+@frappe.whitelist()
+def query_edge_events(
+	order: str | None = None,
+	cursor: str | None = None,
+	device_id: str | None = None,
+	batch_id: str | None = None,
+	event_type: Any | None = None,
+	include_payload: Any | None = None,
+	limit: Any | None = None,
+) -> dict[str, Any]:
 	"""
-	Register/heartbeat a local Node RFID agent (bridge).
+	Browse RFID Edge Event with keyset pagination (no OFFSET).
 
-	Node tarafdan yuboriladigan tavsiya payload:
-	{
-	  "agent_id": "pc-1",
-	  "device": "pc-1",
-	  "ui_urls": ["http://192.168.1.10:8787", "http://127.0.0.1:8787"],
-	  "ui_port": 8787,
-	  "ui_host": "0.0.0.0",
-	  "platform": "linux",
-	  "version": "rfid-web-localhost",
-	  "ts": 1730000000000
-	}
+	order:
+	- "seq": (device_id, batch_id, seq) ascending; sequenced events only.
+	- "received" (default) / "received_asc": (received_at, name) newest first / oldest first.
+
+	Pass back `next_cursor` to fetch the following page. Payloads are decoded only with `include_payload`.
 	"""
-	_require_auth_for_ingest()
-	if frappe.session.user and frappe.session.user != "Guest" and not has_rfidenter_access():
+	if not has_rfidenter_access():
 		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
 
-	body = {}
 	try:
-		body = frappe.request.get_json(silent=True) or {}
+		lim = int(limit) if limit is not None else 100
 	except Exception:
-		body = {}
-
-	if not body:
-		try:
-			body = dict(frappe.local.form_dict or {})
-		except Exception:
-			body = {}
-		body.update(kwargs or {})
-
-	device = str(body.get("device") or body.get("hostname") or "unknown").strip() or "unknown"
-	agent_id = _sanitize_agent_id(body.get("agent_id") or device) or _sanitize_agent_id(device)
-	if not agent_id:
-		agent_id = _sanitize_agent_id(getattr(frappe.local, "request_ip", "") or "agent")
+		lim = 100
+	lim = max(1, min(1000, lim))
 
-	ui_urls = body.get("ui_urls")
-	if isinstance(ui_urls, str):
-		try:
-			ui_urls = json.loads(ui_urls)
-		except Exception:
-			ui_urls = [ui_urls]
-	if ui_urls is None:
-		ui_urls = []
-	if not isinstance(ui_urls, list):
-		ui_urls = [ui_urls]
+	order_raw = str(order or "received").strip().lower()
+	if order_raw not in ("seq", "received", "received_asc"):
+		frappe.throw("order noto‘g‘ri.", frappe.ValidationError)
 
-	clean_urls: list[str] = []
-	for u in ui_urls:
-		s = str(u or "").strip()
-		if not s:
-			continue
-		clean_urls.append(s.rstrip("/"))
-	clean_urls = clean_urls[:10]
+	types: list[str] = []
+	if event_type:
+		if isinstance(event_type, str):
+			try:
+				parsed = json.loads(event_type)
+				event_type = parsed if isinstance(parsed, list) else [event_type]
+			except Exception:
+				event_type = [x.strip() for x in event_type.split(",") if x.strip()]
+		if not isinstance(event_type, list):
+			event_type = [event_type]
+		types = [str(t or "").strip() for t in event_type if str(t or "").strip()]
+
+	conditions: list[str] = []
+	values: list[Any] = []
+	device = _normalize_device_id(device_id)
+	batch = _normalize_batch_id(batch_id)
+	if device:
+		conditions.append("`device_id`=%s")
+		values.append(device)
+	if batch:
+		conditions.append("`batch_id`=%s")
+		values.append(batch)
+	if types:
+		conditions.append(f"`event_type` IN ({', '.join(['%s'] * len(types))})")
+		values.extend(types)
+
+	if order_raw == "seq":
+		key_fields = ["device_id", "batch_id", "seq"]
+		conditions.append("`batch_id` IS NOT NULL AND `seq` IS NOT NULL")
+		order_by = "`device_id` ASC, `batch_id` ASC, `seq` ASC"
+		compare = ">"
+	else:
+		key_fields = ["received_at", "name"]
+		conditions.append("`received_at` IS NOT NULL")
+		desc = order_raw == "received"
+		order_by = "`received_at` DESC, `name` DESC" if desc else "`received_at` ASC, `name` ASC"
+		compare = "<" if desc else ">"
+
+	after = _decode_cursor(cursor, len(key_fields))
+	if after is not None:
+		cols = ", ".join(f"`{f}`" for f in key_fields)
+		conditions.append(f"({cols}) {compare} ({', '.join(['%s'] * len(key_fields))})")
+		values.extend(after)
+
+	fields = list(EDGE_EVENT_QUERY_FIELDS)
+	want_payload = bool(_normalize_bool(include_payload))
+	if want_payload:
+		fields.append("payload_json")
+
+	where = " AND ".join(conditions)
+	rows = frappe.db.sql(
+		f"""
+		SELECT {", ".join(f"`{f}`" for f in fields)}
+		FROM `tabRFID Edge Event`
+		WHERE {where}
+		ORDER BY {order_by}
+		LIMIT %s
+		""",
+		(*values, lim + 1),
+		as_dict=True,
+	)
 
-	payload: dict[str, Any] = {
-		"agent_id": agent_id,
-		"device": device,
-		"ui_urls": clean_urls,
-		"ui_host": str(body.get("ui_host") or "").strip(),
-		"ui_port": body.get("ui_port"),
-		"platform": str(body.get("platform") or "").strip(),
-		"version": str(body.get("version") or "").strip(),
-		"pid": body.get("pid"),
-		"request_ip": str(getattr(frappe.local, "request_ip", "") or "").strip(),
-		"user": frappe.session.user,
-		"last_seen": _now_ms(),
-	}
+	has_more = len(rows) > lim
+	rows = rows[:lim]
+	items: list[dict[str, Any]] = []
+	for row in rows:
+		item = dict(row)
+		if want_payload:
+			raw = item.pop("payload_json", None)
+			try:
+				raw = payload_codec.decode(raw)
+				item["payload"] = json.loads(raw) if raw else {}
+			except Exception:
+				item["payload"] = {}
+		items.append(item)
 
-	frappe.cache().hset(AGENT_CACHE_HASH, agent_id, payload)
-	return {"ok": True, "agent": payload}
+	next_cursor = _encode_cursor([rows[-1].get(f) for f in key_fields]) if has_more and rows else None
+	return {"ok": True, "order": order_raw, "count": len(items), "items": items, "next_cursor": next_cursor}
 
 
 @frappe.whitelist()
-def list_agents() -> dict[str, Any]:
-	"""List online agents recently seen via register_agent()."""
+def get_edge_event(event_id: str = "") -> dict[str, Any]:
+	"""Fetch one edge event by event_id from the live table, falling back to the cold archive."""
 	if not has_rfidenter_access():
 		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
 
-	ttl_sec = _agent_ttl_sec()
-	cutoff = _now_ms() - (ttl_sec * 1000)
-
-	raw = frappe.cache().hgetall(AGENT_CACHE_HASH) or {}
-
-	agents: list[dict[str, Any]] = []
-	stale_keys: list[str] = []
-	for k, v in raw.items():
-		agent_key = k.decode() if isinstance(k, (bytes, bytearray)) else str(k)
-		if not isinstance(v, dict):
-			continue
-		last_seen = int(v.get("last_seen") or 0)
-		if last_seen < cutoff:
-			stale_keys.append(agent_key)
-			continue
-		agents.append(v)
-
-	for key in stale_keys:
-		try:
-			frappe.cache().hdel(AGENT_CACHE_HASH, key)
-		except Exception:
-			pass
+	eid = _normalize_event_id(event_id)
+	if not eid:
+		frappe.throw("event_id kerak.", frappe.ValidationError)
 
-	agents.sort(key=lambda a: int(a.get("last_seen") or 0), reverse=True)
-	return {"ok": True, "ttl_sec": ttl_sec, "agents": agents}
+	row = frappe.db.get_value(
+		"RFID Edge Event",
+		{"event_id": eid},
+		[*EDGE_EVENT_QUERY_FIELDS, "payload_json", "payload_hash"],
+		as_dict=True,
+	)
+	archived = False
+	if not row:
+		row = edge_archive.find_archived_event(eid)
+		archived = bool(row)
+	if not row:
+		return {"ok": False, "error": "not found"}
+
+	item = dict(row)
+	raw = item.pop("payload_json", None)
+	try:
+		raw = payload_codec.decode(raw)
+		item["payload"] = json.loads(raw) if raw else {}
+	except Exception:
+		item["payload"] = {}
+	return {"ok": True, "archived": archived, "event": item}
+
+
+@frappe.whitelist()
+def query_archived_edge_events(
+	month: str = "",
+	device_id: str | None = None,
+	batch_id: str | None = None,
+	event_type: Any | None = None,
+	cursor: str | None = None,
+	limit: Any | None = None,
+) -> dict[str, Any]:
+	"""
+	Browse archived edge events of one month (YYYY-MM) straight from the compressed archive files.
+
+	Pass back `next_cursor` to fetch the following page; it records the archive file and line to resume at.
+	"""
+	if not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	try:
+		lim = int(limit) if limit is not None else 100
+	except Exception:
+		lim = 100
+
+	types: list[str] = []
+	if event_type:
+		if isinstance(event_type, str):
+			types = [x.strip() for x in event_type.split(",") if x.strip()]
+		elif isinstance(event_type, list):
+			types = [str(x or "").strip() for x in event_type if str(x or "").strip()]
+
+	res = edge_archive.query_archived_events(
+		month=str(month or "").strip(),
+		device_id=_normalize_device_id(device_id) or None,
+		batch_id=_normalize_batch_id(batch_id) or None,
+		event_types=types,
+		after=_decode_cursor(cursor, 2),
+		limit=max(1, min(1000, lim)),
+	)
+	after = res.pop("next_after", None)
+	res["next_cursor"] = _encode_cursor(after) if after else None
+	return res
+
+
+@frappe.whitelist()
+def archive_edge_events(month: str | None = None) -> dict[str, Any]:
+	"""Archive one closed month (or every closed month) of RFID Edge Event to compressed JSONL."""
+	if frappe.session.user != "Administrator" and not frappe.has_role("System Manager"):
+		frappe.throw("RFIDenter: ruxsat yo‘q.", frappe.PermissionError)
+
+	month_raw = str(month or "").strip()
+	if month_raw:
+		return edge_archive.archive_month(month_raw)
+	frappe.enqueue(
+		"rfidenter.rfidenter.edge_archive.archive_closed_months",
+		queue="long",
+		timeout=6 * 3600,
+		job_id="rfidenter-archive-edge-events",
+		deduplicate=True,
+	)
+	return {"ok": True, "queued": True}
+
+
+@frappe.whitelist()
+def rebuild_batch_state(device_id: str | None = None, repair: Any | None = None) -> dict[str, Any]:
+	"""
+	Replay the edge event log to verify RFID Batch State.
+
+	With `device_id` the device is replayed inline; without it one job per device is queued.
+	"""
+	if frappe.session.user != "Administrator" and not frappe.has_role("System Manager"):
+		frappe.throw("RFIDenter: ruxsat yo‘q.", frappe.PermissionError)
+
+	should_repair = bool(_normalize_bool(repair))
+	device = _normalize_device_id(device_id)
+	if device:
+		return batch_projection.rebuild_device(device, repair=should_repair)
+	return batch_projection.rebuild_all(repair=should_repair, enqueue=True)
+
+
+@frappe.whitelist()
+def get_batch_summaries(
+	device_id: str | None = None, batch_id: str | None = None, limit: Any | None = None
+) -> dict[str, Any]:
+	"""Per-batch totals (events by type, weights, labels, first/last event) from RFID Batch Summary."""
+	if not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	return batch_summary.get_summaries(
+		device_id=_normalize_device_id(device_id) or None,
+		batch_id=_normalize_batch_id(batch_id) or None,
+		limit=limit,
+	)
+
+
+@frappe.whitelist()
+def list_seq_anomalies(
+	device_id: str | None = None,
+	batch_id: str | None = None,
+	include_clean: Any | None = None,
+	limit: Any | None = None,
+) -> dict[str, Any]:
+	"""List (device, batch) seq trackers with gaps, out-of-order arrivals, regressions or stalls."""
+	if not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	return edge_seq.list_anomalies(
+		device_id=_normalize_device_id(device_id) or None,
+		batch_id=_normalize_batch_id(batch_id) or None,
+		include_clean=bool(_normalize_bool(include_clean)),
+		limit=limit,
+	)
+
+
+@frappe.whitelist()
+def get_edge_event_backlog() -> dict[str, Any]:
+	"""Per-device counts of edge events still waiting for (or failing in) the background consumer."""
+	if not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	return edge_consumer.get_backlog()
+
+
+@frappe.whitelist()
+def drain_edge_events(device_id: str | None = None) -> dict[str, Any]:
+	"""Run the edge event consumer now: inline for one device, otherwise one queued job per device."""
+	if frappe.session.user != "Administrator" and not frappe.has_role("System Manager"):
+		frappe.throw("RFIDenter: ruxsat yo‘q.", frappe.PermissionError)
+
+	device = _normalize_device_id(device_id)
+	if device:
+		return edge_consumer.drain_device(device)
+	return edge_consumer.dispatch()
+
+
+@frappe.whitelist()
+def run_retention(background: Any | None = None) -> dict[str, Any]:
+	"""Apply the `rfidenter_retention` purge policies now (inline, or queued with `background=1`)."""
+	if frappe.session.user != "Administrator" and not frappe.has_role("System Manager"):
+		frappe.throw("RFIDenter: ruxsat yo‘q.", frappe.PermissionError)
+
+	if _normalize_bool(background):
+		frappe.enqueue(
+			"rfidenter.rfidenter.retention.run_retention",
+			queue="long",
+			timeout=3600,
+			job_id="rfidenter-retention",
+			deduplicate=True,
+		)
+		return {"ok": True, "queued": True}
+	return retention.run_retention()
+
+
+@frappe.whitelist()
+def get_retention_status() -> dict[str, Any]:
+	"""Effective retention policies and the report of the last purge run."""
+	if frappe.session.user != "Administrator" and not frappe.has_role("System Manager"):
+		frappe.throw("RFIDenter: ruxsat yo‘q.", frappe.PermissionError)
+
+	return retention.get_status()
+
+
+@frappe.whitelist(allow_guest=True)
+def register_agent(**kwargs) -> dict[str, Any]:
+	"""
+	Register/heartbeat a local Node RFID agent (bridge).
+
+	Node tarafdan yuboriladigan tavsiya payload:
+	{
+	  "agent_id": "pc-1",
+	  "device": "pc-1",
+	  "ui_urls": ["http://192.168.1.10:8787", "http://127.0.0.1:8787"],
+	  "ui_port": 8787,
+	  "ui_host": "0.0.0.0",
+	  "platform": "linux",
+	  "version": "rfid-web-localhost",
+	  "ts": 1730000000000
+	}
+	"""
+	_require_auth_for_ingest()
+	if frappe.session.user and frappe.session.user != "Guest" and not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	body = {}
+	try:
+		body = frappe.request.get_json(silent=True) or {}
+	except Exception:
+		body = {}
+
+	if not body:
+		try:
+			body = dict(frappe.local.form_dict or {})
+		except Exception:
+			body = {}
+		body.update(kwargs or {})
+
+	device = str(body.get("device") or body.get("hostname") or "unknown").strip() or "unknown"
+	agent_id = _sanitize_agent_id(body.get("agent_id") or device) or _sanitize_agent_id(device)
+	if not agent_id:
+		agent_id = _sanitize_agent_id(getattr(frappe.local, "request_ip", "") or "agent")
+
+	ui_urls = body.get("ui_urls")
+	if isinstance(ui_urls, str):
+		try:
+			ui_urls = json.loads(ui_urls)
+		except Exception:
+			ui_urls = [ui_urls]
+	if ui_urls is None:
+		ui_urls = []
+	if not isinstance(ui_urls, list):
+		ui_urls = [ui_urls]
+
+	clean_urls: list[str] = []
+	for u in ui_urls:
+		s = str(u or "").strip()
+		if not s:
+			continue
+		clean_urls.append(s.rstrip("/"))
+	clean_urls = clean_urls[:10]
+
+	payload: dict[str, Any] = {
+		"agent_id": agent_id,
+		"device": device,
+		"ui_urls": clean_urls,
+		"ui_host": str(body.get("ui_host") or "").strip(),
+		"ui_port": body.get("ui_port"),
+		"platform": str(body.get("platform") or "").strip(),
+		"version": str(body.get("version") or "").strip(),
+		"pid": body.get("pid"),
+		"request_ip": str(getattr(frappe.local, "request_ip", "") or "").strip(),
+		"user": frappe.session.user,
+		"last_seen": _now_ms(),
+	}
+
+	agent_registry.touch(payload)
+	return {"ok": True, "agent": payload}
+
+
+@frappe.whitelist()
+def list_agents() -> dict[str, Any]:
+	"""List online agents recently seen via register_agent()."""
+	if not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	ttl_sec = _agent_ttl_sec()
+	return {"ok": True, "ttl_sec": ttl_sec, "agents": _live_agents(ttl_sec)}
+
+
+def _live_agents(ttl_sec: int) -> list[dict[str, Any]]:
+	"""Registry entries seen within `ttl_sec`, newest first (stale ones are pruned by a scheduler job)."""
+	return agent_registry.live(ttl_sec, now_ms=_now_ms())
 
 
 @frappe.whitelist()
@@ -1795,12 +2558,14 @@ def agent_enqueue(
 	command: str = "",
 	args: Any | None = None,
 	timeout_sec: Any | None = None,
+	priority: Any | None = None,
 	**kwargs,
 ) -> dict[str, Any]:
 	"""
 	Enqueue an RPC command for a given agent.
 
 	Returns `request_id`, then UI can poll `agent_result(request_id)` (or listen to realtime event).
+	`priority` ("urgent", "normal", "bulk") defaults by command; urgent requests are handed out first.
 	"""
 	if not has_rfidenter_access():
 		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
@@ -1819,20 +2584,27 @@ def agent_enqueue(
 	if not command_str:
 		frappe.throw("command bo‘sh bo‘lmasin.", frappe.ValidationError)
 
-	if isinstance(args, str):
-		try:
-			args = json.loads(args)
-		except Exception:
-			args = {}
-	if args is None:
-		args = {}
-	if not isinstance(args, dict):
-		args = {"value": args}
-
+	args = _agent_args(args)
 	timeout = _rpc_timeout_sec(timeout_sec)
+	prio = agent_queue.priority_for(command_str, priority)
 	ts = _now_ms()
 
 	request_id = frappe.generate_hash(length=20)
+	if agent_queue.is_enabled():
+		agent_queue.push(
+			{
+				"request_id": request_id,
+				"agent_id": agent,
+				"command": command_str,
+				"args": args,
+				"requested_by": user,
+				"timeout_sec": timeout,
+				"priority": prio,
+				"request_ts": ts,
+			}
+		)
+		return {"ok": True, "request_id": request_id, "timeout_sec": timeout}
+
 	args_json = _json_dump(args)
 
 	doc = frappe.get_doc(
@@ -1845,20 +2617,278 @@ def agent_enqueue(
 			"requested_by": user,
 			"status": "Queued",
 			"timeout_sec": timeout,
+			"priority": prio,
 			"request_ts": ts,
 		}
 	)
 	doc.insert(ignore_permissions=True)
+	# Wake long-polling agent_poll calls once the row is visible to them.
+	frappe.db.after_commit.add(lambda: agent_queue.notify(agent))
 
 	return {"ok": True, "request_id": request_id, "timeout_sec": timeout}
 
 
+def _agent_args(args: Any) -> dict[str, Any]:
+	if isinstance(args, str):
+		try:
+			args = json.loads(args)
+		except Exception:
+			args = {}
+	if args is None:
+		args = {}
+	if not isinstance(args, dict):
+		args = {"value": args}
+	return args
+
+
+@frappe.whitelist()
+def agent_broadcast(
+	command: str = "",
+	args: Any | None = None,
+	selector: Any | None = None,
+	timeout_sec: Any | None = None,
+	priority: Any | None = None,
+	**kwargs,
+) -> dict[str, Any]:
+	"""
+	Enqueue one command for many live agents with a single write.
+
+	`selector` picks agents from the registry: "*" or empty for every live agent, a list of agent
+	ids, or a dict with any of `agent_ids`, `prefix`, `device`, `platform`, `version`. Returns a
+	`broadcast_id` for agent_broadcast_status.
+	"""
+	if not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+	if frappe.session.user != "Administrator" and not frappe.has_role("System Manager"):
+		frappe.throw("Faqat System Manager barcha agentlarga buyruq yubora oladi.", frappe.PermissionError)
+
+	user = frappe.session.user
+	command_str = str(command or kwargs.get("command") or "").strip()
+	if not command_str:
+		frappe.throw("command bo‘sh bo‘lmasin.", frappe.ValidationError)
+
+	args = _agent_args(args)
+	agents, offline = _select_agents(selector)
+	if not agents:
+		frappe.throw("Mos keladigan onlayn agent topilmadi.", frappe.ValidationError)
+	if len(agents) > AGENT_BROADCAST_MAX:
+		frappe.throw(f"Ko‘pi bilan {AGENT_BROADCAST_MAX} ta agentga yuborish mumkin.", frappe.ValidationError)
+
+	timeout = _rpc_timeout_sec(timeout_sec)
+	prio = agent_queue.priority_for(command_str, priority)
+	ts = _now_ms()
+	requests = [
+		{
+			"request_id": frappe.generate_hash(length=20),
+			"agent_id": agent,
+			"command": command_str,
+			"args": args,
+			"requested_by": user,
+			"timeout_sec": timeout,
+			"priority": prio,
+			"request_ts": ts,
+		}
+		for agent in agents
+	]
+	broadcast_id = frappe.generate_hash(length=20)
+	record = {
+		"command": command_str,
+		"requested_by": user,
+		"request_ts": ts,
+		"timeout_sec": timeout,
+		"targets": {r["agent_id"]: r["request_id"] for r in requests},
+	}
+	record_ttl = timeout + agent_queue.REPLY_TTL_SEC
+
+	if agent_queue.is_enabled():
+		agent_queue.push_many(requests)
+		agent_queue.save_broadcast(broadcast_id, record, record_ttl)
+	else:
+		_insert_agent_requests(requests)
+
+		def after_commit() -> None:
+			agent_queue.save_broadcast(broadcast_id, record, record_ttl)
+			agent_queue.notify(*agents)
+
+		frappe.db.after_commit.add(after_commit)
+
+	return {
+		"ok": True,
+		"broadcast_id": broadcast_id,
+		"timeout_sec": timeout,
+		"agents": agents,
+		"offline": offline,
+	}
+
+
+def _select_agents(selector: Any) -> tuple[list[str], list[str]]:
+	"""Live agent ids matching the selector, and explicitly named agent ids that are not live."""
+	sel = selector
+	if isinstance(sel, str):
+		sel = sel.strip()
+		if sel.startswith(("{", "[")):
+			try:
+				sel = json.loads(sel)
+			except Exception:
+				frappe.throw("selector noto‘g‘ri.", frappe.ValidationError)
+		elif sel in ("", "*"):
+			sel = {}
+		else:
+			sel = {"agent_ids": sel.split(",")}
+	if sel is None:
+		sel = {}
+	if isinstance(sel, list):
+		sel = {"agent_ids": sel}
+	if not isinstance(sel, dict):
+		frappe.throw("selector noto‘g‘ri.", frappe.ValidationError)
+
+	wanted = sel.get("agent_ids") or []
+	if isinstance(wanted, str):
+		wanted = wanted.split(",")
+	ids = {a for a in (_sanitize_agent_id(w) for w in wanted) if a}
+	prefix = str(sel.get("prefix") or "").strip()
+	match = {
+		k: str(sel[k]).strip() for k in ("device", "platform", "version") if sel.get(k) not in (None, "")
+	}
+
+	agents: list[str] = []
+	for entry in _live_agents(_agent_ttl_sec()):
+		agent = str(entry.get("agent_id") or "")
+		if not agent or (ids and agent not in ids) or not agent.startswith(prefix):
+			continue
+		if any(str(entry.get(k) or "").strip() != v for k, v in match.items()):
+			continue
+		agents.append(agent)
+	return agents, sorted(ids - set(agents))
+
+
+def _insert_agent_requests(requests: list[dict[str, Any]]) -> None:
+	# One multi-row INSERT; the controller's only hook (the payload codec) is applied here.
+	now = frappe.utils.now_datetime()
+	user = frappe.session.user
+	values = [
+		(
+			r["request_id"],
+			r["request_id"],
+			r["agent_id"],
+			r["command"],
+			payload_codec.encode(_json_dump(r["args"])),
+			r["requested_by"],
+			"Queued",
+			r["timeout_sec"],
+			r["priority"],
+			r["request_ts"],
+			now,
+			now,
+			user,
+			user,
+		)
+		for r in requests
+	]
+	frappe.db.bulk_insert("RFID Agent Request", list(AGENT_INSERT_FIELDS), values)
+
+
+@frappe.whitelist()
+def agent_broadcast_status(broadcast_id: str = "") -> dict[str, Any]:
+	"""Per-agent progress of an agent_broadcast call, with a count per state."""
+	if not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	user = frappe.session.user
+	if not user or user == "Guest":
+		frappe.throw("Login qiling.", frappe.PermissionError)
+
+	bid = str(broadcast_id or "").strip()
+	if not bid:
+		frappe.throw("broadcast_id bo‘sh.", frappe.ValidationError)
+
+	record = agent_queue.get_broadcast(bid)
+	if record is None:
+		return {"ok": True, "broadcast_id": bid, "state": "expired", "counts": {}, "items": []}
+	_check_agent_result_access(record.get("requested_by"), user)
+
+	targets = record.get("targets") or {}
+	agents = list(targets)
+	rids = [targets[a] for a in agents]
+	replies = agent_queue.get_replies(rids)
+
+	# Requests without a cached result: one MGET (Redis) or one IN query (DocType).
+	open_ids = [rid for rid, reply in zip(rids, replies, strict=True) if reply is None]
+	statuses: dict[str, str] = {}
+	if open_ids and agent_queue.is_enabled():
+		statuses = {
+			rid: str(req.get("status") or "")
+			for rid, req in zip(open_ids, agent_queue.get_requests(open_ids), strict=True)
+			if req is not None
+		}
+	elif open_ids:
+		statuses = dict(
+			frappe.db.sql(
+				f"""
+				SELECT `name`, `status` FROM `tabRFID Agent Request`
+				WHERE `name` IN ({", ".join(["%s"] * len(open_ids))})
+				""",
+				tuple(open_ids),
+			)
+		)
+
+	timed_out = _now_ms() - int(record.get("request_ts") or 0) > int(record.get("timeout_sec") or 0) * 1000
+	items = []
+	counts: dict[str, int] = {}
+	for agent, rid, reply in zip(agents, rids, replies, strict=True):
+		item: dict[str, Any] = {"agent_id": agent, "request_id": rid}
+		if reply is not None:
+			if reply.get("expired"):
+				state = "expired"
+			else:
+				state = "done" if reply.get("ok") else "failed"
+				item["reply"] = {k: v for k, v in reply.items() if k != "requested_by"}
+		else:
+			status = statuses.get(rid)
+			if status in ("Done", "Failed"):
+				state = status.lower()
+			elif timed_out or not status:
+				state = "expired"
+			else:
+				state = status.lower()
+		item["state"] = state
+		counts[state] = counts.get(state, 0) + 1
+		items.append(item)
+
+	pending = counts.get("queued", 0) + counts.get("sent", 0)
+	return {
+		"ok": True,
+		"broadcast_id": bid,
+		"command": record.get("command"),
+		"state": "pending" if pending else "complete",
+		"counts": counts,
+		"items": items,
+	}
+
+
+AGENT_POLL_FIELDS = (
+	"name",
+	"request_id",
+	"agent_id",
+	"command",
+	"args_json",
+	"timeout_sec",
+	"priority",
+	"request_ts",
+	"requested_by",
+	"creation",
+)
+
+
 @frappe.whitelist()
-def agent_poll(agent_id: str = "", max_items: Any | None = None, **kwargs) -> dict[str, Any]:
+def agent_poll(
+	agent_id: str = "", max_items: Any | None = None, wait_sec: Any | None = None, **kwargs
+) -> dict[str, Any]:
 	"""
 	Agent-side: poll for queued commands.
 
-	Node agent calls this frequently (poll loop).
+	Node agent calls this frequently (poll loop). With `wait_sec` the call blocks until a command
+	is enqueued for the agent or the wait (capped by `rfidenter_agent_long_poll_max_sec`) expires.
 	"""
 	if not has_rfidenter_access():
 		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
@@ -1880,75 +2910,147 @@ def agent_poll(agent_id: str = "", max_items: Any | None = None, **kwargs) -> di
 		limit = 5
 	limit = max(1, min(25, limit))
 
+	try:
+		wait = float(wait_sec) if wait_sec not in (None, "") else 0.0
+	except Exception:
+		wait = 0.0
+	wait = max(0.0, min(float(agent_queue.long_poll_max_sec()), wait))
+
+	commands = _claim_agent_commands(agent, limit)
+	if commands or wait <= 0:
+		return {"ok": True, "agent_id": agent, "commands": commands}
+
+	# Long poll: park on the agent's notify list instead of re-querying until something arrives.
+	deadline = time.monotonic() + wait
+	with agent_queue.long_poll_slot(wait) as granted:
+		if not granted:
+			# Every long-poll slot is in use; answer now so web workers stay available.
+			return {"ok": True, "agent_id": agent, "commands": [], "busy": True}
+		while not commands:
+			# End the read snapshot so requests committed while we wait are visible to the next claim.
+			frappe.db.commit()
+			if not agent_queue.wait_notify(agent, deadline - time.monotonic()):
+				break
+			commands = _claim_agent_commands(agent, limit)
+
+	return {"ok": True, "agent_id": agent, "commands": commands, "waited": True}
+
+
+def _claim_agent_commands(agent: str, limit: int) -> list[dict[str, Any]]:
+	if agent_queue.is_enabled():
+		return [_agent_command(req, agent) for req in agent_queue.claim(agent, limit)]
+
+	commands: list[dict[str, Any]] = []
+	# Requests whose requester already gave up are failed here instead of being delivered for the
+	# agent to discard; a few rounds refill the batch when the head of the queue was all stale.
+	for _ in range(3):
+		rows = _lock_agent_requests(agent, limit - len(commands))
+		if not rows:
+			break
+		now_ms = _now_ms()
+		stale = [r for r in rows if agent_queue.deadline_passed(r, now_ms)]
+		live = [r for r in rows if not agent_queue.deadline_passed(r, now_ms)]
+		if stale:
+			_fail_stale_agent_requests(stale)
+		if live:
+			_lease_agent_requests(live)
+		for row in live:
+			try:
+				args_json = payload_codec.decode(row.get("args_json") or "")
+				args_obj = json.loads(args_json) if args_json else {}
+			except Exception:
+				args_obj = {}
+			commands.append(_agent_command({**row, "args": args_obj}, agent))
+		if not stale or len(commands) >= limit:
+			break
+
+	return commands
+
+
+def _agent_priority(request: dict[str, Any]) -> int:
+	priority = request.get("priority")
+	return int(priority) if priority is not None else agent_queue.DEFAULT_PRIORITY
+
+
+def _lock_agent_requests(agent: str, limit: int) -> list[dict[str, Any]]:
+	# Lease-expired and queued requests are locked separately so each walks its own index in order
+	# (agent_id, status, lease_expires_at) / (agent_id, status, priority, creation). SKIP LOCKED lets
+	# parallel pollers of the same agent claim disjoint rows instead of queueing behind each other.
+	cols = ", ".join(f"`{f}`" for f in AGENT_POLL_FIELDS)
 	rows = frappe.db.sql(
-		"""
-		SELECT
-			`name`,
-			`request_id`,
-			`agent_id`,
-			`command`,
-			`args_json`,
-			`timeout_sec`,
-			`request_ts`,
-			`requested_by`
+		f"""
+		SELECT {cols}
 		FROM `tabRFID Agent Request`
-		WHERE `agent_id`=%s
-		  AND (
-				`status`='Queued'
-				OR (`status`='Sent' AND (`lease_expires_at` IS NULL OR `lease_expires_at` < NOW()))
-			)
-		ORDER BY `creation` ASC
+		WHERE `agent_id`=%s AND `status`='Sent' AND (`lease_expires_at` IS NULL OR `lease_expires_at` < NOW())
+		ORDER BY `lease_expires_at` ASC
 		LIMIT %s
+		FOR UPDATE SKIP LOCKED
 		""",
 		(agent, limit),
 		as_dict=True,
 	)
-
-	commands: list[dict[str, Any]] = []
-	for row in rows:
-		req_id = str(row.get("request_id") or "").strip()
-		if not req_id:
-			continue
-		lease_sec = int(row.get("timeout_sec") or 30)
-		if lease_sec <= 0:
-			lease_sec = 30
-		frappe.db.sql(
-			"""
-			UPDATE `tabRFID Agent Request`
-			SET `status`='Sent', `sent_at`=NOW(), `lease_expires_at`=DATE_ADD(NOW(), INTERVAL %s SECOND)
-			WHERE `name`=%s
-			  AND (
-					`status`='Queued'
-					OR (`status`='Sent' AND (`lease_expires_at` IS NULL OR `lease_expires_at` < NOW()))
-				)
+	if len(rows) < limit:
+		rows += frappe.db.sql(
+			f"""
+			SELECT {cols}
+			FROM `tabRFID Agent Request`
+			WHERE `agent_id`=%s AND `status`='Queued'
+			ORDER BY `priority` ASC, `creation` ASC
+			LIMIT %s
+			FOR UPDATE SKIP LOCKED
 			""",
-			(lease_sec, row.get("name") or req_id),
+			(agent, limit - len(rows)),
+			as_dict=True,
 		)
-		try:
-			if not getattr(frappe.db, "_cursor", None) or frappe.db._cursor.rowcount <= 0:
-				continue
-		except Exception:
-			pass
+	rows = [r for r in rows if str(r.get("request_id") or "").strip()]
+	# Rows written before the priority column existed are normal priority, never urgent.
+	rows.sort(key=lambda r: (_agent_priority(r), r.get("creation")))
+	return rows
 
-		args_json = row.get("args_json") or ""
-		try:
-			args_obj = json.loads(args_json) if args_json else {}
-		except Exception:
-			args_obj = {}
 
-		commands.append(
-			{
-				"request_id": req_id,
-				"agent_id": row.get("agent_id") or agent,
-				"cmd": row.get("command") or "",
-				"args": args_obj,
-				"requested_by": row.get("requested_by") or "",
-				"ts": int(row.get("request_ts") or 0),
-				"timeout_sec": int(row.get("timeout_sec") or 0),
-			}
-		)
+def _lease_agent_requests(rows: list[dict[str, Any]]) -> None:
+	# The rows are locked by this transaction, so one UPDATE leases them all (no per-row round trip).
+	frappe.db.sql(
+		f"""
+		UPDATE `tabRFID Agent Request`
+		SET `status`='Sent', `sent_at`=NOW(),
+			`lease_expires_at`=DATE_ADD(NOW(), INTERVAL IF(`timeout_sec` > 0, `timeout_sec`, 30) SECOND)
+		WHERE `name` IN ({", ".join(["%s"] * len(rows))})
+		""",
+		tuple(r.get("name") for r in rows),
+	)
+
+
+def _fail_stale_agent_requests(rows: list[dict[str, Any]]) -> None:
+	frappe.db.sql(
+		f"""
+		UPDATE `tabRFID Agent Request`
+		SET `status`='Failed', `ok`=0, `error`='timeout', `lease_expires_at`=NULL, `modified`=NOW()
+		WHERE `name` IN ({", ".join(["%s"] * len(rows))})
+		""",
+		tuple(r.get("name") for r in rows),
+	)
 
-	return {"ok": True, "agent_id": agent, "commands": commands}
+	def cache_expired() -> None:
+		for row in rows:
+			agent_queue.store_expired(row.get("request_id"), row.get("requested_by"))
+
+	# Wake agent_wait_result callers with "expired" once the rows are committed.
+	frappe.db.after_commit.add(cache_expired)
+
+
+def _agent_command(req: dict[str, Any], agent: str) -> dict[str, Any]:
+	"""Command shape the Node agent's RPC loop expects, from a DocType row or a Redis snapshot."""
+	return {
+		"request_id": req.get("request_id"),
+		"agent_id": req.get("agent_id") or agent,
+		"cmd": req.get("command") or "",
+		"args": req.get("args") if isinstance(req.get("args"), dict) else {},
+		"requested_by": req.get("requested_by") or "",
+		"ts": int(req.get("request_ts") or 0),
+		"timeout_sec": int(req.get("timeout_sec") or 0),
+		"priority": _agent_priority(req),
+	}
 
 
 @frappe.whitelist()
@@ -1979,11 +3081,58 @@ def agent_reply(
 	if not rid:
 		frappe.throw("request_id bo‘sh.", frappe.ValidationError)
 
-	doc = frappe.get_doc("RFID Agent Request", rid)
-	timeout = _rpc_timeout_sec(doc.timeout_sec)
+	reply = _agent_reply_payload(agent, rid, ok, result, error)
+	if _record_agent_replies([reply]):
+		frappe.throw(f"Request topilmadi: {rid}", frappe.DoesNotExistError)
+	return {"ok": True}
 
+
+@frappe.whitelist()
+def agent_reply_bulk(agent_id: str = "", replies: Any | None = None) -> dict[str, Any]:
+	"""
+	Agent-side: post several RPC results in one call.
+
+	`replies` is a list (or JSON string) of `{request_id, ok, result, error}`. Unknown request ids
+	are reported back instead of failing the whole batch.
+	"""
+	if not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	user = frappe.session.user
+	if not user or user == "Guest":
+		frappe.throw("Login qiling.", frappe.PermissionError)
+
+	agent = _sanitize_agent_id(agent_id)
+	if not agent:
+		frappe.throw("agent_id noto‘g‘ri.", frappe.ValidationError)
+
+	items = replies
+	if isinstance(items, str):
+		try:
+			items = json.loads(items)
+		except Exception:
+			frappe.throw("replies noto‘g‘ri.", frappe.ValidationError)
+	if not isinstance(items, list):
+		frappe.throw("replies ro‘yxat bo‘lishi kerak.", frappe.ValidationError)
+	if len(items) > AGENT_REPLY_BULK_MAX:
+		frappe.throw(
+			f"replies ko‘pi bilan {AGENT_REPLY_BULK_MAX} ta bo‘lishi mumkin.", frappe.ValidationError
+		)
+
+	batch = []
+	for item in items:
+		rid = str((item or {}).get("request_id") or "").strip() if isinstance(item, dict) else ""
+		if not rid:
+			frappe.throw("request_id bo‘sh.", frappe.ValidationError)
+		batch.append(_agent_reply_payload(agent, rid, item.get("ok"), item.get("result"), item.get("error")))
+
+	unknown = _record_agent_replies(batch)
+	return {"ok": True, "accepted": len(batch) - len(unknown), "unknown": unknown}
+
+
+def _agent_reply_payload(agent: str, rid: str, ok: Any, result: Any, error: Any) -> dict[str, Any]:
 	is_ok = bool(ok) if ok is not None else error is None
-	reply = {
+	return {
 		"request_id": rid,
 		"agent_id": agent,
 		"ok": is_ok,
@@ -1992,24 +3141,179 @@ def agent_reply(
 		"ts": _now_ms(),
 	}
 
-	doc.status = "Done" if is_ok else "Failed"
-	doc.ok = 1 if is_ok else 0
-	doc.result_json = _json_dump(result) if is_ok else ""
-	doc.error = str(error or "") if not is_ok else ""
-	doc.lease_expires_at = None
-	doc.replied_at = frappe.utils.now_datetime()
-	doc.save(ignore_permissions=True)
 
+def _record_agent_replies(replies: list[dict[str, Any]]) -> list[str]:
+	"""Store replies and notify requesters. Returns the request ids neither transport knows."""
+	pending = replies
+	if agent_queue.is_enabled():
+		pending = []
+		for reply in replies:
+			request = agent_queue.complete(reply["request_id"], reply)
+			if request is None:
+				# Requests queued before the switch to Redis still live only in the DocType.
+				pending.append(reply)
+			else:
+				_publish_agent_reply(reply, request.get("requested_by"))
+	if not pending:
+		return []
+
+	names = list(dict.fromkeys(r["request_id"] for r in pending))
+	owners = dict(
+		frappe.db.sql(
+			f"""
+			SELECT `name`, `requested_by` FROM `tabRFID Agent Request`
+			WHERE `name` IN ({", ".join(["%s"] * len(names))})
+			""",
+			tuple(names),
+		)
+	)
+	now = frappe.utils.now_datetime()
+	stored = []
+	for reply in pending:
+		rid = reply["request_id"]
+		if rid not in owners:
+			continue
+		# Plain UPDATE instead of get_doc/save: the only controller hook is the codec, applied here.
+		frappe.db.sql(
+			"""
+			UPDATE `tabRFID Agent Request`
+			SET `status`=%s, `ok`=%s, `result_json`=%s, `error`=%s, `lease_expires_at`=NULL,
+				`replied_at`=%s, `modified`=%s, `modified_by`=%s
+			WHERE `name`=%s
+			""",
+			(
+				"Done" if reply["ok"] else "Failed",
+				1 if reply["ok"] else 0,
+				payload_codec.encode(_json_dump(reply["result"])) if reply["ok"] else "",
+				reply["error"],
+				now,
+				now,
+				frappe.session.user,
+				rid,
+			),
+		)
+		stored.append((reply, owners[rid]))
+		_publish_agent_reply(reply, owners[rid])
+
+	def cache_replies() -> None:
+		for reply, owner in stored:
+			agent_queue.store_reply(reply["request_id"], reply, owner)
+
+	# Cache the results for agent_result / agent_wait_result once the rows are committed.
+	if stored:
+		frappe.db.after_commit.add(cache_replies)
+	return [rid for rid in names if rid not in owners]
+
+
+@frappe.whitelist()
+def agent_progress(agent_id: str = "", request_id: str = "", chunks: Any | None = None) -> dict[str, Any]:
+	"""
+	Agent-side: append partial results of a long-running request (e.g. devices found by a scan).
+
+	Chunks are appended to a Redis list next to the reply instead of rewriting `result_json`, and
+	pushed to the requesting user as realtime event `rfidenter_agent_progress`.
+	"""
+	if not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	user = frappe.session.user
+	if not user or user == "Guest":
+		frappe.throw("Login qiling.", frappe.PermissionError)
+
+	agent = _sanitize_agent_id(agent_id)
+	if not agent:
+		frappe.throw("agent_id noto‘g‘ri.", frappe.ValidationError)
+
+	rid = str(request_id or "").strip()
+	if not rid:
+		frappe.throw("request_id bo‘sh.", frappe.ValidationError)
+
+	items = chunks
+	if isinstance(items, str):
+		try:
+			items = json.loads(items)
+		except Exception:
+			frappe.throw("chunks noto‘g‘ri.", frappe.ValidationError)
+	if not isinstance(items, list):
+		items = [items]
+	if not items:
+		frappe.throw("chunks bo‘sh.", frappe.ValidationError)
+	if len(items) > AGENT_PROGRESS_MAX_CHUNKS:
+		frappe.throw(
+			f"chunks ko‘pi bilan {AGENT_PROGRESS_MAX_CHUNKS} ta bo‘lishi mumkin.", frappe.ValidationError
+		)
+
+	found, req_user = _agent_request_owner(rid)
+	if not found:
+		frappe.throw(f"Request topilmadi: {rid}", frappe.DoesNotExistError)
+
+	offset, total = agent_queue.append_progress(rid, items)
+	try:
+		if req_user:
+			frappe.publish_realtime(
+				"rfidenter_agent_progress",
+				{"request_id": rid, "agent_id": agent, "offset": offset, "chunks": items},
+				user=req_user,
+				after_commit=False,
+			)
+	except Exception:
+		frappe.log_error(title="RFIDenter agent_progress publish failed", message=frappe.get_traceback())
+	return {"ok": True, "offset": offset, "total": total}
+
+
+@frappe.whitelist()
+def agent_result_progress(request_id: str = "", offset: Any | None = None) -> dict[str, Any]:
+	"""UI-side: partial results posted by the agent so far, starting at `offset`."""
+	if not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	user = frappe.session.user
+	if not user or user == "Guest":
+		frappe.throw("Login qiling.", frappe.PermissionError)
+
+	rid = str(request_id or "").strip()
+	if not rid:
+		frappe.throw("request_id bo‘sh.", frappe.ValidationError)
+
+	try:
+		start = max(0, int(offset or 0))
+	except Exception:
+		start = 0
+
+	_found, req_user = _agent_request_owner(rid)
+	_check_agent_result_access(req_user, user)
+
+	chunks, total = agent_queue.get_progress(rid, start, AGENT_PROGRESS_MAX_CHUNKS)
+	return {
+		"ok": True,
+		"request_id": rid,
+		"offset": start,
+		"next_offset": start + len(chunks),
+		"total": total,
+		"chunks": chunks,
+	}
+
+
+def _agent_request_owner(rid: str) -> tuple[bool, str | None]:
+	"""(known, requested_by) from the Redis snapshot, the cached reply or the DocType row."""
+	if agent_queue.is_enabled():
+		request = agent_queue.get_request(rid) or agent_queue.get_reply(rid)
+		if request is not None:
+			return True, request.get("requested_by")
+	row = frappe.db.get_value("RFID Agent Request", rid, ["name", "requested_by"], as_dict=True)
+	if not row:
+		return False, None
+	return True, row.get("requested_by")
+
+
+def _publish_agent_reply(reply: dict[str, Any], req_user: str | None) -> None:
 	# Realtime notify requester (optional). This does not depend on DB commits.
 	try:
-		req_user = doc.requested_by
 		if req_user:
 			frappe.publish_realtime("rfidenter_agent_reply", reply, user=req_user, after_commit=False)
 	except Exception:
 		frappe.log_error(title="RFIDenter agent_reply publish failed", message=frappe.get_traceback())
 
-	return {"ok": True}
-
 
 @frappe.whitelist()
 def agent_result(request_id: str = "") -> dict[str, Any]:
@@ -2025,13 +3329,77 @@ def agent_result(request_id: str = "") -> dict[str, Any]:
 	if not rid:
 		frappe.throw("request_id bo‘sh.", frappe.ValidationError)
 
+	return _agent_result_state(rid, user)
+
+
+@frappe.whitelist()
+def agent_wait_result(request_id: str = "", wait_sec: Any | None = None) -> dict[str, Any]:
+	"""
+	UI-side: like agent_result, but blocks until the agent replies or `wait_sec` passes.
+
+	Terminal results are cached in Redis, so repeated calls for the same request skip the DB.
+	"""
+	if not has_rfidenter_access():
+		frappe.throw("RFIDenter: sizda RFIDer roli yo‘q.", frappe.PermissionError)
+
+	user = frappe.session.user
+	if not user or user == "Guest":
+		frappe.throw("Login qiling.", frappe.PermissionError)
+
+	rid = str(request_id or "").strip()
+	if not rid:
+		frappe.throw("request_id bo‘sh.", frappe.ValidationError)
+
+	try:
+		wait = float(wait_sec) if wait_sec not in (None, "") else 0.0
+	except Exception:
+		wait = 0.0
+	wait = max(0.0, min(float(agent_queue.long_poll_max_sec()), wait))
+
+	state = _agent_result_state(rid, user)
+	if state.get("state") != "pending" or wait <= 0:
+		return state
+
+	with agent_queue.long_poll_slot(wait, pool="result") as granted:
+		if not granted:
+			return {**state, "busy": True}
+		# Do not hold a read snapshot (or row locks from an expiry update) while parked.
+		frappe.db.commit()
+		agent_queue.wait_reply(rid, wait)
+
+	return {**_agent_result_state(rid, user), "waited": True}
+
+
+def _agent_result_state(rid: str, user: str) -> dict[str, Any]:
+	cached = agent_queue.get_reply(rid)
+	if cached is not None:
+		_check_agent_result_access(cached.get("requested_by"), user)
+		if cached.get("expired"):
+			return {"ok": True, "state": "expired"}
+		reply = {k: v for k, v in cached.items() if k != "requested_by"}
+		return {"ok": True, "state": "done", "reply": reply}
+
+	if agent_queue.is_enabled():
+		request = agent_queue.get_request(rid)
+		if request is not None:
+			return _agent_result_from_queue(request, user)
+
+	# Requests queued before the switch to Redis (or the DB transport) live only in the DocType.
+	return _agent_result_from_db(rid, user)
+
+
+def _check_agent_result_access(requested_by: Any, user: str) -> None:
+	req_user = str(requested_by or "").strip()
+	if req_user and req_user != user and not frappe.has_role("System Manager"):
+		frappe.throw("Siz bu request natijasini ko‘ra olmaysiz.", frappe.PermissionError)
+
+
+def _agent_result_from_db(rid: str, user: str) -> dict[str, Any]:
 	if not frappe.db.exists("RFID Agent Request", rid):
 		return {"ok": True, "state": "expired"}
 
 	doc = frappe.get_doc("RFID Agent Request", rid)
-	req_user = str(doc.requested_by or "").strip()
-	if req_user and req_user != user and not frappe.has_role("System Manager"):
-		frappe.throw("Siz bu request natijasini ko‘ra olmaysiz.", frappe.PermissionError)
+	_check_agent_result_access(doc.requested_by, user)
 
 	timeout = int(doc.timeout_sec or 0)
 	if timeout > 0 and doc.request_ts:
@@ -2041,12 +3409,14 @@ def agent_result(request_id: str = "") -> dict[str, Any]:
 				doc.error = "timeout"
 				doc.lease_expires_at = None
 				doc.save(ignore_permissions=True)
+			agent_queue.store_expired(rid, doc.requested_by)
 			return {"ok": True, "state": "expired"}
 
 	if doc.status in ("Done", "Failed"):
 		result_obj: Any = None
 		try:
-			result_obj = json.loads(doc.result_json) if doc.result_json else None
+			result_json = payload_codec.decode(doc.result_json)
+			result_obj = json.loads(result_json) if result_json else None
 		except Exception:
 			result_obj = None
 
@@ -2058,11 +3428,25 @@ def agent_result(request_id: str = "") -> dict[str, Any]:
 			"error": str(doc.error or "") if not doc.ok else "",
 			"ts": _now_ms(),
 		}
+		agent_queue.store_reply(rid, reply, doc.requested_by)
 		return {"ok": True, "state": "done", "reply": reply}
 
 	return {"ok": True, "state": "pending"}
 
 
+def _agent_result_from_queue(request: dict[str, Any], user: str) -> dict[str, Any]:
+	"""agent_result answered from the Redis request snapshot (no reply stored yet)."""
+	_check_agent_result_access(request.get("requested_by"), user)
+
+	timeout = int(request.get("timeout_sec") or 0)
+	if request.get("status") == "Failed" or (
+		timeout > 0 and _now_ms() - int(request.get("request_ts") or 0) > timeout * 1000
+	):
+		agent_queue.expire(request)
+		return {"ok": True, "state": "expired"}
+	return {"ok": True, "state": "pending"}
+
+
 @frappe.whitelist()
 def zebra_create_item_tag(
 	item_code: str,
@@ -2097,6 +3481,7 @@ def zebra_mark_tag_printed(epc: str) -> dict[str, Any]:
 
 
 @frappe.whitelist()
+@replica.read_only
 def zebra_list_tags(limit: Any | None = None) -> dict[str, Any]:
 	"""List recent Zebra tags from DB."""
 	if not has_rfidenter_access():
@@ -2105,6 +3490,7 @@ def zebra_list_tags(limit: Any | None = None) -> dict[str, Any]:
 
 
 @frappe.whitelist()
+@replica.read_only
 def zebra_list_epcs(statuses: Any | None = None, limit: Any | None = None) -> dict[str, Any]:
 	"""List EPCs that belong to Zebra-printed tags."""
 	if not has_rfidenter_access():
@@ -2143,6 +3529,7 @@ def zebra_list_epcs(statuses: Any | None = None, limit: Any | None = None) -> di
 
 
 @frappe.whitelist()
+@replica.read_only
 def zebra_epc_info(epcs: Any | None = None, limit: Any | None = None) -> dict[str, Any]:
 	"""Fetch Zebra tag metadata (including Stock Entry) for given EPCs."""
 	if not has_rfidenter_access():
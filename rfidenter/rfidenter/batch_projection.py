@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import heapq
+import json
+from typing import Any
+
+import frappe
+
+from rfidenter.rfidenter import payload_codec
+
+REPLAY_CHUNK = 2000
+STATE_FIELDS = (
+	"status",
+	"current_batch_id",
+	"current_product",
+	"pending_product",
+	"pause_reason",
+	"last_event_seq",
+	"last_seen_at",
+	"config_json",
+)
+
+
+def _empty_state() -> dict[str, Any]:
+	return {
+		"status": "Stopped",
+		"current_batch_id": None,
+		"current_product": None,
+		"pending_product": None,
+		"pause_reason": None,
+		"last_event_seq": None,
+		"last_seen_at": None,
+		"config_json": None,
+	}
+
+
+def _decode_payload(raw: Any) -> dict[str, Any]:
+	if not raw:
+		return {}
+	try:
+		payload = json.loads(payload_codec.decode(raw))
+	except Exception:
+		return {}
+	return payload if isinstance(payload, dict) else {}
+
+
+def _product_from(payload: dict[str, Any]) -> str | None:
+	return (
+		str(payload.get("product_id") or payload.get("item_code") or payload.get("product") or "").strip()
+		or None
+	)
+
+
+def apply_event(state: dict[str, Any], event: dict[str, Any]) -> dict[str, Any]:
+	"""Fold one edge event into a batch state dict, mirroring the endpoint that recorded it."""
+
+	event_type = str(event.get("event_type") or "")
+	batch_id = event.get("batch_id") or None
+	seq = event.get("seq")
+	payload = _decode_payload(event.get("payload_json"))
+
+	if event_type == "batch_start":
+		config = payload.get("config") or payload.get("config_json") or {}
+		if isinstance(config, str):
+			try:
+				config = json.loads(config)
+			except Exception:
+				config = {}
+		product = _product_from(payload)
+		state["status"] = "Running"
+		state["current_batch_id"] = batch_id
+		if product is not None:
+			state["current_product"] = product
+			state["pending_product"] = None
+		state["pause_reason"] = None
+		state["config_json"] = (
+			json.dumps(config, separators=(",", ":"), sort_keys=True)
+			if isinstance(config, dict) and config
+			else None
+		)
+		state["last_event_seq"] = seq
+	elif event_type == "batch_stop":
+		state["status"] = "Stopped"
+		state["current_batch_id"] = None
+		state["current_product"] = None
+		state["pending_product"] = None
+		state["pause_reason"] = None
+		state["last_event_seq"] = seq
+	elif event_type == "product_switch":
+		state["pending_product"] = _product_from(payload)
+		state["last_event_seq"] = seq
+	elif event_type == "device_status":
+		status = str(payload.get("status") or "").strip()
+		if status in ("Running", "Stopped", "Paused"):
+			state["status"] = status
+		if batch_id:
+			state["current_batch_id"] = batch_id
+		for field in ("current_product", "pending_product", "pause_reason"):
+			value = str(payload.get(field) or "").strip()
+			if value:
+				state[field] = value
+	elif event_type in ("event_report", "ingest_tags"):
+		if seq is not None:
+			state["last_event_seq"] = seq
+	elif event_type == "ingest_scale_weight":
+		last_seq = state.get("last_event_seq")
+		if seq is not None and (last_seq is None or seq > last_seq):
+			state["last_event_seq"] = seq
+
+	if event.get("received_at"):
+		state["last_seen_at"] = event.get("received_at")
+	return state
+
+
+def _iter_ordered(query: str, device_id: str, at_field: str):
+	"""Stream one device's rows in index order, REPLAY_CHUNK rows per query.
+
+	`query` has `{where}` and `{limit}` slots and orders by (`at_field`, seq, name), which is the
+	index order. Pages break on `at_field`: a timestamp cut by the LIMIT is dropped from the page
+	and then read whole, so NULL seqs never have to take part in a keyset comparison.
+	"""
+
+	last_at = None
+	while True:
+		if last_at is None:
+			rows = frappe.db.sql(
+				query.format(where="", limit="LIMIT %s"), (device_id, REPLAY_CHUNK), as_dict=True
+			)
+		else:
+			rows = frappe.db.sql(
+				query.format(where=f"AND `{at_field}` > %s", limit="LIMIT %s"),
+				(device_id, last_at, REPLAY_CHUNK),
+				as_dict=True,
+			)
+		if not rows:
+			return
+		last_at = rows[-1]["received_at"]
+		if len(rows) < REPLAY_CHUNK:
+			yield from rows
+			return
+		yield from (row for row in rows if row["received_at"] != last_at)
+		yield from frappe.db.sql(
+			query.format(where=f"AND `{at_field}` = %s", limit=""), (device_id, last_at), as_dict=True
+		)
+
+
+def _replay_key(event: dict[str, Any]) -> tuple[Any, ...]:
+	seq = event.get("seq")
+	return (event["received_at"], seq is not None, seq or 0)
+
+
+def _iter_device_events(device_id: str):
+	# Both streams follow an index ((device_id, received_at, seq) and (device, creation, seq)), so
+	# MariaDB never sorts a device's whole history; the two are merged here. Scale readings live in
+	# their own table and only move last_event_seq, so only rows with a seq take part in the replay.
+	edge_events = _iter_ordered(
+		"""
+		SELECT `event_type`, `batch_id`, `seq`, `payload_json`, `received_at`
+		FROM `tabRFID Edge Event`
+		WHERE `device_id`=%s AND `received_at` IS NOT NULL {where}
+		ORDER BY `received_at` ASC, `seq` ASC, `name` ASC
+		{limit}
+		""",
+		device_id,
+		"received_at",
+	)
+	scale_readings = _iter_ordered(
+		"""
+		SELECT 'ingest_scale_weight' AS `event_type`, `batch_id`, `seq`, NULL AS `payload_json`,
+			`creation` AS `received_at`
+		FROM `tabRFID Scale Reading`
+		WHERE `device`=%s AND `seq` IS NOT NULL {where}
+		ORDER BY `creation` ASC, `seq` ASC, `name` ASC
+		{limit}
+		""",
+		device_id,
+		"creation",
+	)
+	yield from heapq.merge(edge_events, scale_readings, key=_replay_key)
+
+
+def project_device(device_id: str) -> dict[str, Any]:
+	"""Replay one device's event log into a fresh batch state."""
+
+	state = _empty_state()
+	events = 0
+	for event in _iter_device_events(device_id):
+		apply_event(state, event)
+		events += 1
+	return {"device_id": device_id, "events": events, "state": state}
+
+
+def _diff(current: dict[str, Any] | None, projected: dict[str, Any]) -> dict[str, Any]:
+	current = current or {}
+	diff: dict[str, Any] = {}
+	for field in STATE_FIELDS:
+		if field == "last_seen_at":
+			# Heartbeats refresh last_seen_at without writing events; never treat it as drift.
+			continue
+		have = current.get(field)
+		want = projected.get(field)
+		if (have or None) != (want or None):
+			diff[field] = {"current": have, "projected": want}
+	return diff
+
+
+def mark_history_trimmed(device_ids: set[str] | list[str], at: Any = None) -> None:
+	"""Flag devices whose events were archived or purged, so their state is never rebuilt from a partial log."""
+
+	device_ids = sorted({str(d) for d in device_ids if d})
+	if not device_ids:
+		return
+	placeholders = ", ".join(["%s"] * len(device_ids))
+	frappe.db.sql(
+		f"""
+		UPDATE `tabRFID Batch State` SET `history_trimmed_at`=%s
+		WHERE `device_id` IN ({placeholders})
+		""",
+		(at or frappe.utils.now_datetime(), *device_ids),
+	)
+
+
+def rebuild_device(device_id: str, repair: bool = False) -> dict[str, Any]:
+	"""Project a device's batch state, compare it with the stored row and optionally overwrite it.
+
+	A device whose history was trimmed (archived or purged events) is only compared: the live
+	tables no longer hold its full log, so a repair would overwrite state with a partial replay.
+	"""
+
+	device_id = str(device_id or "").strip()
+	if not device_id:
+		return {"ok": False, "error": "device_id kerak."}
+
+	projection = project_device(device_id)
+	projected = projection["state"]
+	current = frappe.db.get_value(
+		"RFID Batch State", {"device_id": device_id}, [*STATE_FIELDS, "history_trimmed_at"], as_dict=True
+	)
+	diff = _diff(current, projected)
+	trimmed = bool(current and current.get("history_trimmed_at"))
+
+	repaired = False
+	if repair and not trimmed and (diff or not current) and projection["events"]:
+		values = {field: projected.get(field) for field in STATE_FIELDS}
+		if current:
+			if not values.get("last_seen_at"):
+				values.pop("last_seen_at", None)
+			frappe.db.set_value("RFID Batch State", device_id, values, update_modified=True)
+		else:
+			frappe.get_doc({"doctype": "RFID Batch State", "device_id": device_id, **values}).insert(
+				ignore_permissions=True
+			)
+		repaired = True
+
+	return {
+		"ok": True,
+		"device_id": device_id,
+		"events": projection["events"],
+		"consistent": not diff,
+		"diff": diff,
+		"repaired": repaired,
+		"history_trimmed": trimmed,
+	}
+
+
+def list_devices() -> list[str]:
+	rows = frappe.db.sql(
+		"""
+		SELECT DISTINCT `device_id` FROM `tabRFID Edge Event`
+		UNION
+		SELECT `device_id` FROM `tabRFID Batch State`
+		"""
+	)
+	return sorted({str(r[0]) for r in rows if r and r[0]})
+
+
+def rebuild_all(
+	devices: list[str] | None = None, *, repair: bool = False, enqueue: bool = True
+) -> dict[str, Any]:
+	"""Rebuild every device's batch state.
+
+	With `enqueue`, one background job per device is queued on the `long` queue so the
+	replay fans out across all available workers; otherwise devices are replayed inline.
+	"""
+
+	targets = [d for d in (devices or list_devices()) if d]
+	if enqueue:
+		for device_id in targets:
+			frappe.enqueue(
+				"rfidenter.rfidenter.batch_projection.rebuild_device",
+				queue="long",
+				timeout=3600,
+				job_id=f"rfidenter-rebuild-batch-state:{device_id}",
+				deduplicate=True,
+				device_id=device_id,
+				repair=repair,
+			)
+		return {"ok": True, "queued": len(targets), "devices": targets}
+
+	results = [rebuild_device(device_id, repair=repair) for device_id in targets]
+	return {
+		"ok": True,
+		"devices": len(results),
+		"inconsistent": sum(1 for r in results if not r.get("consistent")),
+		"repaired": sum(1 for r in results if r.get("repaired")),
+		"results": results,
+	}
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Any
+
+import frappe
+
+SUMMARY_DOCTYPE = "RFID Batch Summary"
+LABEL_EVENT_TYPES = ("print_completed",)
+WEIGHT_EVENT_TYPES = ("weight", "weight_locked", "print_completed", "ingest_scale_weight")
+
+
+def _summary_type(event_type: str, payload: dict[str, Any]) -> str:
+	# `event_report` wraps the edge's own event type; roll up by that instead.
+	if event_type == "event_report":
+		inner = str(payload.get("event_type") or "").strip()
+		if inner:
+			return inner[:64]
+	return str(event_type or "unknown")[:64]
+
+
+def _summary_name(device_id: str, batch_id: str, summary_type: str) -> str:
+	"""Row name for one (device, batch, type). Keys too long for a name get a hash of the full key
+	instead of a cut, so two different keys can never share a row."""
+
+	key = f"{device_id}:{batch_id}:{summary_type}"
+	if len(key) <= 140:
+		return key
+	return f"{key[:99]}:{hashlib.sha1(key.encode('utf-8')).hexdigest()}"
+
+
+def _weight_from(summary_type: str, payload: dict[str, Any]) -> float | None:
+	if summary_type not in WEIGHT_EVENT_TYPES:
+		return None
+	for key in ("weight", "net_weight", "value"):
+		raw = payload.get(key)
+		if raw is None or raw == "" or isinstance(raw, bool):
+			continue
+		try:
+			val = float(raw)
+		except Exception:
+			continue
+		if -1_000_000 <= val <= 1_000_000:
+			return val
+	return None
+
+
+def record_event(
+	*,
+	device_id: str,
+	batch_id: str | None,
+	event_type: str,
+	payload: dict[str, Any],
+	received_at: Any | None = None,
+) -> None:
+	"""Add one inserted edge event to its (device, batch, type) rollup row with a single upsert."""
+
+	if not device_id or not batch_id:
+		return
+
+	payload = payload if isinstance(payload, dict) else {}
+	summary_type = _summary_type(event_type, payload)
+	weight = _weight_from(summary_type, payload)
+	_upsert(
+		device_id=device_id,
+		batch_id=batch_id,
+		summary_type=summary_type,
+		events=1,
+		weight_count=1 if weight is not None else 0,
+		weight_total=weight or 0,
+		labels=1 if summary_type in LABEL_EVENT_TYPES else 0,
+		at=received_at or frappe.utils.now_datetime(),
+	)
+
+
+def record_weights(
+	*,
+	device_id: str,
+	batch_id: str | None,
+	event_type: str,
+	weights: list[float],
+	received_at: Any | None = None,
+) -> None:
+	"""Add many weight readings of one batch to its rollup row with a single upsert."""
+
+	if not device_id or not batch_id or not weights:
+		return
+	_upsert(
+		device_id=device_id,
+		batch_id=batch_id,
+		summary_type=str(event_type or "unknown")[:64],
+		events=len(weights),
+		weight_count=len(weights),
+		weight_total=sum(weights),
+		labels=0,
+		at=received_at or frappe.utils.now_datetime(),
+	)
+
+
+def _upsert(
+	*,
+	device_id: str,
+	batch_id: str,
+	summary_type: str,
+	events: int,
+	weight_count: int,
+	weight_total: float,
+	labels: int,
+	at: Any,
+) -> None:
+	name = _summary_name(device_id, batch_id, summary_type)
+	frappe.db.sql(
+		f"""
+		INSERT INTO `tab{SUMMARY_DOCTYPE}`
+			(`name`, `device_id`, `batch_id`, `event_type`, `event_count`, `weight_count`, `weight_total`,
+			 `labels_printed`, `first_event_at`, `last_event_at`, `creation`, `modified`)
+		VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+		ON DUPLICATE KEY UPDATE
+			`event_count` = `event_count` + VALUES(`event_count`),
+			`weight_count` = `weight_count` + VALUES(`weight_count`),
+			`weight_total` = `weight_total` + VALUES(`weight_total`),
+			`labels_printed` = `labels_printed` + VALUES(`labels_printed`),
+			`first_event_at` = LEAST(COALESCE(`first_event_at`, VALUES(`first_event_at`)), VALUES(`first_event_at`)),
+			`last_event_at` = GREATEST(COALESCE(`last_event_at`, VALUES(`last_event_at`)), VALUES(`last_event_at`)),
+			`modified` = VALUES(`modified`)
+		""",
+		(
+			name,
+			device_id,
+			batch_id,
+			summary_type,
+			events,
+			weight_count,
+			weight_total,
+			labels,
+			at,
+			at,
+			at,
+			at,
+		),
+	)
+
+
+def get_summaries(
+	*, device_id: str | None = None, batch_id: str | None = None, limit: Any | None = None
+) -> dict[str, Any]:
+	"""Per-batch totals for the most recently active batches, read from the rollup only."""
+
+	try:
+		lim = int(limit) if limit is not None else 20
+	except Exception:
+		lim = 20
+	lim = max(1, min(500, lim))
+
+	conditions: list[str] = []
+	values: list[Any] = []
+	if device_id:
+		conditions.append("`device_id`=%s")
+		values.append(device_id)
+	if batch_id:
+		conditions.append("`batch_id`=%s")
+		values.append(batch_id)
+	where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+	rows = frappe.db.sql(
+		f"""
+		SELECT `device_id`, `batch_id`, `event_type`, `event_count`, `weight_count`, `weight_total`,
+			`labels_printed`, `first_event_at`, `last_event_at`
+		FROM `tab{SUMMARY_DOCTYPE}`
+		WHERE (`device_id`, `batch_id`) IN (
+			SELECT `device_id`, `batch_id` FROM (
+				SELECT `device_id`, `batch_id`, MAX(`last_event_at`) AS `last_at`
+				FROM `tab{SUMMARY_DOCTYPE}`
+				{where}
+				GROUP BY `device_id`, `batch_id`
+				ORDER BY `last_at` DESC
+				LIMIT %s
+			) recent
+		)
+		""",
+		(*values, lim),
+		as_dict=True,
+	)
+
+	batches: dict[tuple[str, str], dict[str, Any]] = {}
+	for row in rows:
+		key = (str(row.get("device_id") or ""), str(row.get("batch_id") or ""))
+		batch = batches.get(key)
+		if not batch:
+			batch = {
+				"device_id": key[0],
+				"batch_id": key[1],
+				"events": 0,
+				"events_by_type": {},
+				"weight_count": 0,
+				"weight_total": 0.0,
+				"labels_printed": 0,
+				"first_event_at": None,
+				"last_event_at": None,
+			}
+			batches[key] = batch
+		count = int(row.get("event_count") or 0)
+		batch["events"] += count
+		batch["events_by_type"][row.get("event_type") or ""] = count
+		batch["weight_count"] += int(row.get("weight_count") or 0)
+		batch["weight_total"] += float(row.get("weight_total") or 0)
+		batch["labels_printed"] += int(row.get("labels_printed") or 0)
+		first_at = row.get("first_event_at")
+		last_at = row.get("last_event_at")
+		if first_at and (batch["first_event_at"] is None or first_at < batch["first_event_at"]):
+			batch["first_event_at"] = first_at
+		if last_at and (batch["last_event_at"] is None or last_at > batch["last_event_at"]):
+			batch["last_event_at"] = last_at
+
+	items = sorted(batches.values(), key=lambda b: str(b.get("last_event_at") or ""), reverse=True)
+	return {"ok": True, "count": len(items), "items": items}
@@ -2,6 +2,15 @@ from __future__ import annotations
 
 from frappe.model.document import Document
 
+from rfidenter.rfidenter import payload_codec
+
 
 class RFIDAgentRequest(Document):
-	pass
+	CODEC_FIELDS = ("args_json", "result_json")
+
+	def validate(self) -> None:
+		payload_codec.encode_fields(self, self.CODEC_FIELDS)
+
+	def onload(self) -> None:
+		# Show the canonical JSON in the desk form instead of the compressed storage form.
+		payload_codec.decode_fields(self, self.CODEC_FIELDS)
@@ -0,0 +1,377 @@
+from __future__ import annotations
+
+import base64
+import datetime
+import gzip
+import hashlib
+import json
+import os
+from typing import Any
+
+import frappe
+
+from rfidenter.rfidenter import batch_projection, payload_codec, site_settings
+
+ARCHIVE_DOCTYPE = "RFID Edge Event Archive"
+EXPORT_CHUNK = 1000
+DELETE_CHUNK = 2000
+# Per-file event_id bloom filter kept on the manifest: ~1% false positives at 10 bits and 7 hashes.
+BLOOM_BITS_PER_EVENT = 10
+BLOOM_HASHES = 7
+BLOOM_MIN_BYTES = 128
+EVENT_FIELDS = (
+	"name",
+	"event_id",
+	"device_id",
+	"batch_id",
+	"seq",
+	"event_type",
+	"payload_json",
+	"payload_hash",
+	"received_at",
+	"processed",
+	"error",
+)
+
+
+def _archive_after_months() -> int:
+	"""Months kept hot in the table. 0 disables automatic archival."""
+
+	return site_settings.get_int("rfidenter_edge_archive_after_months", 3, lo=0, hi=120)
+
+
+def _archive_dir() -> str:
+	path = str(site_settings.get("rfidenter_edge_archive_dir", "") or "").strip()
+	if not path:
+		path = frappe.get_site_path("private", "rfidenter_archive")
+	os.makedirs(path, exist_ok=True)
+	return path
+
+
+def _month_bounds(month: str) -> tuple[datetime.datetime, datetime.datetime]:
+	try:
+		start = datetime.datetime.strptime(str(month or "").strip(), "%Y-%m")
+	except Exception:
+		frappe.throw("month noto‘g‘ri (YYYY-MM).", frappe.ValidationError)
+	end = (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+	return start, end
+
+
+def _first_open_month(now: datetime.datetime | None = None) -> datetime.datetime:
+	"""Start of the oldest month that must stay in the table."""
+
+	now = now or frappe.utils.now_datetime()
+	month_index = now.year * 12 + (now.month - 1) - _archive_after_months()
+	return datetime.datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+def closed_months() -> list[str]:
+	"""Months older than the hot window that still have rows in `RFID Edge Event`."""
+
+	if _archive_after_months() <= 0:
+		return []
+	cutoff = _first_open_month()
+	months: list[str] = []
+	cursor: datetime.datetime | None = None
+	# Walk month by month via the received_at index instead of grouping the whole table.
+	while True:
+		row = frappe.db.sql(
+			"""
+			SELECT MIN(`received_at`) FROM `tabRFID Edge Event`
+			WHERE `received_at` < %s AND (%s IS NULL OR `received_at` >= %s)
+			""",
+			(cutoff, cursor, cursor),
+		)
+		first = row[0][0] if row else None
+		if not first:
+			break
+		month = first.strftime("%Y-%m")
+		months.append(month)
+		cursor = _month_bounds(month)[1]
+	return months
+
+
+def _bloom_positions(event_id: str, size_bits: int) -> list[int]:
+	digest = hashlib.blake2b(event_id.encode("utf-8"), digest_size=16).digest()
+	h1 = int.from_bytes(digest[:8], "big")
+	h2 = int.from_bytes(digest[8:], "big") | 1
+	return [(h1 + i * h2) % size_bits for i in range(BLOOM_HASHES)]
+
+
+def _new_bloom(expected: int) -> bytearray:
+	return bytearray(max(BLOOM_MIN_BYTES, (expected * BLOOM_BITS_PER_EVENT + 7) // 8))
+
+
+def _bloom_add(bloom: bytearray, event_id: str) -> None:
+	for pos in _bloom_positions(event_id, len(bloom) * 8):
+		bloom[pos >> 3] |= 1 << (pos & 7)
+
+
+def _bloom_may_contain(encoded: str, event_id: str) -> bool:
+	"""False only if `event_id` is certainly not in the file the bloom filter was built for."""
+
+	try:
+		bloom = base64.b64decode(encoded)
+	except Exception:
+		return True
+	if not bloom:
+		return True
+	return all(bloom[pos >> 3] & (1 << (pos & 7)) for pos in _bloom_positions(event_id, len(bloom) * 8))
+
+
+def _export_month(month: str, path: str) -> dict[str, Any]:
+	start, end = _month_bounds(month)
+	expected = frappe.db.sql(
+		"SELECT COUNT(*) FROM `tabRFID Edge Event` WHERE `received_at` >= %s AND `received_at` < %s",
+		(start, end),
+	)
+	bloom = _new_bloom(int(expected[0][0] or 0) if expected else 0)
+	count = 0
+	first_at = None
+	last_at = None
+	last_key: tuple[Any, Any] | None = None
+	devices: set[str] = set()
+	cols = ", ".join(f"`{f}`" for f in EVENT_FIELDS)
+
+	with gzip.open(path, "wt", encoding="utf-8") as fh:
+		while True:
+			if last_key is None:
+				rows = frappe.db.sql(
+					f"""
+					SELECT {cols} FROM `tabRFID Edge Event`
+					WHERE `received_at` >= %s AND `received_at` < %s
+					ORDER BY `received_at` ASC, `name` ASC
+					LIMIT %s
+					""",
+					(start, end, EXPORT_CHUNK),
+					as_dict=True,
+				)
+			else:
+				rows = frappe.db.sql(
+					f"""
+					SELECT {cols} FROM `tabRFID Edge Event`
+					WHERE `received_at` < %s AND (`received_at`, `name`) > (%s, %s)
+					ORDER BY `received_at` ASC, `name` ASC
+					LIMIT %s
+					""",
+					(end, last_key[0], last_key[1], EXPORT_CHUNK),
+					as_dict=True,
+				)
+			if not rows:
+				break
+			for row in rows:
+				# Archive files always hold the canonical JSON, independent of the storage codec.
+				row["payload_json"] = payload_codec.decode(row.get("payload_json"))
+				fh.write(json.dumps(row, default=str, separators=(",", ":"), sort_keys=True))
+				fh.write("\n")
+				if row.get("event_id"):
+					_bloom_add(bloom, row["event_id"])
+			devices.update(row.get("device_id") for row in rows if row.get("device_id"))
+			count += len(rows)
+			first_at = first_at or rows[0].get("received_at")
+			last_at = rows[-1].get("received_at")
+			last_key = (rows[-1].get("received_at"), rows[-1].get("name"))
+
+	return {
+		"start": start,
+		"end": end,
+		"count": count,
+		"first_at": first_at,
+		"last_at": last_at,
+		"last_key": last_key,
+		"devices": devices,
+		"bloom": bloom,
+	}
+
+
+def _file_sha256(path: str) -> str:
+	digest = hashlib.sha256()
+	with open(path, "rb") as fh:
+		for block in iter(lambda: fh.read(1 << 20), b""):
+			digest.update(block)
+	return digest.hexdigest()
+
+
+def archive_month(month: str) -> dict[str, Any]:
+	"""Export one closed month to `<archive_dir>/edge-events-YYYY-MM-<stamp>.jsonl.gz`, then delete it.
+
+	Rows are deleted only after the file is fully written and recorded, in small committed chunks.
+	The manifest carries a bloom filter of the file's event_ids for find_archived_event.
+	"""
+
+	start, end = _month_bounds(month)
+	if end > _first_open_month():
+		frappe.throw("Faqat yopilgan oylar arxivlanadi.", frappe.ValidationError)
+
+	stamp = frappe.utils.now_datetime().strftime("%Y%m%d%H%M%S")
+	file_name = f"edge-events-{month}-{stamp}.jsonl.gz"
+	final_path = os.path.join(_archive_dir(), file_name)
+	tmp_path = f"{final_path}.tmp"
+
+	exported = _export_month(month, tmp_path)
+	if not exported["count"]:
+		os.remove(tmp_path)
+		return {"ok": True, "month": month, "archived": 0}
+
+	with open(tmp_path, "rb") as fh:
+		os.fsync(fh.fileno())
+	os.replace(tmp_path, final_path)
+
+	frappe.get_doc(
+		{
+			"doctype": ARCHIVE_DOCTYPE,
+			"month": month,
+			"file_name": file_name,
+			"row_count": exported["count"],
+			"sha256": _file_sha256(final_path),
+			"first_received_at": exported["first_at"],
+			"last_received_at": exported["last_at"],
+			"archived_at": frappe.utils.now_datetime(),
+			"event_bloom": base64.b64encode(bytes(exported["bloom"])).decode("ascii"),
+		}
+	).insert(ignore_permissions=True)
+	batch_projection.mark_history_trimmed(exported["devices"])
+	frappe.db.commit()
+
+	last_received, last_name = exported["last_key"]
+	deleted = 0
+	while True:
+		frappe.db.sql(
+			"""
+			DELETE FROM `tabRFID Edge Event`
+			WHERE `received_at` >= %s AND (`received_at`, `name`) <= (%s, %s)
+			ORDER BY `received_at` ASC, `name` ASC
+			LIMIT %s
+			""",
+			(start, last_received, last_name, DELETE_CHUNK),
+		)
+		try:
+			affected = int(frappe.db._cursor.rowcount or 0)
+		except Exception:
+			affected = 0
+		frappe.db.commit()
+		deleted += affected
+		if affected < DELETE_CHUNK:
+			break
+
+	return {
+		"ok": True,
+		"month": month,
+		"archived": exported["count"],
+		"deleted": deleted,
+		"file_name": file_name,
+	}
+
+
+def archive_closed_months() -> dict[str, Any]:
+	"""Scheduler entry point: archive every closed month still present in the table."""
+
+	results = []
+	for month in closed_months():
+		try:
+			results.append(archive_month(month))
+		except Exception:
+			frappe.db.rollback()
+			frappe.log_error(
+				title=f"RFIDenter edge event archive failed ({month})", message=frappe.get_traceback()
+			)
+	return {"ok": True, "months": results}
+
+
+def _iter_archive_file(file_name: str, after_line: int = -1):
+	"""Yield (line number, row) for the rows of one archive file past `after_line`."""
+
+	path = os.path.join(_archive_dir(), os.path.basename(file_name))
+	if not os.path.exists(path):
+		return
+	with gzip.open(path, "rt", encoding="utf-8") as fh:
+		for line_no, line in enumerate(fh):
+			if line_no <= after_line:
+				continue
+			line = line.strip()
+			if not line:
+				continue
+			try:
+				yield line_no, json.loads(line)
+			except Exception:
+				continue
+
+
+def _manifests(month: str | None = None) -> list[dict[str, Any]]:
+	filters = {"month": month} if month else {}
+	return frappe.get_all(
+		ARCHIVE_DOCTYPE,
+		fields=["name", "month", "file_name", "row_count", "first_received_at", "last_received_at"],
+		filters=filters,
+		order_by="first_received_at desc",
+	)
+
+
+def find_archived_event(event_id: str) -> dict[str, Any] | None:
+	"""Look an event up in the archive; only files whose bloom filter may hold it are read."""
+
+	for manifest in _manifests():
+		# One manifest's filter at a time, so a lookup never holds every month's filter in memory.
+		bloom = frappe.db.get_value(ARCHIVE_DOCTYPE, manifest.get("name"), "event_bloom")
+		if bloom and not _bloom_may_contain(bloom, event_id):
+			continue
+		for _, row in _iter_archive_file(manifest.get("file_name")):
+			if row.get("event_id") == event_id:
+				return row
+	return None
+
+
+def query_archived_events(
+	*,
+	month: str,
+	device_id: str | None = None,
+	batch_id: str | None = None,
+	event_types: list[str] | None = None,
+	after: list[Any] | None = None,
+	limit: int = 100,
+) -> dict[str, Any]:
+	"""One page of a month's archived events in file order.
+
+	`after` is the previous page's `next_after` ([file_name, line]); the page resumes in that file
+	right after that line, so earlier files are never reopened and skipped lines are never parsed.
+	"""
+
+	_month_bounds(month)
+	files = [
+		m.get("file_name")
+		for m in sorted(_manifests(month), key=lambda m: str(m.get("first_received_at") or ""))
+	]
+	start_file, start_line = 0, -1
+	if after:
+		try:
+			start_file, start_line = files.index(str(after[0])), int(after[1])
+		except Exception:
+			frappe.throw("cursor noto‘g‘ri.", frappe.ValidationError)
+
+	wanted_types = set(event_types or [])
+	items: list[dict[str, Any]] = []
+	last_pos: list[Any] | None = None
+	has_more = False
+	for index in range(start_file, len(files)):
+		skip = start_line if index == start_file else -1
+		for line_no, row in _iter_archive_file(files[index], after_line=skip):
+			if device_id and row.get("device_id") != device_id:
+				continue
+			if batch_id and row.get("batch_id") != batch_id:
+				continue
+			if wanted_types and row.get("event_type") not in wanted_types:
+				continue
+			if len(items) >= limit:
+				has_more = True
+				break
+			items.append(row)
+			last_pos = [files[index], line_no]
+		if has_more:
+			break
+	return {
+		"ok": True,
+		"month": month,
+		"count": len(items),
+		"items": items,
+		"next_after": last_pos if has_more else None,
+	}
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import json
+import time
+from typing import Any
+
+import frappe
+
+from rfidenter.rfidenter import batch_summary, payload_codec, site_settings
+
+# Per event_type side effects, resolved with frappe.get_attr like hook paths (keeps this module
+# free of an import cycle with api.py). Every event also feeds the batch summary rollup.
+HANDLERS: dict[str, str] = {
+	"ingest_tags": "rfidenter.rfidenter.api._consume_ingest_tags",
+}
+EVENT_FIELDS = (
+	"name",
+	"event_id",
+	"device_id",
+	"batch_id",
+	"seq",
+	"event_type",
+	"payload_json",
+	"received_at",
+	"attempts",
+)
+
+
+def is_async() -> bool:
+	"""When enabled, ingestion only records events and ERP-side work is left to this consumer."""
+
+	raw = site_settings.get("rfidenter_edge_event_async", 0)
+	if isinstance(raw, str):
+		return raw.strip().lower() in ("1", "true", "yes", "on")
+	return bool(raw)
+
+
+def _max_attempts() -> int:
+	return site_settings.get_int("rfidenter_edge_consumer_max_attempts", 5, lo=1, hi=100)
+
+
+def _backoff_sec(attempts: int) -> int:
+	base = site_settings.get_int("rfidenter_edge_consumer_backoff_sec", 30, lo=1, hi=3600)
+	return min(6 * 3600, base * (2 ** max(0, attempts - 1)))
+
+
+def _decode_payload(raw: Any) -> dict[str, Any]:
+	try:
+		payload = json.loads(payload_codec.decode(raw) or "{}")
+	except Exception:
+		return {}
+	return payload if isinstance(payload, dict) else {}
+
+
+def process_event(event: dict[str, Any]) -> None:
+	payload = _decode_payload(event.get("payload_json"))
+	batch_summary.record_event(
+		device_id=event.get("device_id"),
+		batch_id=event.get("batch_id"),
+		event_type=event.get("event_type"),
+		payload=payload,
+		received_at=event.get("received_at"),
+	)
+	handler = HANDLERS.get(str(event.get("event_type") or ""))
+	if handler:
+		frappe.get_attr(handler)(event, payload)
+
+
+def _claim(device_id: str, limit: int) -> list[dict[str, Any]]:
+	"""Lock the device's next pending events in order; empty if another worker holds its head."""
+
+	cols = ", ".join(f"`{f}`" for f in EVENT_FIELDS)
+	rows = frappe.db.sql(
+		f"""
+		SELECT {cols}, `next_attempt_at` FROM `tabRFID Edge Event`
+		WHERE `processed`=0 AND `device_id`=%s AND `attempts` < %s
+		ORDER BY `received_at` ASC, `seq` ASC, `name` ASC
+		LIMIT %s
+		FOR UPDATE SKIP LOCKED
+		""",
+		(device_id, _max_attempts(), limit),
+		as_dict=True,
+	)
+	if not rows:
+		return []
+	head = frappe.db.sql(
+		"""
+		SELECT `name` FROM `tabRFID Edge Event`
+		WHERE `processed`=0 AND `device_id`=%s AND `attempts` < %s
+		ORDER BY `received_at` ASC, `seq` ASC, `name` ASC
+		LIMIT 1
+		""",
+		(device_id, _max_attempts()),
+	)
+	if not head or head[0][0] != rows[0].get("name"):
+		# A concurrent run holds older events of this device; skipping ahead would break seq order.
+		return []
+	return rows
+
+
+def drain_device(device_id: str, *, chunk: int | None = None, max_sec: int | None = None) -> dict[str, Any]:
+	"""Process one device's pending events in seq order, one committed transaction per chunk.
+
+	A failing event is rolled back to its savepoint, scheduled for retry with exponential
+	backoff and stops the drain so later events of the device never overtake it.
+	"""
+
+	chunk = chunk or site_settings.get_int("rfidenter_edge_consumer_chunk", 50, lo=1, hi=1000)
+	max_sec = max_sec or site_settings.get_int("rfidenter_edge_consumer_max_sec", 120, lo=5, hi=3600)
+	deadline = time.monotonic() + max_sec
+	result: dict[str, Any] = {"device_id": device_id, "processed": 0, "failed": 0, "blocked": False}
+
+	while time.monotonic() < deadline:
+		rows = _claim(device_id, chunk)
+		if not rows:
+			frappe.db.rollback()
+			break
+
+		now = frappe.utils.now_datetime()
+		stop = False
+		for row in rows:
+			if row.get("next_attempt_at") and row.get("next_attempt_at") > now:
+				result["blocked"] = True
+				stop = True
+				break
+
+			frappe.db.savepoint("rfidenter_edge_event")
+			try:
+				process_event(row)
+			except Exception:
+				frappe.db.rollback(save_point="rfidenter_edge_event")
+				attempts = int(row.get("attempts") or 0) + 1
+				retry_at = frappe.utils.add_to_date(now, seconds=_backoff_sec(attempts))
+				frappe.db.sql(
+					"""
+					UPDATE `tabRFID Edge Event`
+					SET `attempts`=%s, `error`=%s, `next_attempt_at`=%s
+					WHERE `name`=%s
+					""",
+					(attempts, frappe.get_traceback()[-1000:], retry_at, row.get("name")),
+				)
+				if attempts >= _max_attempts():
+					frappe.log_error(
+						title=f"RFIDenter edge event gave up ({row.get('event_id')})",
+						message=frappe.get_traceback(),
+					)
+				result["failed"] += 1
+				stop = True
+				break
+
+			frappe.db.sql(
+				"""
+				UPDATE `tabRFID Edge Event`
+				SET `processed`=1, `error`=NULL, `next_attempt_at`=NULL
+				WHERE `name`=%s
+				""",
+				(row.get("name"),),
+			)
+			result["processed"] += 1
+
+		frappe.db.commit()
+		if stop or len(rows) < chunk:
+			break
+
+	return result
+
+
+def pending_devices() -> list[str]:
+	rows = frappe.db.sql(
+		"""
+		SELECT DISTINCT `device_id` FROM `tabRFID Edge Event`
+		WHERE `processed`=0 AND `attempts` < %s
+		""",
+		(_max_attempts(),),
+	)
+	return sorted({str(r[0]) for r in rows if r and r[0]})
+
+
+def dispatch() -> dict[str, Any]:
+	"""Scheduler entry point: queue one drain job per device with a backlog so devices run in parallel."""
+
+	devices = pending_devices()
+	for device_id in devices:
+		frappe.enqueue(
+			"rfidenter.rfidenter.edge_consumer.drain_device",
+			queue="short",
+			timeout=600,
+			job_id=f"rfidenter-edge-consumer:{device_id}",
+			deduplicate=True,
+			device_id=device_id,
+		)
+	return {"ok": True, "queued": len(devices), "devices": devices}
+
+
+def get_backlog() -> dict[str, Any]:
+	rows = frappe.db.sql(
+		"""
+		SELECT `device_id`,
+			SUM(`attempts` < %s) AS `pending`,
+			SUM(`attempts` >= %s) AS `dead`,
+			SUM(`attempts` > 0 AND `attempts` < %s) AS `retrying`,
+			MIN(`received_at`) AS `oldest_at`
+		FROM `tabRFID Edge Event`
+		WHERE `processed`=0
+		GROUP BY `device_id`
+		""",
+		(_max_attempts(), _max_attempts(), _max_attempts()),
+		as_dict=True,
+	)
+	items = [
+		{
+			"device_id": row.get("device_id"),
+			"pending": int(row.get("pending") or 0),
+			"dead": int(row.get("dead") or 0),
+			"retrying": int(row.get("retrying") or 0),
+			"oldest_at": row.get("oldest_at"),
+		}
+		for row in rows
+	]
+	return {"ok": True, "async": is_async(), "count": len(items), "items": items}
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Any
+
+import frappe
+
+from rfidenter.rfidenter import site_settings
+
+TRACKER_DOCTYPE = "RFID Seq Tracker"
+ANOMALY_EVENT = "rfidenter_seq_anomaly"
+
+
+def _stall_sec() -> int:
+	"""Seconds without events after which a running batch is flagged as stalled."""
+
+	return site_settings.get_int("rfidenter_seq_stall_sec", 300, lo=30, hi=24 * 3600)
+
+
+def _tracker_name(device_id: str, batch_id: str) -> str:
+	# Cutting long keys to 140 characters would fold different batches into one tracker row.
+	key = f"{device_id}:{batch_id}"
+	if len(key) <= 140:
+		return key
+	return f"{key[:99]}:{hashlib.sha1(key.encode('utf-8')).hexdigest()}"
+
+
+def _publish_anomaly(kind: str, device_id: str, batch_id: str, **details: Any) -> None:
+	payload = {"kind": kind, "device_id": device_id, "batch_id": batch_id, **details}
+	try:
+		frappe.publish_realtime(ANOMALY_EVENT, payload, after_commit=True)
+	except Exception:
+		frappe.log_error(title="RFIDenter seq anomaly publish failed", message=frappe.get_traceback())
+
+
+def track_event(
+	device_id: str, batch_id: str | None, seq: int | None, received_at: Any | None = None
+) -> None:
+	"""Fold one inserted edge event into its (device, batch) seq range.
+
+	Costs one primary-key read plus one upsert, independent of how many events the batch already has.
+	"""
+
+	if not device_id or not batch_id or seq is None:
+		return
+
+	name = _tracker_name(device_id, batch_id)
+	now = received_at or frappe.utils.now_datetime()
+	prev = frappe.db.sql(
+		f"SELECT `last_seq` FROM `tab{TRACKER_DOCTYPE}` WHERE `name`=%s",
+		(name,),
+	)
+	prev_last = prev[0][0] if prev else None
+
+	# MariaDB applies ON DUPLICATE KEY assignments left to right, so `out_of_order_count`
+	# must be evaluated before `last_seq` is advanced.
+	frappe.db.sql(
+		f"""
+		INSERT INTO `tab{TRACKER_DOCTYPE}`
+			(`name`, `device_id`, `batch_id`, `first_seq`, `last_seq`, `event_count`,
+			 `out_of_order_count`, `regression_count`, `first_event_at`, `last_event_at`, `stalled`,
+			 `creation`, `modified`)
+		VALUES (%s, %s, %s, %s, %s, 1, 0, 0, %s, %s, 0, %s, %s)
+		ON DUPLICATE KEY UPDATE
+			`out_of_order_count` = `out_of_order_count`
+				+ IF(`last_seq` IS NOT NULL AND VALUES(`last_seq`) < `last_seq`, 1, 0),
+			`first_seq` = LEAST(COALESCE(`first_seq`, VALUES(`first_seq`)), VALUES(`first_seq`)),
+			`last_seq` = GREATEST(COALESCE(`last_seq`, VALUES(`last_seq`)), VALUES(`last_seq`)),
+			`event_count` = `event_count` + 1,
+			`first_event_at` = COALESCE(`first_event_at`, VALUES(`first_event_at`)),
+			`last_event_at` = VALUES(`last_event_at`),
+			`stalled` = 0,
+			`modified` = VALUES(`modified`)
+		""",
+		(name, device_id, batch_id, seq, seq, now, now, now, now),
+	)
+
+	if prev_last is None:
+		return
+	prev_last = int(prev_last)
+	if seq > prev_last + 1:
+		_publish_anomaly(
+			"gap", device_id, batch_id, expected_seq=prev_last + 1, seq=seq, missing=seq - prev_last - 1
+		)
+	elif seq < prev_last:
+		_publish_anomaly("out_of_order", device_id, batch_id, last_seq=prev_last, seq=seq)
+
+
+def record_regression(device_id: str, batch_id: str | None, seq: int | None, last_seq: int | None) -> None:
+	"""Count a rejected (SEQ_REGRESSION) event against its batch tracker."""
+
+	if not device_id or not batch_id:
+		return
+
+	name = _tracker_name(device_id, batch_id)
+	now = frappe.utils.now_datetime()
+	frappe.db.sql(
+		f"""
+		INSERT INTO `tab{TRACKER_DOCTYPE}`
+			(`name`, `device_id`, `batch_id`, `event_count`, `out_of_order_count`, `regression_count`,
+			 `last_regression_seq`, `stalled`, `creation`, `modified`)
+		VALUES (%s, %s, %s, 0, 0, 1, %s, 0, %s, %s)
+		ON DUPLICATE KEY UPDATE
+			`regression_count` = `regression_count` + 1,
+			`last_regression_seq` = VALUES(`last_regression_seq`),
+			`modified` = VALUES(`modified`)
+		""",
+		(name, device_id, batch_id, seq, now, now),
+	)
+	_publish_anomaly("regression", device_id, batch_id, seq=seq, last_seq=last_seq)
+
+
+def detect_stalls() -> dict[str, Any]:
+	"""Flag running batches whose tracker has not advanced within the stall window.
+
+	Reads only trackers of currently running batches, never the event log.
+	"""
+
+	stall_sec = _stall_sec()
+	cutoff = frappe.utils.add_to_date(frappe.utils.now_datetime(), seconds=-stall_sec)
+	rows = frappe.db.sql(
+		f"""
+		SELECT t.`name`, t.`device_id`, t.`batch_id`, t.`last_seq`, t.`last_event_at`
+		FROM `tab{TRACKER_DOCTYPE}` t
+		INNER JOIN `tabRFID Batch State` s
+			ON s.`device_id` = t.`device_id` AND s.`current_batch_id` = t.`batch_id`
+		WHERE s.`status` = 'Running'
+		  AND t.`stalled` = 0
+		  AND t.`last_event_at` < %s
+		""",
+		(cutoff,),
+		as_dict=True,
+	)
+
+	for row in rows:
+		frappe.db.sql(
+			f"UPDATE `tab{TRACKER_DOCTYPE}` SET `stalled`=1 WHERE `name`=%s AND `stalled`=0",
+			(row.get("name"),),
+		)
+		_publish_anomaly(
+			"stall",
+			str(row.get("device_id") or ""),
+			str(row.get("batch_id") or ""),
+			last_seq=row.get("last_seq"),
+			last_event_at=row.get("last_event_at"),
+			stall_sec=stall_sec,
+		)
+
+	return {"ok": True, "stalled": len(rows), "stall_sec": stall_sec}
+
+
+def list_anomalies(
+	*,
+	device_id: str | None = None,
+	batch_id: str | None = None,
+	include_clean: bool = False,
+	limit: Any | None = None,
+) -> dict[str, Any]:
+	try:
+		lim = int(limit) if limit is not None else 200
+	except Exception:
+		lim = 200
+	lim = max(1, min(2000, lim))
+
+	conditions: list[str] = []
+	values: list[Any] = []
+	if device_id:
+		conditions.append("`device_id`=%s")
+		values.append(device_id)
+	if batch_id:
+		conditions.append("`batch_id`=%s")
+		values.append(batch_id)
+	if not include_clean:
+		conditions.append(
+			"(`regression_count` > 0 OR `out_of_order_count` > 0 OR `stalled` = 1"
+			" OR (`last_seq` - `first_seq` + 1) > `event_count`)"
+		)
+	where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+	values.append(lim)
+
+	rows = frappe.db.sql(
+		f"""
+		SELECT `device_id`, `batch_id`, `first_seq`, `last_seq`, `event_count`, `out_of_order_count`,
+			`regression_count`, `last_regression_seq`, `first_event_at`, `last_event_at`, `stalled`
+		FROM `tab{TRACKER_DOCTYPE}`
+		{where}
+		ORDER BY `modified` DESC
+		LIMIT %s
+		""",
+		tuple(values),
+		as_dict=True,
+	)
+
+	items: list[dict[str, Any]] = []
+	for row in rows:
+		first_seq = row.get("first_seq")
+		last_seq = row.get("last_seq")
+		count = int(row.get("event_count") or 0)
+		missing = 0
+		if first_seq is not None and last_seq is not None:
+			missing = max(0, int(last_seq) - int(first_seq) + 1 - count)
+		items.append({**row, "missing": missing, "stalled": bool(row.get("stalled"))})
+
+	return {"ok": True, "count": len(items), "items": items}
@@ -363,6 +363,7 @@ frappe.pages["rfidenter-remote"].on_page_load = function (wrapper) {
 		if (!agentId) throw new Error("Agent tanlang.");
 
 		const timeoutSec = Math.max(2, Math.min(120, Math.ceil(timeoutMs / 1000)));
+		const waitSec = Math.min(10, timeoutSec);
 		const r = await frappe.call("rfidenter.rfidenter.api.agent_enqueue", {
 			agent_id: agentId,
 			command,
@@ -386,10 +387,12 @@ frappe.pages["rfidenter-remote"].on_page_load = function (wrapper) {
 			(async () => {
 				for (let i = 0; i < 200; i++) {
 					if (!state.pending.has(requestId)) return;
+					// The server holds the call until the agent replies (or wait_sec passes).
 					// eslint-disable-next-line no-await-in-loop
-					await sleep(250);
-					// eslint-disable-next-line no-await-in-loop
-					const rr = await frappe.call("rfidenter.rfidenter.api.agent_result", { request_id: requestId });
+					const rr = await frappe.call("rfidenter.rfidenter.api.agent_wait_result", {
+						request_id: requestId,
+						wait_sec: waitSec,
+					});
 					const m = rr?.message;
 					if (m?.state === "done") {
 						const pending = state.pending.get(requestId);
@@ -400,6 +403,9 @@ frappe.pages["rfidenter-remote"].on_page_load = function (wrapper) {
 						return;
 					}
 					if (m?.state === "expired") break;
+					// No free wait slot on the server: fall back to a short poll interval.
+					// eslint-disable-next-line no-await-in-loop
+					if (!m?.waited) await sleep(250);
 				}
 				const pending = state.pending.get(requestId);
 				if (!pending) return;
@@ -87,6 +87,9 @@ frappe.pages["rfidenter-zebra"].on_page_load = function (wrapper) {
 	const STORAGE_BATCH_PRODUCT = "rfidenter.edge.product_id";
 	const DEFAULT_ZEBRA_URL = "http://127.0.0.1:18000";
 	const BATCH_POLL_INTERVAL_MS = 2000;
+	// With the device state stream connected, polling is only a safety net.
+	const BATCH_SLOW_POLL_INTERVAL_MS = 30000;
+	const BATCH_SUMMARY_MIN_INTERVAL_MS = 10000;
 	const BATCH_BACKOFF_BASE_MS = 1000;
 	const BATCH_BACKOFF_MAX_MS = 30000;
 	// Realtime scale UI is removed to prevent Android app logout; UI is status-driven only.
@@ -116,6 +119,10 @@ frappe.pages["rfidenter-zebra"].on_page_load = function (wrapper) {
 				pollTimeout: null,
 				backoffCount: 0,
 				pollMode: "",
+				subscribedDevice: "",
+				queueDepths: null,
+				summaryKey: "",
+				summaryAt: 0,
 			},
 		cancelToken: 0,
 	};
@@ -249,6 +256,7 @@ frappe.pages["rfidenter-zebra"].on_page_load = function (wrapper) {
 		if (!agentId) throw new Error("Zebra agent tanlang.");
 
 		const timeoutSec = Math.max(2, Math.min(120, Math.ceil(timeoutMs / 1000)));
+		const waitSec = Math.min(10, timeoutSec);
 		const r = await frappe.call("rfidenter.rfidenter.api.agent_enqueue", {
 			agent_id: agentId,
 			command,
@@ -275,10 +283,12 @@ frappe.pages["rfidenter-zebra"].on_page_load = function (wrapper) {
 					if (token !== state.cancelToken) {
 						throw new Error("Cancelled");
 					}
+					// The server holds the call until the agent replies (or wait_sec passes).
 					// eslint-disable-next-line no-await-in-loop
-					await sleep(250);
-					// eslint-disable-next-line no-await-in-loop
-					const rr = await frappe.call("rfidenter.rfidenter.api.agent_result", { request_id: requestId });
+					const rr = await frappe.call("rfidenter.rfidenter.api.agent_wait_result", {
+						request_id: requestId,
+						wait_sec: waitSec,
+					});
 					const m = rr?.message;
 					if (m?.state === "done") {
 						const pending = state.pending.get(requestId);
@@ -289,6 +299,9 @@ frappe.pages["rfidenter-zebra"].on_page_load = function (wrapper) {
 						return;
 					}
 					if (m?.state === "expired") break;
+					// No free wait slot on the server: fall back to a short poll interval.
+					// eslint-disable-next-line no-await-in-loop
+					if (!m?.waited) await sleep(250);
 				}
 				const pending = state.pending.get(requestId);
 				if (!pending) return;
@@ -670,6 +683,29 @@ frappe.pages["rfidenter-zebra"].on_page_load = function (wrapper) {
 								<div class="rfz-batch-value rfz-queue-agent">N/A</div>
 							</div>
 						</div>
+
+						<div class="rfz-batch-grid" style="margin-top: 12px">
+							<div class="rfz-batch-field">
+								<div class="text-muted">Batch events</div>
+								<div class="rfz-batch-value rfz-sum-events">--</div>
+							</div>
+							<div class="rfz-batch-field">
+								<div class="text-muted">Weights</div>
+								<div class="rfz-batch-value rfz-sum-weights">--</div>
+							</div>
+							<div class="rfz-batch-field">
+								<div class="text-muted">Labels printed</div>
+								<div class="rfz-batch-value rfz-sum-labels">--</div>
+							</div>
+							<div class="rfz-batch-field">
+								<div class="text-muted">First event</div>
+								<div class="rfz-batch-value rfz-sum-first">--</div>
+							</div>
+							<div class="rfz-batch-field">
+								<div class="text-muted">Last event</div>
+								<div class="rfz-batch-value rfz-sum-last">--</div>
+							</div>
+						</div>
 					</div>
 				</div>
 
@@ -877,6 +913,11 @@ frappe.pages["rfidenter-zebra"].on_page_load = function (wrapper) {
 	const $batchQueuePrint = $body.find(".rfz-queue-print");
 	const $batchQueueErp = $body.find(".rfz-queue-erp");
 	const $batchQueueAgent = $body.find(".rfz-queue-agent");
+	const $sumEvents = $body.find(".rfz-sum-events");
+	const $sumWeights = $body.find(".rfz-sum-weights");
+	const $sumLabels = $body.find(".rfz-sum-labels");
+	const $sumFirst = $body.find(".rfz-sum-first");
+	const $sumLast = $body.find(".rfz-sum-last");
 	const $modeManual = $body.find(".rfidenter-mode-manual");
 	const $modeAuto = $body.find(".rfidenter-mode-auto");
 	const $epc = $body.find(".rfidenter-epc");
@@ -1617,6 +1658,7 @@ frappe.pages["rfidenter-zebra"].on_page_load = function (wrapper) {
 
 	function stopPollingTimers() {
 		stopBatchPolling();
+		unsubscribeDeviceState();
 		if (itemState.timer) {
 			window.clearInterval(itemState.timer);
 			itemState.timer = null;
@@ -1634,11 +1676,49 @@ frappe.pages["rfidenter-zebra"].on_page_load = function (wrapper) {
 		itemState.timer = window.setInterval(() => processItemQueue().catch(() => {}), 5000);
 	}
 
+	function isRealtimeConnected() {
+		return Boolean(frappe?.realtime?.socket?.connected);
+	}
+
+	function subscribeDeviceState(deviceId) {
+		const want = String(deviceId || "").trim();
+		const prev = state.batch.subscribedDevice;
+		if (prev === want || !frappe?.realtime?.doc_subscribe) return;
+		try {
+			if (prev) frappe.realtime.doc_unsubscribe("RFID Batch State", prev);
+			if (want) frappe.realtime.doc_subscribe("RFID Batch State", want);
+			state.batch.subscribedDevice = want;
+		} catch {
+			state.batch.subscribedDevice = "";
+		}
+	}
+
+	function unsubscribeDeviceState() {
+		const prev = state.batch.subscribedDevice;
+		state.batch.subscribedDevice = "";
+		if (!prev || !frappe?.realtime?.doc_unsubscribe) return;
+		try {
+			frappe.realtime.doc_unsubscribe("RFID Batch State", prev);
+		} catch {
+			// ignore
+		}
+	}
+
+	function onDeviceState(msg) {
+		if (state.batch.authBlocked) return;
+		const deviceId = String(msg?.device_id || "").trim();
+		if (!deviceId || deviceId !== getDeviceId()) return;
+		renderBatchState(msg, state.batch.queueDepths);
+		refreshBatchSummary().catch(() => {});
+	}
+
 	function startBatchPolling() {
 		if (state.batch.authBlocked) return;
 		stopBatchPolling();
+		subscribeDeviceState(getDeviceId());
+		const interval = isRealtimeConnected() ? BATCH_SLOW_POLL_INTERVAL_MS : BATCH_POLL_INTERVAL_MS;
 		state.batch.pollMode = "interval";
-		state.batch.pollTimer = window.setInterval(() => pollDeviceStatus({ quiet: true }), BATCH_POLL_INTERVAL_MS);
+		state.batch.pollTimer = window.setInterval(() => pollDeviceStatus({ quiet: true }), interval);
 	}
 
 	function resetBatchBackoff() {
@@ -1795,6 +1875,50 @@ frappe.pages["rfidenter-zebra"].on_page_load = function (wrapper) {
 			setBatchQueue($batchQueueAgent, agentDepth);
 		}
 
+	function renderBatchSummary(summary) {
+		if (!summary) {
+			for (const $el of [$sumEvents, $sumWeights, $sumLabels, $sumFirst, $sumLast]) $el.text("--");
+			return;
+		}
+		const byType = summary.events_by_type || {};
+		const detail = Object.keys(byType)
+			.sort()
+			.map((k) => `${k}: ${byType[k]}`)
+			.join("\n");
+		$sumEvents.text(String(summary.events ?? 0)).attr("title", detail);
+		const weightTotal = Number(summary.weight_total || 0);
+		$sumWeights.text(`${summary.weight_count ?? 0} · ${weightTotal.toFixed(3)}`);
+		$sumLabels.text(String(summary.labels_printed ?? 0));
+		$sumFirst.text(fmtServerTime(summary.first_event_at));
+		$sumLast.text(fmtServerTime(summary.last_event_at));
+	}
+
+	async function refreshBatchSummary({ force = false } = {}) {
+		const deviceId = getDeviceId();
+		const batchId = String(state.batch.currentBatch || "").trim();
+		const key = deviceId && batchId ? `${deviceId}:${batchId}` : "";
+		if (!key) {
+			state.batch.summaryKey = "";
+			renderBatchSummary(null);
+			return;
+		}
+		// Throttled: state pushes can arrive per event, the rollup only needs a glance-level refresh.
+		if (!force && key === state.batch.summaryKey && Date.now() - state.batch.summaryAt < BATCH_SUMMARY_MIN_INTERVAL_MS) return;
+		state.batch.summaryKey = key;
+		state.batch.summaryAt = Date.now();
+		try {
+			const r = await frappe.call("rfidenter.rfidenter.api.get_batch_summaries", {
+				device_id: deviceId,
+				batch_id: batchId,
+				limit: 1,
+			});
+			const items = Array.isArray(r?.message?.items) ? r.message.items : [];
+			renderBatchSummary(items[0] || null);
+		} catch {
+			// ignore
+		}
+	}
+
 	async function fetchDeviceSnapshot(deviceId) {
 		const payload = { device_id: deviceId };
 		const r = await frappe.call("rfidenter.get_device_snapshot", payload);
@@ -1814,10 +1938,13 @@ frappe.pages["rfidenter-zebra"].on_page_load = function (wrapper) {
 			setBatchControlsEnabled(true);
 			setAuthBanner(false);
 			try {
+				subscribeDeviceState(deviceId);
 				const msg = await fetchDeviceSnapshot(deviceId);
 				resetBatchBackoff();
+				state.batch.queueDepths = msg.queue_depths || null;
 				if (msg.state) {
 					renderBatchState(msg.state, msg.queue_depths);
+					refreshBatchSummary().catch(() => {});
 					setPill($batchStatus, "");
 				} else if (!quiet) {
 				setPill($batchStatus, "State topilmadi", { indicator: "orange" });
@@ -2316,7 +2443,25 @@ frappe.pages["rfidenter-zebra"].on_page_load = function (wrapper) {
 	$copiesEnabled.on("change", () => updateCopies());
 	$printText.on("change", () => updateFeedBehavior());
 
-	// Realtime channels are intentionally disabled to avoid Android app logout.
+	// Only the per-device state stream is used; tag/scale channels stay disabled to avoid Android app logout.
+	try {
+		frappe.realtime.on("rfidenter_device_state", (msg) => onDeviceState(msg));
+		const socket = frappe.realtime.socket;
+		if (socket?.on) {
+			socket.on("connect", () => {
+				// Room membership is lost on reconnect; resubscribe and catch up with one snapshot.
+				state.batch.subscribedDevice = "";
+				if (document.hidden) return;
+				startBatchPolling();
+				pollDeviceStatus({ quiet: true });
+			});
+			socket.on("disconnect", () => {
+				if (state.batch.pollMode === "interval") startBatchPolling();
+			});
+		}
+	} catch {
+		// ignore
+	}
 
 	$batchDevice.on("change", () => {
 		setDeviceId($batchDevice.val());
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import base64
+import zlib
+from typing import Any
+
+import frappe
+
+from rfidenter.rfidenter import site_settings
+
+try:
+	import zstandard
+except ImportError:  # optional; zlib is always available
+	zstandard = None
+
+
+# Stored values start with one of these markers when compressed. Canonical JSON always starts
+# with `{`, `[`, `"`, a digit or a literal, so plain values can never be mistaken for encoded ones.
+ZLIB_MARKER = "~z1:"
+ZSTD_MARKER = "~zs1:"
+MARKERS = (ZLIB_MARKER, ZSTD_MARKER)
+
+
+def _min_bytes() -> int:
+	"""Payloads shorter than this are stored as-is. 0 disables compression."""
+
+	return site_settings.get_int("rfidenter_payload_compress_min_bytes", 1024, lo=0, hi=16 * 1024 * 1024)
+
+
+def _algorithm() -> str:
+	algo = str(site_settings.get("rfidenter_payload_codec", "zlib") or "zlib").strip().lower()
+	if algo == "zstd" and zstandard is not None:
+		return "zstd"
+	return "zlib"
+
+
+def is_encoded(value: Any) -> bool:
+	return isinstance(value, str) and value.startswith(MARKERS)
+
+
+def encode(text: str | None) -> str | None:
+	"""Compress canonical JSON text for storage when it is large enough to be worth it.
+
+	The columns are Long Text, so compressed bytes are stored base85-encoded behind a marker.
+	Hashes must be taken over `text` before calling this.
+	"""
+
+	if not text or is_encoded(text):
+		return text
+	min_bytes = _min_bytes()
+	raw = text.encode("utf-8")
+	if not min_bytes or len(raw) < min_bytes:
+		return text
+
+	if _algorithm() == "zstd":
+		marker, packed = ZSTD_MARKER, zstandard.ZstdCompressor(level=3).compress(raw)
+	else:
+		marker, packed = ZLIB_MARKER, zlib.compress(raw, 6)
+	encoded = marker + base64.b85encode(packed).decode("ascii")
+	# Incompressible payloads (already-random data) are kept as-is.
+	return encoded if len(encoded) < len(text) else text
+
+
+def decode(value: Any) -> Any:
+	"""Return the canonical JSON text for a stored value; plain values pass through unchanged."""
+
+	if not is_encoded(value):
+		return value
+	if value.startswith(ZSTD_MARKER):
+		if zstandard is None:
+			frappe.throw("zstd payload: zstandard moduli o‘rnatilmagan.", frappe.ValidationError)
+		packed = base64.b85decode(value[len(ZSTD_MARKER) :])
+		return zstandard.ZstdDecompressor().decompress(packed).decode("utf-8")
+	packed = base64.b85decode(value[len(ZLIB_MARKER) :])
+	return zlib.decompress(packed).decode("utf-8")
+
+
+def encode_fields(doc: Any, fields: tuple[str, ...]) -> None:
+	for field in fields:
+		doc.set(field, encode(doc.get(field)))
+
+
+def decode_fields(doc: Any, fields: tuple[str, ...]) -> None:
+	for field in fields:
+		try:
+			doc.set(field, decode(doc.get(field)))
+		except Exception:
+			frappe.log_error(title="RFIDenter payload decode failed", message=frappe.get_traceback())
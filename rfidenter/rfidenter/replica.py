@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import functools
+from collections.abc import Callable
+from typing import Any
+
+import frappe
+
+from rfidenter.rfidenter import site_settings
+
+LAG_CACHE_KEY = "rfidenter_replica_lag_sec"
+FAILURE_LOG_KEY = "rfidenter_replica_failure_logged"
+FAILURE_LOG_SEC = 3600
+
+
+def _replica_enabled() -> bool:
+	# Same switch and connection keys as Frappe's own read-only routing:
+	# read_from_replica, replica_host, replica_db_port (+ optional replica_db_name/password).
+	return bool(site_settings.get("read_from_replica", 0)) and bool(site_settings.get("replica_host", ""))
+
+
+def _max_lag_sec() -> int:
+	return site_settings.get_int("rfidenter_replica_max_lag_sec", 5, lo=0, hi=3600)
+
+
+def measure_lag() -> float | None:
+	"""Replication delay of the connection in `frappe.db`; None when it cannot be trusted.
+
+	SHOW SLAVE STATUS needs REPLICA MONITOR or SUPER on MariaDB (REPLICATION CLIENT on MySQL)
+	for the replica's DB user; without it this raises. A server that is not configured as a
+	replica at all (e.g. a second local instance loaded from a dump) reports no status row and
+	counts as fresh.
+	"""
+
+	rows = frappe.db.sql("SHOW SLAVE STATUS", as_dict=True)
+	if not rows:
+		return 0.0
+	lag = rows[0].get("Seconds_Behind_Master")
+	if lag is None:
+		# SQL thread stopped or broken.
+		return None
+	return float(lag)
+
+
+def _cached_lag() -> float | None:
+	try:
+		value = frappe.cache().get_value(LAG_CACHE_KEY)
+	except Exception:
+		return None
+	return None if value is None or value == "" else float(value)
+
+
+def _store_lag(lag: float | None) -> None:
+	ttl = site_settings.get_int("rfidenter_replica_check_sec", 5, lo=1, hi=300)
+	try:
+		# -1 marks "unusable" so the next requests skip the replica without reconnecting.
+		frappe.cache().set_value(LAG_CACHE_KEY, -1 if lag is None else lag, expires_in_sec=ttl)
+	except Exception:
+		pass
+
+
+def _log_failure(traceback: str) -> None:
+	# A failed check sends every read to the primary until it passes; log that once an hour, not
+	# on every re-check.
+	try:
+		cache = frappe.cache()
+		if cache.get_value(FAILURE_LOG_KEY):
+			return
+		cache.set_value(FAILURE_LOG_KEY, 1, expires_in_sec=FAILURE_LOG_SEC)
+	except Exception:
+		pass
+	frappe.log_error(
+		title="RFIDenter replica check failed",
+		message=(
+			"Reads are served from the primary until the replica can be reached and its lag measured. "
+			"The replica's DB user needs REPLICA MONITOR or SUPER (MariaDB) / REPLICATION CLIENT "
+			"(MySQL) for SHOW SLAVE STATUS.\n\n" + traceback
+		),
+	)
+
+
+def _is_fresh(lag: float | None) -> bool:
+	return lag is not None and 0 <= lag <= _max_lag_sec()
+
+
+def _restore_primary() -> None:
+	primary = getattr(frappe.local, "primary_db", None)
+	if primary is None:
+		return
+	try:
+		frappe.local.db.close()
+	except Exception:
+		pass
+	frappe.local.db = primary
+	del frappe.local.primary_db
+	if hasattr(frappe.local, "replica_db"):
+		del frappe.local.replica_db
+
+
+def read_only(fn: Callable) -> Callable:
+	"""Serve a pure-read endpoint from the configured replica while it is fresh enough.
+
+	Falls back to the primary when the replica is disabled, unreachable, or lags more than
+	`rfidenter_replica_max_lag_sec`. The lag is measured at most every `rfidenter_replica_check_sec`;
+	a failed connect or lag probe is logged at most once per FAILURE_LOG_SEC.
+	"""
+
+	@functools.wraps(fn)
+	def wrapper(*args, **kwargs):
+		# Nested read-only calls keep whatever connection the outer call chose.
+		if not _replica_enabled() or hasattr(frappe.local, "primary_db"):
+			return fn(*args, **kwargs)
+
+		cached = _cached_lag()
+		if cached is not None and not _is_fresh(cached):
+			return fn(*args, **kwargs)
+
+		failure = None
+		try:
+			frappe.connect_replica()
+			lag = cached if cached is not None else measure_lag()
+		except Exception:
+			failure = frappe.get_traceback()
+			lag = None
+		if cached is None:
+			_store_lag(lag)
+
+		if not _is_fresh(lag):
+			_restore_primary()
+			# Logged only now: the Error Log insert must not go to the read-only replica.
+			if failure:
+				_log_failure(failure)
+			return fn(*args, **kwargs)
+		try:
+			return fn(*args, **kwargs)
+		finally:
+			_restore_primary()
+
+	return wrapper
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import time
+from typing import Any
+
+import frappe
+
+from rfidenter.rfidenter import batch_projection, site_settings
+
+LAST_RUN_KEY = "rfidenter_retention_last_run"
+
+# `days` = 0 disables a policy. Edge events are archived by edge_archive; purging them here
+# (processed rows only) is opt-in so the archive stays complete.
+DEFAULT_POLICIES: dict[str, dict[str, Any]] = {
+	"RFID Agent Request": {"days": 7, "column": "modified", "where": ""},
+	"RFID Zebra Dedupe": {"days": 30, "column": "modified", "where": ""},
+	"RFID Edge Event": {"days": 0, "column": "received_at", "where": "`processed`=1", "device": "device_id"},
+	"RFID Saved Tag Day": {"days": 180, "column": "day", "where": ""},
+	"RFID Scale Reading": {"days": 90, "column": "creation", "where": "", "device": "device"},
+}
+
+
+def get_policies() -> dict[str, dict[str, Any]]:
+	"""Default policies merged with `rfidenter_retention` from site config.
+
+	Example: {"rfidenter_retention": {"RFID Agent Request": {"days": 3}, "RFID Edge Event": {"days": 365}}}
+	"""
+
+	overrides = site_settings.get("rfidenter_retention", {}) or {}
+	if not isinstance(overrides, dict):
+		overrides = {}
+
+	policies: dict[str, dict[str, Any]] = {}
+	for doctype, policy in DEFAULT_POLICIES.items():
+		merged = dict(policy)
+		override = overrides.get(doctype)
+		if isinstance(override, dict) and "days" in override:
+			merged["days"] = override.get("days")
+		elif isinstance(override, (int, float, str)) and not isinstance(override, bool):
+			merged["days"] = override
+		try:
+			merged["days"] = max(0, min(3650, int(float(merged.get("days") or 0))))
+		except Exception:
+			merged["days"] = int(policy.get("days") or 0)
+		policies[doctype] = merged
+	return policies
+
+
+def _rowcount() -> int:
+	try:
+		return int(frappe.db._cursor.rowcount or 0)
+	except Exception:
+		return 0
+
+
+def purge_doctype(doctype: str, policy: dict[str, Any], *, chunk: int, deadline: float) -> dict[str, Any]:
+	"""Delete rows older than the policy cutoff in index-ordered chunks, one commit per chunk."""
+
+	started = time.monotonic()
+	days = int(policy.get("days") or 0)
+	result: dict[str, Any] = {"doctype": doctype, "days": days, "deleted": 0, "chunks": 0, "complete": True}
+	if days <= 0 or not frappe.db.table_exists(doctype):
+		result["skipped"] = True
+		result["seconds"] = 0.0
+		return result
+
+	column = policy["column"]
+	cutoff = frappe.utils.add_days(frappe.utils.now_datetime(), -days)
+	if column == "day":
+		cutoff = cutoff.date()
+	extra = f" AND {policy['where']}" if policy.get("where") else ""
+
+	while True:
+		if time.monotonic() >= deadline:
+			result["complete"] = False
+			break
+		# Tables that feed the batch state replay also report which devices lost history.
+		device_col = f", `{policy['device']}`" if policy.get("device") else ""
+		rows = frappe.db.sql(
+			f"""
+			SELECT `name`{device_col} FROM `tab{doctype}`
+			WHERE `{column}` < %s{extra}
+			ORDER BY `{column}` ASC
+			LIMIT %s
+			""",
+			(cutoff, chunk),
+		)
+		if not rows:
+			break
+		names = [row[0] for row in rows]
+		if device_col:
+			batch_projection.mark_history_trimmed({row[1] for row in rows})
+		placeholders = ", ".join(["%s"] * len(names))
+		frappe.db.sql(f"DELETE FROM `tab{doctype}` WHERE `name` IN ({placeholders})", tuple(names))
+		deleted = _rowcount()
+		frappe.db.sql(
+			f"DELETE FROM `tabVersion` WHERE `ref_doctype`=%s AND `docname` IN ({placeholders})",
+			(doctype, *names),
+		)
+		frappe.db.commit()
+		result["deleted"] += deleted
+		result["chunks"] += 1
+		if len(names) < chunk:
+			break
+
+	result["seconds"] = round(time.monotonic() - started, 3)
+	return result
+
+
+def run_retention() -> dict[str, Any]:
+	"""Scheduler entry point: apply every retention policy within a bounded time budget."""
+
+	chunk = site_settings.get_int("rfidenter_retention_chunk", 500, lo=50, hi=5000)
+	budget = site_settings.get_int("rfidenter_retention_max_sec", 240, lo=10, hi=3600)
+	started = time.monotonic()
+	deadline = started + budget
+
+	results = []
+	for doctype, policy in get_policies().items():
+		try:
+			results.append(purge_doctype(doctype, policy, chunk=chunk, deadline=deadline))
+		except Exception:
+			frappe.db.rollback()
+			frappe.log_error(title=f"RFIDenter retention failed ({doctype})", message=frappe.get_traceback())
+			results.append({"doctype": doctype, "error": True})
+
+	report = {
+		"ok": True,
+		"ran_at": frappe.utils.now_datetime().isoformat(),
+		"seconds": round(time.monotonic() - started, 3),
+		"chunk": chunk,
+		"results": results,
+	}
+	try:
+		frappe.cache().set_value(LAST_RUN_KEY, report)
+	except Exception:
+		pass
+	return report
+
+
+def get_status() -> dict[str, Any]:
+	return {
+		"ok": True,
+		"policies": {dt: {"days": p.get("days")} for dt, p in get_policies().items()},
+		"last_run": frappe.cache().get_value(LAST_RUN_KEY),
+	}
@@ -0,0 +1,350 @@
+"""Reference stable-weight FSM for offline replay and filter tuning.
+
+Mirrors the edge state machine described in the README:
+WAIT_EMPTY -> LOADING -> SETTLING -> LOCKED -> PRINTING -> POST_GUARD -> WAIT_EMPTY,
+with PAUSED (reweigh required) when the weight moves after lock.
+
+Pure Python with no Frappe dependency. Filters are computed over whole arrays first and the
+state machine then walks the filtered arrays. Both walks are sequential (the tracking EMA
+re-seeds from its own output), so a grid sweep shares filter outputs between settings with the
+same time constants instead of recomputing them per setting.
+"""
+
+from __future__ import annotations
+
+import math
+import random
+import time
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+WAIT_EMPTY = "WAIT_EMPTY"
+LOADING = "LOADING"
+SETTLING = "SETTLING"
+LOCKED = "LOCKED"
+PRINTING = "PRINTING"
+POST_GUARD = "POST_GUARD"
+PAUSED = "PAUSED"
+
+DEFAULT_PARAMS: dict[str, float] = {
+	"fast_tau_ms": 60.0,  # fast EMA time constant: follows the load
+	"slow_tau_ms": 250.0,  # slow EMA time constant: the settled estimate
+	"snap_kg": 0.05,  # the slow EMA re-seeds from the raw reading on moves larger than this
+	"empty_kg": 0.05,  # at or below this the scale counts as empty
+	"min_load_kg": 0.1,  # a placement starts above this
+	"settle_band_kg": 0.01,  # |fast - slow| below this counts as settled
+	"settle_ms": 400.0,  # how long the band must hold before LOCKED
+	"print_ms": 800.0,  # PRINTING duration before POST_GUARD
+	"guard_band_kg": 0.03,  # movement after lock beyond this -> PAUSED
+	"guard_ms": 250.0,  # ... if it lasts this long while still loaded
+	"removal_ratio": 0.5,  # below this share of the locked weight the load is being removed, not moved
+}
+
+
+def make_params(overrides: dict[str, Any] | None = None) -> dict[str, float]:
+	params = dict(DEFAULT_PARAMS)
+	for key, value in (overrides or {}).items():
+		if key in params:
+			params[key] = float(value)
+	return params
+
+
+def ema(ts: Sequence[int], values: Sequence[float], tau_ms: float) -> list[float]:
+	"""Time-aware exponential moving average (alpha = 1 - exp(-dt / tau)), robust to jittery sample rates."""
+
+	out: list[float] = []
+	if not values:
+		return out
+	acc = float(values[0])
+	prev_ts = ts[0]
+	tau = max(1e-6, float(tau_ms))
+	exp = math.exp
+	for t, v in zip(ts, values, strict=True):
+		dt = t - prev_ts
+		if dt > 0:
+			acc += (1.0 - exp(-dt / tau)) * (v - acc)
+		prev_ts = t
+		out.append(acc)
+	return out
+
+
+def tracking_ema(ts: Sequence[int], values: Sequence[float], tau_ms: float, snap: float) -> list[float]:
+	"""Slow EMA that jumps to the input when it moves by more than `snap`.
+
+	A plain slow EMA needs several time constants to catch up with a new load; re-seeding on
+	large moves keeps it a settle detector rather than a lag line.
+	"""
+
+	out: list[float] = []
+	if not values:
+		return out
+	acc = float(values[0])
+	prev_ts = ts[0]
+	tau = max(1e-6, float(tau_ms))
+	exp = math.exp
+	for t, v in zip(ts, values, strict=True):
+		if abs(v - acc) > snap:
+			acc = v
+		else:
+			dt = t - prev_ts
+			if dt > 0:
+				acc += (1.0 - exp(-dt / tau)) * (v - acc)
+		prev_ts = t
+		out.append(acc)
+	return out
+
+
+def run(
+	ts: Sequence[int],
+	weights: Sequence[float],
+	params: dict[str, Any] | None = None,
+	*,
+	filters: dict[tuple, list[float]] | None = None,
+) -> dict[str, Any]:
+	"""Replay one stream (ms timestamps, weights) and return lock, pause and transition events.
+
+	`filters` memoizes the EMA outputs across calls on the same stream; pass one dict per stream.
+	"""
+
+	p = make_params(params)
+	filters = {} if filters is None else filters
+	fast_key = ("fast", p["fast_tau_ms"])
+	if fast_key not in filters:
+		filters[fast_key] = ema(ts, weights, p["fast_tau_ms"])
+	slow_key = ("slow", p["slow_tau_ms"], p["snap_kg"])
+	if slow_key not in filters:
+		filters[slow_key] = tracking_ema(ts, weights, p["slow_tau_ms"], p["snap_kg"])
+	fast = filters[fast_key]
+	slow = filters[slow_key]
+
+	empty_kg = p["empty_kg"]
+	min_load = p["min_load_kg"]
+	band = p["settle_band_kg"]
+	settle_ms = p["settle_ms"]
+	print_ms = p["print_ms"]
+	guard = p["guard_band_kg"]
+	guard_ms = p["guard_ms"]
+	removal_ratio = p["removal_ratio"]
+
+	state = WAIT_EMPTY
+	since = ts[0] if ts else 0
+	load_start = 0
+	locked_weight = 0.0
+	moved_since: int | None = None
+	locks: list[dict[str, Any]] = []
+	pauses: list[dict[str, Any]] = []
+	transitions = 0
+
+	for i in range(len(ts)):
+		t = ts[i]
+		f = fast[i]
+		nxt = state
+		if state == WAIT_EMPTY:
+			if f > min_load:
+				nxt = LOADING
+				load_start = t
+		elif state == LOADING:
+			if f <= empty_kg:
+				nxt = WAIT_EMPTY
+			elif abs(f - slow[i]) < band:
+				nxt = SETTLING
+		elif state == SETTLING:
+			if f <= empty_kg:
+				nxt = WAIT_EMPTY
+			elif abs(f - slow[i]) >= band:
+				nxt = LOADING
+			elif t - since >= settle_ms:
+				nxt = LOCKED
+				locked_weight = slow[i]
+				locks.append({"ts": t, "weight": locked_weight, "load_start": load_start})
+		elif state == LOCKED:
+			nxt = PRINTING
+		elif state in (PRINTING, POST_GUARD):
+			if abs(f - locked_weight) > guard and f > max(min_load, locked_weight * removal_ratio):
+				moved_since = t if moved_since is None else moved_since
+			else:
+				moved_since = None
+			if moved_since is not None and t - moved_since >= guard_ms:
+				nxt = PAUSED
+				moved_since = None
+				pauses.append({"ts": t, "weight": f, "locked_weight": locked_weight})
+			elif state == PRINTING and t - since >= print_ms:
+				nxt = POST_GUARD
+			elif state == POST_GUARD and f <= empty_kg:
+				# Removal gating: only an empty scale re-arms the next placement.
+				nxt = WAIT_EMPTY
+		elif state == PAUSED:
+			if f <= empty_kg:
+				nxt = WAIT_EMPTY
+
+		if nxt != state:
+			state = nxt
+			since = t
+			transitions += 1
+
+	return {"locks": locks, "pauses": pauses, "transitions": transitions, "state": state, "samples": len(ts)}
+
+
+def generate_stream(
+	placements: int = 100,
+	*,
+	seed: int = 0,
+	rate_hz: float = 20.0,
+	noise_kg: float = 0.002,
+	two_step_ratio: float = 0.15,
+	bump_ratio: float = 0.05,
+) -> dict[str, Any]:
+	"""Synthetic scale stream with ground truth.
+
+	Each placement is a damped-oscillation step to a random weight, held, then removed. Some
+	placements are loaded in two steps (a lock on the first step is a false lock) and some get
+	bumped after settling (the FSM should pause rather than lock twice).
+	"""
+
+	rng = random.Random(seed)
+	dt = 1000.0 / rate_hz
+	ts: list[int] = []
+	weights: list[float] = []
+	truth: list[dict[str, Any]] = []
+	t = 0.0
+
+	def emit(value: float) -> None:
+		nonlocal t
+		ts.append(int(t))
+		weights.append(value + rng.gauss(0.0, noise_kg))
+		t += dt
+
+	def settle_to(start: float, target: float, ms: float, tau_ms: float, freq_hz: float) -> float:
+		"""Emit the damped step; returns the time the envelope fell inside the noise floor."""
+
+		begin = t
+		settled_at = None
+		for _ in range(int(ms / dt)):
+			el = t - begin
+			envelope = math.exp(-el / tau_ms)
+			value = target + (start - target) * envelope * math.cos(2 * math.pi * freq_hz * el / 1000.0)
+			if settled_at is None and abs(target - start) * envelope < 3 * noise_kg:
+				settled_at = t
+			emit(value)
+		return settled_at if settled_at is not None else t
+
+	for _ in range(placements):
+		for _ in range(int(rng.uniform(500, 1500) / dt)):
+			emit(0.0)
+		final = round(rng.uniform(0.3, 25.0), 3)
+		tau = rng.uniform(80, 300)
+		freq = rng.uniform(1.5, 4.0)
+		two_step = rng.random() < two_step_ratio
+		if two_step:
+			first = round(final * rng.uniform(0.4, 0.8), 3)
+			settle_to(0.0, first, rng.uniform(900, 1600), tau, freq)
+			settled_at = settle_to(first, final, 2500, tau, freq)
+		else:
+			settled_at = settle_to(0.0, final, 2500, tau, freq)
+		bumped = rng.random() < bump_ratio
+		if bumped:
+			settle_to(final, final + rng.uniform(0.1, 1.0), 600, tau, freq)
+			settle_to(weights[-1], final, 600, tau, freq)
+		removed_at = t
+		settle_to(final, 0.0, 600, 60, 0.5)
+		truth.append(
+			{
+				"weight": final,
+				"settled_at": settled_at,
+				"removed_at": removed_at,
+				"two_step": two_step,
+				"bumped": bumped,
+			}
+		)
+
+	return {"ts": ts, "weights": weights, "truth": truth, "rate_hz": rate_hz}
+
+
+def _percentile(values: list[float], pct: float) -> float | None:
+	if not values:
+		return None
+	ordered = sorted(values)
+	idx = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+	return ordered[idx]
+
+
+def score(
+	result: dict[str, Any], truth: list[dict[str, Any]], *, tolerance_kg: float = 0.02
+) -> dict[str, Any]:
+	"""Match locks to placements. A lock is false when it lands before the true settle time or
+	more than tolerance (absolute, or 0.2% of the weight) away from the final weight."""
+
+	locks = result["locks"]
+	li = 0
+	latencies: list[float] = []
+	false_locks = 0
+	missed = 0
+	extra = 0
+	for placement in truth:
+		window_end = placement["removed_at"]
+		matched = []
+		while li < len(locks) and locks[li]["ts"] <= window_end:
+			matched.append(locks[li])
+			li += 1
+		if not matched:
+			missed += 1
+			continue
+		good = None
+		for lock in matched:
+			tol = max(tolerance_kg, placement["weight"] * 0.002)
+			ok = lock["ts"] >= placement["settled_at"] and abs(lock["weight"] - placement["weight"]) <= tol
+			if ok and good is None:
+				good = lock
+			else:
+				# Early, wrong-weight or second lock for the same placement (a double print).
+				false_locks += 1
+		extra += max(0, len(matched) - 1)
+		if good is not None:
+			latencies.append(good["ts"] - placement["settled_at"])
+	false_locks += len(locks) - li
+
+	total = len(locks)
+	return {
+		"placements": len(truth),
+		"locks": total,
+		"missed": missed,
+		"extra_locks": extra,
+		"false_locks": false_locks,
+		"false_lock_rate": round(false_locks / total, 4) if total else 0.0,
+		"latency_ms_mean": round(sum(latencies) / len(latencies), 1) if latencies else None,
+		"latency_ms_p50": _percentile(latencies, 50),
+		"latency_ms_p95": _percentile(latencies, 95),
+		"pauses": len(result["pauses"]),
+	}
+
+
+def benchmark(
+	settings: Iterable[dict[str, Any]] | None = None,
+	*,
+	placements: int = 200,
+	seed: int = 0,
+	stream: dict[str, Any] | None = None,
+) -> list[dict[str, Any]]:
+	"""Run each filter setting over the same synthetic stream and report latency / false locks."""
+
+	stream = stream or generate_stream(placements, seed=seed)
+	rows = []
+	# Shared filter outputs: samples_per_sec counts the EMA work only on the first setting using it.
+	filters: dict[tuple, list[float]] = {}
+	for overrides in settings or [{}]:
+		started = time.perf_counter()
+		result = run(stream["ts"], stream["weights"], overrides, filters=filters)
+		elapsed = time.perf_counter() - started
+		row = {"params": make_params(overrides), **score(result, stream["truth"])}
+		row["samples_per_sec"] = int(len(stream["ts"]) / elapsed) if elapsed > 0 else None
+		rows.append(row)
+	return rows
+
+
+def default_grid() -> list[dict[str, float]]:
+	grid = []
+	for slow_tau in (150.0, 250.0, 400.0):
+		for band in (0.005, 0.01, 0.02):
+			for settle in (250.0, 400.0, 700.0):
+				grid.append({"slow_tau_ms": slow_tau, "settle_band_kg": band, "settle_ms": settle})
+	return grid
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+from typing import Any
+
+import frappe
+
+from rfidenter.rfidenter import batch_summary, edge_seq, scale_stream
+
+DOCTYPE = "RFID Scale Reading"
+UNIT_CODES = {"kg": 1, "g": 2, "lb": 3, "oz": 4}
+UNIT_NAMES = {code: unit for unit, code in UNIT_CODES.items()}
+ROLLUP_MAX_BUCKETS = 1000
+INSERT_FIELDS = (
+	"event_id",
+	"device",
+	"ts_ms",
+	"weight",
+	"unit_code",
+	"stable",
+	"batch_id",
+	"seq",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+)
+
+
+def unit_code(unit: str | None) -> int:
+	return UNIT_CODES.get(str(unit or "").strip().lower(), 0)
+
+
+def unit_name(code: Any) -> str:
+	try:
+		return UNIT_NAMES.get(int(code), "")
+	except Exception:
+		return ""
+
+
+def existing_event_ids(event_ids: list[str]) -> set[str]:
+	"""The subset of `event_ids` already stored, so retries can be answered before any other work."""
+
+	ids = [eid for eid in event_ids if eid]
+	if not ids:
+		return set()
+	return set(
+		frappe.db.sql_list(
+			f"SELECT `event_id` FROM `tab{DOCTYPE}` WHERE `event_id` IN ({', '.join(['%s'] * len(ids))})",
+			tuple(ids),
+		)
+	)
+
+
+def insert_readings(device: str, readings: list[dict[str, Any]]) -> dict[str, Any]:
+	"""Append readings that carry an event_id with one multi-row INSERT IGNORE.
+
+	The unique event_id keeps retries idempotent. Inserted readings advance the seq tracker and
+	the batch rollup (one upsert per batch) exactly like the edge-event path did.
+	"""
+
+	readings = [r for r in readings if r.get("event_id")]
+	if not readings:
+		return {"inserted": 0, "duplicates": 0, "inserted_ids": []}
+
+	existing = existing_event_ids([r["event_id"] for r in readings])
+
+	now = frappe.utils.now_datetime()
+	user = frappe.session.user or "Administrator"
+	values = []
+	fresh: list[dict[str, Any]] = []
+	for reading in readings:
+		if reading["event_id"] in existing:
+			continue
+		existing.add(reading["event_id"])
+		values.append(
+			(
+				reading["event_id"],
+				device,
+				int(reading["ts"]),
+				float(reading["weight"]),
+				unit_code(reading.get("unit")),
+				1 if reading.get("stable") else 0,
+				reading.get("batch_id") or None,
+				reading.get("seq"),
+				now,
+				now,
+				user,
+				user,
+			)
+		)
+		fresh.append(reading)
+
+	inserted_ids: set[str] = set()
+	if values:
+		frappe.db.bulk_insert(DOCTYPE, list(INSERT_FIELDS), values, ignore_duplicates=True)
+		# A concurrent request may have won the race for some ids; count only what this call wrote.
+		inserted_ids = set(
+			frappe.db.sql_list(
+				f"""
+				SELECT `event_id` FROM `tab{DOCTYPE}`
+				WHERE `event_id` IN ({", ".join(["%s"] * len(fresh))}) AND `creation`=%s
+				""",
+				(*(r["event_id"] for r in fresh), now),
+			)
+		)
+
+	by_batch: dict[str, list[float]] = {}
+	seqs_by_batch: dict[str, list[int]] = {}
+	for reading in fresh:
+		if reading["event_id"] not in inserted_ids:
+			continue
+		batch_id = reading.get("batch_id")
+		if not batch_id:
+			continue
+		by_batch.setdefault(batch_id, []).append(float(reading["weight"]))
+		if reading.get("seq") is not None:
+			seqs_by_batch.setdefault(batch_id, []).append(reading["seq"])
+	for batch_id, seqs in seqs_by_batch.items():
+		try:
+			# A retry may store a reading the deadband dropped (and already counted) the first time.
+			for seq, first in zip(seqs, scale_stream.claim_seqs(device, batch_id, seqs), strict=True):
+				if first:
+					edge_seq.track_event(device, batch_id, seq, now)
+		except Exception:
+			frappe.log_error(title="RFIDenter seq tracking failed", message=frappe.get_traceback())
+	for batch_id, weights in by_batch.items():
+		try:
+			batch_summary.record_weights(
+				device_id=device,
+				batch_id=batch_id,
+				event_type="ingest_scale_weight",
+				weights=weights,
+				received_at=now,
+			)
+		except Exception:
+			frappe.log_error(title="RFIDenter batch summary failed", message=frappe.get_traceback())
+
+	return {
+		"inserted": len(inserted_ids),
+		"duplicates": len(readings) - len(inserted_ids),
+		"inserted_ids": sorted(inserted_ids),
+	}
+
+
+def rollup(device: str, *, since_ms: int, until_ms: int, bucket_ms: int) -> dict[str, Any]:
+	"""Min/max/avg/count per time bucket, computed in SQL over the (device, ts_ms) index."""
+
+	bucket_ms = max(1, int(bucket_ms))
+	if until_ms <= since_ms:
+		return {"ok": True, "device": device, "bucket_ms": bucket_ms, "points": []}
+	# Never return more than ROLLUP_MAX_BUCKETS rows; widen the bucket instead.
+	bucket_ms = max(bucket_ms, -(-(until_ms - since_ms) // ROLLUP_MAX_BUCKETS))
+
+	rows = frappe.db.sql(
+		f"""
+		SELECT FLOOR(`ts_ms` / %s) * %s AS `ts`,
+			MIN(`weight`) AS `min`, MAX(`weight`) AS `max`, AVG(`weight`) AS `mean`,
+			COUNT(*) AS `count`, SUM(`stable`) AS `stable_count`
+		FROM `tab{DOCTYPE}`
+		WHERE `device`=%s AND `ts_ms` >= %s AND `ts_ms` < %s
+		GROUP BY `ts`
+		ORDER BY `ts` ASC
+		""",
+		(bucket_ms, bucket_ms, device, since_ms, until_ms),
+		as_dict=True,
+	)
+	points = [
+		{
+			"ts": int(row.get("ts") or 0),
+			"min": float(row.get("min") or 0),
+			"max": float(row.get("max") or 0),
+			"mean": round(float(row.get("mean") or 0), 6),
+			"count": int(row.get("count") or 0),
+			"stable_count": int(row.get("stable_count") or 0),
+		}
+		for row in rows
+	]
+	return {"ok": True, "device": device, "bucket_ms": bucket_ms, "points": points}
@@ -0,0 +1,407 @@
+from __future__ import annotations
+
+import json
+import pickle
+from typing import Any
+
+import frappe
+
+from rfidenter.rfidenter import payload_codec, site_settings
+
+DEADBAND_PREFIX = "rfidenter_scale_deadband_state:"
+DEADBAND_STATE_TTL_SEC = 24 * 3600
+SEQ_SEEN_PREFIX = "rfidenter_scale_seq_seen:"
+SEQ_SEEN_TTL_SEC = 7 * 24 * 3600
+SEQ_SEEN_BLOCK_BITS = 16
+
+# Deadband state is a hash per device, read, compared and written in one step so concurrent
+# readings for a device cannot both pass against the same stale state.
+# ARGV: weight, unit, stable (0/1), ts, epsilon, keepalive_ms, ttl_sec
+# Returns {reason, suppressed_total, suppressed_since, previous weight, unit, stable, ts}.
+_DEADBAND_LUA = """
+local s = redis.call('HMGET', KEYS[1], 'weight', 'unit', 'stable', 'ts', 'suppressed_total', 'suppressed_since')
+local weight = tonumber(ARGV[1])
+local ts = tonumber(ARGV[4])
+local epsilon = tonumber(ARGV[5])
+local total = tonumber(s[5]) or 0
+local since = tonumber(s[6]) or 0
+local reason = ''
+if epsilon <= 0 then
+	reason = 'disabled'
+elseif not s[4] then
+	reason = 'first'
+elseif ARGV[3] ~= s[3] then
+	reason = 'stable'
+elseif ARGV[2] ~= s[2] then
+	reason = 'unit'
+elseif math.abs(weight - (tonumber(s[1]) or 0)) > epsilon then
+	reason = 'delta'
+else
+	local last_ts = tonumber(s[4]) or 0
+	if ts - last_ts >= tonumber(ARGV[6]) or ts < last_ts then
+		reason = 'keepalive'
+	end
+end
+if reason ~= '' then
+	redis.call('HSET', KEYS[1], 'weight', ARGV[1], 'unit', ARGV[2], 'stable', ARGV[3], 'ts', ARGV[4],
+		'suppressed_total', total, 'suppressed_since', 0)
+else
+	total = total + 1
+	since = since + 1
+	redis.call('HSET', KEYS[1], 'suppressed_total', total, 'suppressed_since', since)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[7])
+return {reason, total, since, s[1] or '', s[2] or '', s[3] or '', s[4] or ''}
+"""
+
+# Put back the state a passed reading replaced, unless a later reading has moved it on since.
+# ARGV: ts written by the reading, previous weight, unit, stable, ts ('' = there was none)
+_UNDO_DEADBAND_LUA = """
+if redis.call('HGET', KEYS[1], 'ts') ~= ARGV[1] then
+	return 0
+end
+if ARGV[5] == '' then
+	redis.call('HDEL', KEYS[1], 'weight', 'unit', 'stable', 'ts')
+else
+	redis.call('HSET', KEYS[1], 'weight', ARGV[2], 'unit', ARGV[3], 'stable', ARGV[4], 'ts', ARGV[5])
+end
+return 1
+"""
+
+_scripts: dict[str, Any] = {}
+
+
+def _script(name: str, source: str):
+	script = _scripts.get(name)
+	if script is None:
+		script = _scripts[name] = frappe.cache().register_script(source)
+	return script
+
+
+def _text(value: Any) -> str:
+	return value.decode() if isinstance(value, bytes) else str(value or "")
+
+
+def deadband_config(device_key: str) -> dict[str, float]:
+	"""Deadband for one scale from `rfidenter_scale_deadband`.
+
+	Example: {"epsilon": 0.005, "keepalive_sec": 5, "devices": {"line-2": {"epsilon": 0.02}}}
+	An epsilon of 0 disables the filter for that device.
+	"""
+
+	conf = site_settings.get("rfidenter_scale_deadband", {}) or {}
+	if not isinstance(conf, dict):
+		conf = {}
+	merged = {"epsilon": conf.get("epsilon", 0.005), "keepalive_sec": conf.get("keepalive_sec", 5)}
+	per_device = (
+		(conf.get("devices") or {}).get(device_key) if isinstance(conf.get("devices"), dict) else None
+	)
+	if isinstance(per_device, dict):
+		merged.update({k: v for k, v in per_device.items() if k in merged})
+
+	try:
+		epsilon = max(0.0, float(merged["epsilon"]))
+	except Exception:
+		epsilon = 0.005
+	try:
+		keepalive = max(0.5, min(3600.0, float(merged["keepalive_sec"])))
+	except Exception:
+		keepalive = 5.0
+	return {"epsilon": epsilon, "keepalive_ms": keepalive * 1000}
+
+
+def apply_deadband(
+	device_key: str, *, weight: float, unit: str, stable: bool | None, ts: int
+) -> dict[str, Any]:
+	"""Decide whether a reading is worth publishing/persisting.
+
+	A reading passes when it is the first one, moves more than epsilon from the last passed
+	reading, flips the stable flag, changes unit, or the keepalive interval has elapsed.
+	Suppressed readings are counted per device.
+	"""
+
+	config = deadband_config(device_key)
+	args = [
+		repr(float(weight)),
+		unit or "",
+		1 if stable else 0,
+		int(ts),
+		repr(config["epsilon"]),
+		int(config["keepalive_ms"]),
+		DEADBAND_STATE_TTL_SEC,
+	]
+	reason, suppressed_total, suppressed_since, *previous = _script("deadband", _DEADBAND_LUA)(
+		keys=[frappe.cache().make_key(f"{DEADBAND_PREFIX}{device_key}")], args=args, client=frappe.cache()
+	)
+	reason = _text(reason)
+
+	# For a passed reading `suppressed_since` is how many readings were dropped before it, and
+	# `previous` is the state it replaced (for undo_deadband).
+	return {
+		"passed": bool(reason),
+		"reason": reason,
+		"suppressed_total": int(suppressed_total),
+		"suppressed_since": int(suppressed_since),
+		"ts": int(ts),
+		"previous": [_text(v) for v in previous],
+	}
+
+
+def undo_deadband(device_key: str, gate: dict[str, Any]) -> None:
+	"""Revert the state a passed reading wrote, e.g. when the transaction that stored it rolled back.
+
+	Otherwise the bridge's retry of that reading would be compared against itself, dropped as
+	within the deadband, and never stored. Suppression counters are left as they are.
+	"""
+
+	if not gate.get("passed"):
+		return
+	try:
+		_script("undo_deadband", _UNDO_DEADBAND_LUA)(
+			keys=[frappe.cache().make_key(f"{DEADBAND_PREFIX}{device_key}")],
+			args=[int(gate["ts"]), *gate["previous"]],
+			client=frappe.cache(),
+		)
+	except Exception:
+		frappe.log_error(title="RFIDenter scale deadband undo failed", message=frappe.get_traceback())
+
+
+def deadband_stats(device_key: str) -> dict[str, Any]:
+	cache = frappe.cache()
+	total, ts = cache.execute_command(
+		"HMGET", cache.make_key(f"{DEADBAND_PREFIX}{device_key}"), "suppressed_total", "ts"
+	)
+	return {
+		"suppressed_total": int(total or 0),
+		"last_passed_ts": int(ts) if ts is not None else None,
+	}
+
+
+def claim_seqs(device_id: str, batch_id: str, seqs: list[int]) -> list[bool]:
+	"""Mark (device, batch, seq) as counted by the seq tracker; True for each seq seen for the first time.
+
+	Readings the deadband drops are not stored anywhere, so a bridge retry would otherwise count
+	them again. Seqs are bits in Redis bitmaps of 2**SEQ_SEEN_BLOCK_BITS seqs per key, so a batch
+	costs one bit per seq and a retried reading (suppressed or stored) is counted once.
+	"""
+
+	if not seqs:
+		return []
+	cache = frappe.cache()
+	mask = (1 << SEQ_SEEN_BLOCK_BITS) - 1
+	pipe = cache.pipeline(transaction=False)
+	for seq in seqs:
+		key = cache.make_key(f"{SEQ_SEEN_PREFIX}{device_id}:{batch_id}:{int(seq) >> SEQ_SEEN_BLOCK_BITS}")
+		pipe.setbit(key, int(seq) & mask, 1)
+		pipe.expire(key, SEQ_SEEN_TTL_SEC)
+	previous = pipe.execute()[0::2]
+	return [not bit for bit in previous]
+
+
+HISTORY_PREFIX = "rfidenter_scale_history:"
+HISTORY_MAX_POINTS = 300
+
+
+def _history_size() -> int:
+	return site_settings.get_int("rfidenter_scale_history_size", 3000, lo=100, hi=100_000)
+
+
+def _history_sec() -> int:
+	return site_settings.get_int("rfidenter_scale_history_sec", 600, lo=30, hi=24 * 3600)
+
+
+def push_history(device_key: str, readings: list[dict[str, Any]]) -> None:
+	"""Append raw readings to the device's ring buffer (a Redis list trimmed to N entries).
+
+	Entries are compact "ts,weight,stable" strings; the list expires when the scale goes quiet.
+	"""
+
+	if not readings:
+		return
+	cache = frappe.cache()
+	key = cache.make_key(f"{HISTORY_PREFIX}{device_key}")
+	entries = [f"{int(r['ts'])},{float(r['weight']):.6g},{1 if r.get('stable') else 0}" for r in readings]
+	pipe = cache.pipeline(transaction=False)
+	pipe.rpush(key, *entries)
+	pipe.ltrim(key, -_history_size(), -1)
+	pipe.expire(key, _history_sec())
+	pipe.execute()
+
+
+def _read_history(device_key: str, since_ms: int) -> list[tuple[int, float, bool]]:
+	cache = frappe.cache()
+	raw = cache.lrange(f"{HISTORY_PREFIX}{device_key}", 0, -1) or []
+	points: list[tuple[int, float, bool]] = []
+	for item in raw:
+		try:
+			ts, weight, stable = (item.decode() if isinstance(item, bytes) else str(item)).split(",")
+			point = (int(ts), float(weight), stable == "1")
+		except Exception:
+			continue
+		if point[0] >= since_ms:
+			points.append(point)
+	points.sort(key=lambda p: p[0])
+	return points
+
+
+def get_history(
+	device_key: str, *, since_ms: int | None = None, bucket_ms: int | None = None, now_ms: int | None = None
+) -> dict[str, Any]:
+	"""Downsample the ring buffer into time buckets with min/max/mean per bucket.
+
+	Without `bucket_ms` the bucket width is chosen so at most HISTORY_MAX_POINTS come back.
+	Readings older than `rfidenter_scale_history_sec` are never returned.
+	"""
+
+	now_ms = now_ms if now_ms is not None else int(frappe.utils.now_datetime().timestamp() * 1000)
+	floor_ms = now_ms - _history_sec() * 1000
+	since = max(int(since_ms or 0), floor_ms)
+	points = _read_history(device_key, since)
+	if not points:
+		return {
+			"ok": True,
+			"device": device_key,
+			"since_ms": since,
+			"bucket_ms": bucket_ms or 0,
+			"raw": 0,
+			"points": [],
+		}
+
+	span = max(1, points[-1][0] - points[0][0] + 1)
+	if not bucket_ms or bucket_ms <= 0:
+		bucket_ms = max(50, -(-span // HISTORY_MAX_POINTS))
+	bucket_ms = max(bucket_ms, -(-span // (HISTORY_MAX_POINTS * 10)))
+
+	buckets: dict[int, dict[str, Any]] = {}
+	for ts, weight, stable in points:
+		start = ts - (ts % bucket_ms)
+		bucket = buckets.get(start)
+		if bucket is None:
+			buckets[start] = {
+				"ts": start,
+				"min": weight,
+				"max": weight,
+				"sum": weight,
+				"count": 1,
+				"stable": stable,
+			}
+			continue
+		bucket["min"] = min(bucket["min"], weight)
+		bucket["max"] = max(bucket["max"], weight)
+		bucket["sum"] += weight
+		bucket["count"] += 1
+		bucket["stable"] = stable
+
+	out = []
+	for start in sorted(buckets):
+		bucket = buckets[start]
+		out.append(
+			{
+				"ts": start,
+				"min": bucket["min"],
+				"max": bucket["max"],
+				"mean": round(bucket["sum"] / bucket["count"], 6),
+				"count": bucket["count"],
+				"stable": bucket["stable"],
+			}
+		)
+	return {
+		"ok": True,
+		"device": device_key,
+		"since_ms": since,
+		"bucket_ms": bucket_ms,
+		"raw": len(points),
+		"points": out,
+	}
+
+
+def load_recorded_stream(
+	device_id: str, *, since: Any = None, until: Any = None, source: str = "history"
+) -> dict[str, list]:
+	"""Recorded readings of one scale as parallel (ts, weights) lists for scale_fsm.run.
+
+	`history` (the default) reads the raw ring buffer: every reading, but only the recent window
+	it keeps (`rfidenter_scale_history_size` / `_sec`). `readings` reads RFID Scale Reading and `events` reads
+	ingest_scale_weight edge events recorded before that table existed; both hold only the
+	readings the deadband passed, so they under-sample settling. Timestamps are the device's own
+	ms clock.
+	"""
+
+	since_ms = int(frappe.utils.get_datetime(since).timestamp() * 1000) if since else 0
+	until_ms = int(frappe.utils.get_datetime(until).timestamp() * 1000) if until else None
+	points: list[tuple[int, float]] = []
+	if source == "history":
+		points = [(ts, weight) for ts, weight, _stable in _read_history(device_id, since_ms)]
+	elif source == "readings":
+		rows = frappe.db.sql(
+			"""
+			SELECT `ts_ms`, `weight` FROM `tabRFID Scale Reading`
+			WHERE `device`=%s AND `ts_ms` >= %s AND `ts_ms` < %s
+			ORDER BY `ts_ms` ASC
+			""",
+			(device_id, since_ms, until_ms if until_ms is not None else 2**62),
+		)
+		points = [(int(ts), float(weight)) for ts, weight in rows]
+	else:
+		filters = {"device_id": device_id, "event_type": "ingest_scale_weight"}
+		if since and until:
+			filters["received_at"] = ["between", [since, until]]
+		elif since:
+			filters["received_at"] = [">=", since]
+		elif until:
+			filters["received_at"] = ["<=", until]
+		rows = frappe.get_all(
+			"RFID Edge Event",
+			filters=filters,
+			fields=["payload_json"],
+			order_by="received_at asc, seq asc",
+			limit_page_length=0,
+		)
+		for row in rows:
+			try:
+				payload = json.loads(payload_codec.decode(row.get("payload_json")) or "{}")
+				points.append((int(payload["ts"]), float(payload["weight"])))
+			except Exception:
+				continue
+		points.sort(key=lambda p: p[0])
+	if until_ms is not None:
+		points = [p for p in points if p[0] < until_ms]
+	return {"ts": [p[0] for p in points], "weights": [p[1] for p in points]}
+
+
+ACTIVE_DEVICES_KEY = "rfidenter_scale_devices"
+
+
+def mark_active(device_key: str, *, now_ms: int, ttl_sec: int) -> None:
+	"""Record the device in the active-scale index (a sorted set scored by last reading time)."""
+
+	cache = frappe.cache()
+	key = cache.make_key(ACTIVE_DEVICES_KEY)
+	pipe = cache.pipeline(transaction=False)
+	pipe.zadd(key, {device_key: now_ms})
+	# Entries older than the reading TTL point at expired cache keys; drop them as we go.
+	pipe.zremrangebyscore(key, "-inf", now_ms - ttl_sec * 1000)
+	pipe.expire(key, ttl_sec)
+	pipe.execute()
+
+
+def active_devices(*, now_ms: int, ttl_sec: int) -> list[str]:
+	cache = frappe.cache()
+	members = cache.zrangebyscore(cache.make_key(ACTIVE_DEVICES_KEY), now_ms - ttl_sec * 1000, "+inf") or []
+	return sorted(m.decode() if isinstance(m, bytes) else str(m) for m in members)
+
+
+def get_values(keys: list[str]) -> list[Any]:
+	"""Read many frappe.cache() values (site-scoped, pickled by set_value) with a single MGET."""
+
+	if not keys:
+		return []
+	cache = frappe.cache()
+	raw = cache.mget([cache.make_key(k) for k in keys]) or []
+	values: list[Any] = []
+	for item in raw:
+		try:
+			values.append(pickle.loads(item) if item is not None else None)
+		except Exception:
+			values.append(None)
+	return values
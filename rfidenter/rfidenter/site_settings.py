@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from typing import Any
+
+import frappe
+
+
+def get(key: str, default: Any = None) -> Any:
+	"""`key` from the site's site_config.json, then common_site_config.json, then `default`."""
+
+	try:
+		site_conf = frappe.get_site_config(silent=True) or {}
+	except Exception:
+		site_conf = {}
+	return site_conf.get(key, frappe.conf.get(key, default))
+
+
+def get_int(key: str, default: int, *, lo: int, hi: int) -> int:
+	"""Integer setting clamped to [lo, hi]; values that do not parse fall back to `default`."""
+
+	try:
+		value = int(float(get(key, default)))
+	except Exception:
+		value = default
+	return max(lo, min(hi, value))
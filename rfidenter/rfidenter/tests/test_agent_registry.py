@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rfidenter.rfidenter import agent_registry, api
+
+
+class TestAgentRegistry(FrappeTestCase):
+	def setUp(self) -> None:
+		frappe.set_user("Administrator")
+		self.device_id = "test-device"
+		self.agent_id = "agent-1"
+
+	def test_agent_registry_sorted_set(self) -> None:
+		agent_registry.prune(0, now_ms=api._now_ms() + 3_600_000)
+		agent = api.register_agent(agent_id=self.agent_id, device=self.device_id)["agent"]
+		self.assertFalse(agent_registry.touch({**agent, "last_seen": agent["last_seen"] + 1000}))
+		self.assertTrue(
+			agent_registry.touch({**agent, "version": "next", "last_seen": agent["last_seen"] + 2000})
+		)
+
+		listed = {a["agent_id"]: a for a in api.list_agents()["agents"]}
+		self.assertEqual(listed[self.agent_id]["last_seen"], agent["last_seen"] + 2000)
+		self.assertEqual(listed[self.agent_id]["version"], "next")
+
+		self.assertEqual(agent_registry.prune(60, now_ms=agent["last_seen"] + 120_000), 1)
+		self.assertNotIn(self.agent_id, [a["agent_id"] for a in api.list_agents()["agents"]])
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import time
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rfidenter.rfidenter import agent_queue, api, site_settings
+
+
+class TestAgentRpc(FrappeTestCase):
+	def setUp(self) -> None:
+		frappe.set_user("Administrator")
+		self.agent_id = "agent-1"
+		frappe.db.delete("RFID Agent Request", {"agent_id": self.agent_id})
+
+	def test_agent_queue_redis_round_trip(self) -> None:
+		frappe.cache().delete_keys(f"{agent_queue.QUEUE_PREFIX}{self.agent_id}")
+		snapshots: list[dict] = []
+		with (
+			patch.object(agent_queue, "is_enabled", return_value=True),
+			patch.object(agent_queue, "audit", side_effect=snapshots.extend),
+		):
+			first = api.agent_enqueue(agent_id=self.agent_id, command="ping", args={"a": 1}, timeout_sec=5)
+			second = api.agent_enqueue(agent_id=self.agent_id, command="scan", timeout_sec=5)
+			self.assertFalse(frappe.db.exists("RFID Agent Request", first["request_id"]))
+
+			poll = api.agent_poll(agent_id=self.agent_id, max_items=1)
+			self.assertEqual([c["request_id"] for c in poll["commands"]], [first["request_id"]])
+			self.assertEqual(poll["commands"][0]["args"], {"a": 1})
+
+			# An expired lease puts the request back at the head of the queue.
+			self.assertEqual(agent_queue.requeue_expired(self.agent_id, agent_queue._now_ms() + 60_000), 1)
+			poll = api.agent_poll(agent_id=self.agent_id, max_items=5)
+			self.assertEqual(
+				[c["request_id"] for c in poll["commands"]], [first["request_id"], second["request_id"]]
+			)
+
+			self.assertEqual(api.agent_result(request_id=first["request_id"])["state"], "pending")
+			api.agent_reply(
+				agent_id=self.agent_id, request_id=first["request_id"], ok=True, result={"pong": 1}
+			)
+			res = api.agent_result(request_id=first["request_id"])
+			self.assertEqual((res["state"], res["reply"]["result"]), ("done", {"pong": 1}))
+
+		agent_queue.record_audit(list(reversed(snapshots)))
+		audit = frappe.db.get_value(
+			"RFID Agent Request", first["request_id"], ["status", "ok", "command"], as_dict=True
+		)
+		self.assertEqual((audit.status, audit.ok, audit.command), ("Done", 1, "ping"))
+		self.assertEqual(frappe.db.get_value("RFID Agent Request", second["request_id"], "status"), "Sent")
+
+	def test_agent_poll_long_poll(self) -> None:
+		frappe.cache().delete_keys(f"{agent_queue.QUEUE_PREFIX}{self.agent_id}")
+		with patch.object(agent_queue, "is_enabled", return_value=True), patch.object(agent_queue, "audit"):
+			started = time.monotonic()
+			empty = api.agent_poll(agent_id=self.agent_id, wait_sec=1)
+			self.assertEqual(empty["commands"], [])
+			self.assertTrue(empty["waited"])
+			self.assertGreaterEqual(time.monotonic() - started, 0.9)
+
+			# A queued command (and its notify token) is returned without blocking.
+			req = api.agent_enqueue(agent_id=self.agent_id, command="ping", timeout_sec=5)
+			poll = api.agent_poll(agent_id=self.agent_id, wait_sec=5)
+			self.assertEqual([c["request_id"] for c in poll["commands"]], [req["request_id"]])
+
+			no_slots = {"rfidenter_agent_long_poll_workers": 0}.get
+			with patch.object(site_settings, "get", side_effect=lambda k, d=None: no_slots(k, d)):
+				busy = api.agent_poll(agent_id=self.agent_id, wait_sec=5)
+			self.assertEqual((busy["commands"], busy.get("busy")), ([], True))
+
+	def test_agent_poll_claims_in_one_update(self) -> None:
+		ids = [
+			api.agent_enqueue(agent_id=self.agent_id, command="ping", timeout_sec=t)["request_id"]
+			for t in (5, 0, 9)
+		]
+		frappe.db.set_value("RFID Agent Request", ids[0], {"status": "Sent", "lease_expires_at": None})
+
+		with patch.object(frappe.db, "sql", wraps=frappe.db.sql) as sql:
+			poll = api.agent_poll(agent_id=self.agent_id, max_items=5)
+		self.assertEqual(sorted(c["request_id"] for c in poll["commands"]), sorted(ids))
+		updates = [c for c in sql.call_args_list if str(c.args[0]).lstrip().upper().startswith("UPDATE")]
+		self.assertEqual(len(updates), 1)
+
+		rows = frappe.get_all(
+			"RFID Agent Request",
+			filters={"agent_id": self.agent_id},
+			fields=["status", "timeout_sec", "sent_at", "lease_expires_at"],
+		)
+		for row in rows:
+			self.assertEqual(row.status, "Sent")
+			lease = (row.lease_expires_at - row.sent_at).total_seconds()
+			self.assertAlmostEqual(lease, row.timeout_sec if row.timeout_sec > 0 else 30, delta=1)
+		self.assertEqual(api.agent_poll(agent_id=self.agent_id, max_items=5)["commands"], [])
+
+	def test_agent_wait_result_caches_terminal_state(self) -> None:
+		rid = api.agent_enqueue(agent_id=self.agent_id, command="ping", timeout_sec=30)["request_id"]
+		api.agent_poll(agent_id=self.agent_id, max_items=1)
+
+		# Result waits have their own slot pool: a full agent poll pool does not turn them away.
+		no_poll_slots = {"rfidenter_agent_long_poll_workers": 0}.get
+		with patch.object(site_settings, "get", side_effect=lambda k, d=None: no_poll_slots(k, d)):
+			pending = api.agent_wait_result(request_id=rid, wait_sec=1)
+		self.assertEqual((pending["state"], pending.get("waited")), ("pending", True))
+
+		api.agent_reply(agent_id=self.agent_id, request_id=rid, ok=True, result={"pong": 1})
+		frappe.db.commit()
+		done = api.agent_wait_result(request_id=rid, wait_sec=5)
+		self.assertEqual((done["state"], done["reply"]["result"]), ("done", {"pong": 1}))
+
+		# Repeated reads are served from the cached reply, not the DocType.
+		frappe.db.delete("RFID Agent Request", {"request_id": rid})
+		self.assertEqual(api.agent_result(request_id=rid)["state"], "done")
+
+	def test_agent_reply_bulk_and_progress(self) -> None:
+		ids = [
+			api.agent_enqueue(agent_id=self.agent_id, command="scan", timeout_sec=30)["request_id"]
+			for _ in range(2)
+		]
+		api.agent_poll(agent_id=self.agent_id, max_items=5)
+
+		first = api.agent_progress(agent_id=self.agent_id, request_id=ids[0], chunks=[{"ip": "10.0.0.5"}])
+		second = api.agent_progress(agent_id=self.agent_id, request_id=ids[0], chunks='[{"ip": "10.0.0.9"}]')
+		self.assertEqual((first["offset"], second["offset"], second["total"]), (0, 1, 2))
+		progress = api.agent_result_progress(request_id=ids[0], offset=1)
+		self.assertEqual((progress["chunks"], progress["next_offset"]), ([{"ip": "10.0.0.9"}], 2))
+
+		res = api.agent_reply_bulk(
+			agent_id=self.agent_id,
+			replies=[
+				{"request_id": ids[0], "ok": True, "result": {"devices": 2}},
+				{"request_id": ids[1], "ok": False, "error": "busy"},
+				{"request_id": "missing-request", "ok": True},
+			],
+		)
+		self.assertEqual((res["accepted"], res["unknown"]), (2, ["missing-request"]))
+		done = api.agent_result(request_id=ids[0])
+		self.assertEqual((done["state"], done["reply"]["result"]), ("done", {"devices": 2}))
+		row = frappe.db.get_value("RFID Agent Request", ids[1], ["status", "ok", "error"], as_dict=True)
+		self.assertEqual((row.status, row.ok, row.error), ("Failed", 0, "busy"))
+
+	def test_agent_broadcast_fans_out_and_reports_status(self) -> None:
+		other = "agent-2"
+		frappe.db.delete("RFID Agent Request", {"agent_id": other})
+		registry = [
+			{"agent_id": self.agent_id, "platform": "linux"},
+			{"agent_id": other, "platform": "linux"},
+			{"agent_id": "agent-3", "platform": "win32"},
+		]
+		with patch.object(api, "_live_agents", return_value=registry):
+			res = api.agent_broadcast(
+				command="restart",
+				args={"soft": 1},
+				selector={"platform": "linux", "agent_ids": [self.agent_id, other, "gone"]},
+			)
+		self.assertEqual((sorted(res["agents"]), res["offline"]), (sorted([self.agent_id, other]), ["gone"]))
+		self.assertEqual(
+			frappe.db.count("RFID Agent Request", {"agent_id": ["in", [self.agent_id, other]]}), 2
+		)
+		frappe.db.commit()
+
+		status = api.agent_broadcast_status(broadcast_id=res["broadcast_id"])
+		self.assertEqual((status["state"], status["counts"]), ("pending", {"queued": 2}))
+
+		cmd = api.agent_poll(agent_id=self.agent_id, max_items=5)["commands"][0]
+		self.assertEqual((cmd["cmd"], cmd["args"]), ("restart", {"soft": 1}))
+		api.agent_reply(
+			agent_id=self.agent_id, request_id=cmd["request_id"], ok=True, result={"restarted": 1}
+		)
+		frappe.db.commit()
+
+		status = api.agent_broadcast_status(broadcast_id=res["broadcast_id"])
+		self.assertEqual(status["counts"], {"done": 1, "queued": 1})
+		item = next(i for i in status["items"] if i["agent_id"] == self.agent_id)
+		self.assertEqual(item["reply"]["result"], {"restarted": 1})
+		frappe.db.delete("RFID Agent Request", {"agent_id": other})
+
+	def test_agent_poll_priority_and_deadline(self) -> None:
+		def enqueue(command: str, timeout_sec: int) -> str:
+			res = api.agent_enqueue(agent_id=self.agent_id, command=command, timeout_sec=timeout_sec)
+			return res["request_id"]
+
+		for redis in (False, True):
+			frappe.db.delete("RFID Agent Request", {"agent_id": self.agent_id})
+			frappe.cache().delete_keys(f"{agent_queue.QUEUE_PREFIX}{self.agent_id}")
+			with (
+				patch.object(agent_queue, "is_enabled", return_value=redis),
+				patch.object(agent_queue, "audit"),
+			):
+				# Requested a minute ago with a 5 s timeout: the requester has given up.
+				with patch.object(api, "_now_ms", return_value=api._now_ms() - 60_000):
+					stale = enqueue("STATUS", 5)
+				scan = enqueue("SCAN_TCP", 30)
+				status = enqueue("STATUS", 30)
+				label = enqueue("ZEBRA_PRINT_ZPL", 30)
+
+				poll = api.agent_poll(agent_id=self.agent_id, max_items=5)
+				ids = [c["request_id"] for c in poll["commands"]]
+				self.assertEqual(ids, [label, status, scan], f"redis={redis}")
+				self.assertEqual(api.agent_result(request_id=stale)["state"], "expired")
+
+		# Rows without a priority (written before the column existed) rank as normal, not urgent.
+		self.assertEqual(api._agent_priority({"priority": None}), agent_queue.DEFAULT_PRIORITY)
+		self.assertEqual(api._agent_priority({"priority": 0}), agent_queue.PRIORITIES["urgent"])
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rfidenter.rfidenter import api, batch_projection
+
+
+class TestBatchState(FrappeTestCase):
+	def setUp(self) -> None:
+		frappe.set_user("Administrator")
+		self.device_id = "test-device"
+		self.batch_id = "batch-1"
+		frappe.db.delete("RFID Edge Event", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch State", {"device_id": self.device_id})
+		frappe.db.delete("RFID Seq Tracker", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch Summary", {"device_id": self.device_id})
+
+	def test_batch_state_published_to_device_room(self) -> None:
+		with patch("frappe.publish_realtime") as publish:
+			api.edge_batch_start(
+				event_id="evt-pub-1",
+				device_id=self.device_id,
+				batch_id=self.batch_id,
+			)
+
+		calls = [c for c in publish.call_args_list if c.args and c.args[0] == "rfidenter_device_state"]
+		self.assertEqual(len(calls), 1)
+		message = calls[0].args[1]
+		self.assertEqual(message.get("device_id"), self.device_id)
+		self.assertEqual(message.get("status"), "Running")
+		self.assertEqual(message.get("current_batch_id"), self.batch_id)
+		self.assertEqual(message.get("last_event_type"), "batch_start")
+		self.assertEqual(calls[0].kwargs.get("doctype"), "RFID Batch State")
+		self.assertEqual(calls[0].kwargs.get("docname"), self.device_id)
+
+	def test_batch_state_rebuilt_from_event_log(self) -> None:
+		api.edge_batch_start(
+			event_id="evt-proj-1",
+			device_id=self.device_id,
+			batch_id=self.batch_id,
+		)
+		api.edge_event_report(
+			event_id="evt-proj-2",
+			device_id=self.device_id,
+			batch_id=self.batch_id,
+			seq=5,
+			event_type="weight",
+			payload={"value": 1.0},
+		)
+		res = api.rebuild_batch_state(device_id=self.device_id)
+		self.assertTrue(res.get("consistent"), res.get("diff"))
+
+		frappe.db.set_value("RFID Batch State", self.device_id, {"status": "Stopped", "last_event_seq": 1})
+		res = api.rebuild_batch_state(device_id=self.device_id, repair=1)
+		self.assertFalse(res.get("consistent"))
+		self.assertTrue(res.get("repaired"))
+
+		state = frappe.get_doc("RFID Batch State", {"device_id": self.device_id})
+		self.assertEqual(state.status, "Running")
+		self.assertEqual(state.current_batch_id, self.batch_id)
+		self.assertEqual(int(state.last_event_seq or 0), 5)
+
+		# One-row pages still replay the merged streams in full.
+		full = batch_projection.project_device(self.device_id)
+		with patch.object(batch_projection, "REPLAY_CHUNK", 1):
+			self.assertEqual(batch_projection.project_device(self.device_id), full)
+
+		# Once archival or retention trimmed the device's log, a repair would replay a partial history.
+		batch_projection.mark_history_trimmed([self.device_id])
+		frappe.db.set_value("RFID Batch State", self.device_id, "status", "Stopped")
+		res = api.rebuild_batch_state(device_id=self.device_id, repair=1)
+		self.assertEqual((res.get("consistent"), res.get("repaired")), (False, False))
+		self.assertTrue(res.get("history_trimmed"))
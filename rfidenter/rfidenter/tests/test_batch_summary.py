@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rfidenter.rfidenter import api, batch_summary
+
+
+class TestBatchSummary(FrappeTestCase):
+	def setUp(self) -> None:
+		frappe.set_user("Administrator")
+		self.device_id = "test-device"
+		self.batch_id = "batch-1"
+		frappe.db.delete("RFID Edge Event", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch State", {"device_id": self.device_id})
+		frappe.db.delete("RFID Seq Tracker", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch Summary", {"device_id": self.device_id})
+
+	def test_batch_summary_rolls_up_events(self) -> None:
+		reports = (
+			("evt-sum-1", 1, "weight", {"value": 1.5}),
+			("evt-sum-2", 2, "print_completed", {"weight": 2.0}),
+			("evt-sum-3", 3, "print_completed", {"weight": 3.0}),
+		)
+		for event_id, seq, event_type, payload in reports:
+			api.edge_event_report(
+				event_id=event_id,
+				device_id=self.device_id,
+				batch_id=self.batch_id,
+				seq=seq,
+				event_type=event_type,
+				payload=payload,
+			)
+
+		res = api.get_batch_summaries(device_id=self.device_id, batch_id=self.batch_id)
+		self.assertEqual(res.get("count"), 1)
+		summary = res["items"][0]
+		self.assertEqual(summary.get("events"), 3)
+		self.assertEqual(summary["events_by_type"], {"weight": 1, "print_completed": 2})
+		self.assertEqual(summary.get("weight_count"), 3)
+		self.assertAlmostEqual(summary.get("weight_total"), 6.5)
+		self.assertEqual(summary.get("labels_printed"), 2)
+
+		# Long keys that share their first 140 characters still get separate rows.
+		long_device, long_batch = self.device_id + "x" * 60, "b" * 64
+		for event_type in ("weight", "weight_locked"):
+			batch_summary.record_event(
+				device_id=long_device, batch_id=long_batch, event_type=event_type, payload={}
+			)
+		rows = frappe.get_all(
+			"RFID Batch Summary", filters={"batch_id": long_batch}, fields=["event_type", "event_count"]
+		)
+		self.assertEqual(
+			sorted((r.event_type, r.event_count) for r in rows), [("weight", 1), ("weight_locked", 1)]
+		)
+		frappe.db.delete("RFID Batch Summary", {"batch_id": long_batch})
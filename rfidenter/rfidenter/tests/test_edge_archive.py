@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import tempfile
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rfidenter.rfidenter import api, edge_archive
+
+
+class TestEdgeArchive(FrappeTestCase):
+	def setUp(self) -> None:
+		frappe.set_user("Administrator")
+		self.device_id = "test-device"
+		self.batch_id = "batch-1"
+		frappe.db.delete("RFID Edge Event", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch State", {"device_id": self.device_id})
+		frappe.db.delete("RFID Seq Tracker", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch Summary", {"device_id": self.device_id})
+
+	def test_archived_month_served_back(self) -> None:
+		old = frappe.utils.add_months(frappe.utils.now_datetime(), -24)
+		for seq in (1, 2, 3):
+			api.edge_event_report(
+				event_id=f"evt-archive-{seq}",
+				device_id=self.device_id,
+				batch_id=self.batch_id,
+				seq=seq,
+				event_type="weight",
+				payload={"value": 7.0},
+			)
+			frappe.db.set_value(
+				"RFID Edge Event",
+				f"evt-archive-{seq}",
+				"received_at",
+				frappe.utils.add_to_date(old, seconds=seq),
+				update_modified=False,
+			)
+		month = old.strftime("%Y-%m")
+
+		with (
+			tempfile.TemporaryDirectory() as tmp,
+			patch.object(edge_archive, "_archive_dir", return_value=tmp),
+		):
+			res = edge_archive.archive_month(month)
+			self.assertGreaterEqual(res.get("archived"), 3)
+			self.assertFalse(frappe.db.exists("RFID Edge Event", {"event_id": "evt-archive-1"}))
+
+			found = api.get_edge_event(event_id="evt-archive-1")
+			self.assertTrue(found.get("archived"))
+			self.assertEqual(found["event"]["payload"].get("value"), 7.0)
+
+			# The manifest's bloom filter rules the file out without opening it.
+			with patch.object(edge_archive, "_iter_archive_file") as read_file:
+				self.assertFalse(api.get_edge_event(event_id="evt-archive-missing").get("ok"))
+			read_file.assert_not_called()
+
+			# Pages resume from the cursor's file and line instead of re-reading from the start.
+			seen, cursor = [], None
+			while True:
+				page = api.query_archived_edge_events(
+					month=month, device_id=self.device_id, limit=2, cursor=cursor
+				)
+				seen.extend(row.get("event_id") for row in page.get("items"))
+				cursor = page.get("next_cursor")
+				if not cursor:
+					break
+			self.assertEqual(seen, ["evt-archive-1", "evt-archive-2", "evt-archive-3"])
+
+		frappe.db.delete("RFID Edge Event Archive", {"month": month})
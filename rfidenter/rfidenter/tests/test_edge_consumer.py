@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rfidenter.rfidenter import api, edge_consumer
+
+
+class TestEdgeConsumer(FrappeTestCase):
+	def setUp(self) -> None:
+		frappe.set_user("Administrator")
+		self.device_id = "test-device"
+		self.batch_id = "batch-1"
+		frappe.db.delete("RFID Edge Event", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch State", {"device_id": self.device_id})
+		frappe.db.delete("RFID Seq Tracker", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch Summary", {"device_id": self.device_id})
+
+	def test_async_events_drained_in_order_with_retry(self) -> None:
+		with patch.object(edge_consumer, "is_async", return_value=True):
+			for seq in (1, 2):
+				api.edge_event_report(
+					event_id=f"evt-async-{seq}",
+					device_id=self.device_id,
+					batch_id=self.batch_id,
+					seq=seq,
+					event_type="print_completed",
+					payload={"weight": 1.5},
+				)
+		self.assertEqual(frappe.db.get_value("RFID Edge Event", "evt-async-1", "processed"), 0)
+		self.assertFalse(frappe.db.exists("RFID Batch Summary", {"device_id": self.device_id}))
+
+		with patch.object(edge_consumer.batch_summary, "record_event", side_effect=RuntimeError("boom")):
+			failed = edge_consumer.drain_device(self.device_id)
+		self.assertEqual(failed.get("failed"), 1)
+		first = frappe.db.get_value(
+			"RFID Edge Event", "evt-async-1", ["processed", "attempts", "error"], as_dict=True
+		)
+		self.assertEqual((first.processed, first.attempts), (0, 1))
+		self.assertIn("boom", first.error)
+		self.assertEqual(frappe.db.get_value("RFID Edge Event", "evt-async-2", "processed"), 0)
+
+		frappe.db.set_value("RFID Edge Event", "evt-async-1", "next_attempt_at", None, update_modified=False)
+		drained = edge_consumer.drain_device(self.device_id)
+		self.assertEqual(drained.get("processed"), 2)
+		summary = api.get_batch_summaries(device_id=self.device_id)["items"][0]
+		self.assertEqual(summary.get("labels_printed"), 2)
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rfidenter.rfidenter import api
+
+
+class TestEdgeEventQuery(FrappeTestCase):
+	def setUp(self) -> None:
+		frappe.set_user("Administrator")
+		self.device_id = "test-device"
+		self.batch_id = "batch-1"
+		frappe.db.delete("RFID Edge Event", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch State", {"device_id": self.device_id})
+		frappe.db.delete("RFID Seq Tracker", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch Summary", {"device_id": self.device_id})
+
+	def test_query_edge_events_keyset_pages(self) -> None:
+		for seq in (1, 2, 3):
+			api.edge_event_report(
+				event_id=f"evt-page-{seq}",
+				device_id=self.device_id,
+				batch_id=self.batch_id,
+				seq=seq,
+				event_type="weight",
+				payload={"value": seq},
+			)
+
+		page1 = api.query_edge_events(order="seq", device_id=self.device_id, limit=2, include_payload=1)
+		self.assertEqual([row.get("seq") for row in page1.get("items")], [1, 2])
+		self.assertEqual(page1["items"][0]["payload"].get("value"), 1)
+		self.assertTrue(page1.get("next_cursor"))
+
+		page2 = api.query_edge_events(
+			order="seq", device_id=self.device_id, limit=2, cursor=page1["next_cursor"]
+		)
+		self.assertEqual([row.get("seq") for row in page2.get("items")], [3])
+		self.assertNotIn("payload", page2["items"][0])
+		self.assertIsNone(page2.get("next_cursor"))
+
+		recent = api.query_edge_events(device_id=self.device_id, event_type="event_report", limit=10)
+		self.assertEqual(recent.get("count"), 3)
@@ -1,11 +1,10 @@
 from __future__ import annotations
 
 import frappe
-from frappe.tests.utils import FrappeTestCase
 from erpnext.stock.doctype.item.test_item import create_item
+from frappe.tests.utils import FrappeTestCase
 
-from rfidenter.rfidenter import api
-from rfidenter.rfidenter import zebra_items
+from rfidenter.rfidenter import api, zebra_items
 
 
 class TestEdgeEvents(FrappeTestCase):
@@ -17,6 +16,8 @@ class TestEdgeEvents(FrappeTestCase):
 		frappe.db.delete("RFID Edge Event", {"device_id": self.device_id})
 		frappe.db.delete("RFID Batch State", {"device_id": self.device_id})
 		frappe.db.delete("RFID Agent Request", {"agent_id": self.agent_id})
+		frappe.db.delete("RFID Seq Tracker", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch Summary", {"device_id": self.device_id})
 
 	def test_event_report_idempotent(self) -> None:
 		args = {
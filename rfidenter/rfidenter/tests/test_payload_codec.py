@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rfidenter.rfidenter import api, payload_codec
+
+
+class TestPayloadCodec(FrappeTestCase):
+	def setUp(self) -> None:
+		frappe.set_user("Administrator")
+		self.device_id = "test-device"
+		self.batch_id = "batch-1"
+		frappe.db.delete("RFID Edge Event", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch State", {"device_id": self.device_id})
+		frappe.db.delete("RFID Seq Tracker", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch Summary", {"device_id": self.device_id})
+
+	def test_large_payload_stored_compressed(self) -> None:
+		payload = {"tags": [f"E200{i:020d}" for i in range(200)]}
+		api.edge_event_report(
+			event_id="evt-codec-1",
+			device_id=self.device_id,
+			batch_id=self.batch_id,
+			seq=1,
+			event_type="ingest_tags",
+			payload=payload,
+		)
+		stored, stored_hash = frappe.db.get_value(
+			"RFID Edge Event", "evt-codec-1", ["payload_json", "payload_hash"]
+		)
+		self.assertTrue(payload_codec.is_encoded(stored))
+		canonical = payload_codec.decode(stored)
+		self.assertEqual(canonical, api._json_dump(payload))
+		self.assertEqual(stored_hash, api._payload_hash(canonical))
+
+		found = api.get_edge_event(event_id="evt-codec-1")
+		self.assertEqual(found["event"]["payload"], payload)
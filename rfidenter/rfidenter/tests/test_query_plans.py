@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import importlib
+import json
+import re
+from functools import partial
+from typing import Any
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rfidenter.rfidenter import api, batch_projection, edge_consumer
+
+INDEX_PATCHES = (
+	"rfidenter.patches.add_edge_event_indexes",
+	"rfidenter.patches.add_edge_event_keyset_indexes",
+	"rfidenter.patches.add_edge_event_replay_index",
+	"rfidenter.patches.add_hot_query_indexes",
+	"rfidenter.patches.add_scale_reading_indexes",
+	"rfidenter.patches.add_scale_reading_replay_index",
+	"rfidenter.patches.add_agent_priority_index",
+)
+
+SEEDED_TABLES = (
+	"RFID Saved Tag",
+	"RFID Saved Tag Day",
+	"RFID Zebra Tag",
+	"RFID Agent Request",
+	"RFID Edge Event",
+	"RFID Scale Reading",
+)
+
+LOCKING_CLAUSE = re.compile(r"\s+FOR\s+UPDATE(\s+SKIP\s+LOCKED)?\s*$", re.I)
+
+
+def _bulk_insert(table: str, columns: list[str], rows: list[tuple[Any, ...]]) -> None:
+	cols = ", ".join(f"`{c}`" for c in columns)
+	row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+	for start in range(0, len(rows), 500):
+		chunk = rows[start : start + 500]
+		frappe.db.sql(
+			f"INSERT IGNORE INTO `tab{table}` ({cols}) VALUES {', '.join([row_sql] * len(chunk))}",
+			tuple(v for row in chunk for v in row),
+		)
+
+
+def _walk(node: Any):
+	if isinstance(node, dict):
+		yield node
+		for value in node.values():
+			yield from _walk(value)
+	elif isinstance(node, list):
+		for value in node:
+			yield from _walk(value)
+
+
+class TestQueryPlans(FrappeTestCase):
+	"""EXPLAIN every hot read path: it must use its index, with no full scan and no filesort."""
+
+	PREFIX = "QPLAN"
+	SEED_ROWS = 2000
+	DEVICES = 20
+	AGENTS = 20
+
+	@classmethod
+	def setUpClass(cls) -> None:
+		super().setUpClass()
+		# A fresh test site marks patches as done without running them; they are idempotent. Each
+		# starts on a clean transaction, since ALTER TABLE is refused after writes.
+		for patch_module in INDEX_PATCHES:
+			frappe.db.commit()
+			importlib.import_module(patch_module).execute()
+		frappe.db.commit()
+		cls.day = frappe.utils.today()
+		cls.device_id = f"{cls.PREFIX.lower()}-device-0"
+		cls.batch_id = f"{cls.PREFIX.lower()}-batch-0"
+		cls.agent_id = f"{cls.PREFIX.lower()}-agent-0"
+		cls._cleanup()
+		cls._seed()
+		# Fresh statistics so the optimizer plans against the seeded distribution, not an empty table.
+		for table in SEEDED_TABLES:
+			frappe.db.sql(f"ANALYZE TABLE `tab{table}`")
+		frappe.db.commit()
+
+	@classmethod
+	def tearDownClass(cls) -> None:
+		cls._cleanup()
+		frappe.db.commit()
+		super().tearDownClass()
+
+	def setUp(self) -> None:
+		frappe.set_user("Administrator")
+
+	@classmethod
+	def _cleanup(cls) -> None:
+		like = f"{cls.PREFIX}%"
+		frappe.db.sql("DELETE FROM `tabRFID Saved Tag` WHERE `name` LIKE %s", (like,))
+		frappe.db.sql("DELETE FROM `tabRFID Saved Tag Day` WHERE `name` LIKE %s", (like,))
+		frappe.db.sql("DELETE FROM `tabRFID Zebra Tag` WHERE `name` LIKE %s", (like,))
+		frappe.db.sql("DELETE FROM `tabRFID Agent Request` WHERE `name` LIKE %s", (like,))
+		frappe.db.sql("DELETE FROM `tabRFID Edge Event` WHERE `name` LIKE %s", (like,))
+		frappe.db.sql("DELETE FROM `tabRFID Scale Reading` WHERE `event_id` LIKE %s", (like,))
+
+	@classmethod
+	def _seed(cls) -> None:
+		now = frappe.utils.now_datetime()
+		statuses = ("Printed", "Processing", "Consumed", "Cancelled")
+		event_types = ("ingest_tags", "event_report", "batch_start", "batch_stop")
+		saved, saved_day, zebra, requests, events, readings = [], [], [], [], [], []
+		for i in range(cls.SEED_ROWS):
+			epc = f"{cls.PREFIX}{i:020X}"
+			seen = frappe.utils.add_to_date(now, seconds=-i)
+			day = frappe.utils.add_days(cls.day, -(i % 10))
+			device = f"{cls.PREFIX.lower()}-device-{i % cls.DEVICES}"
+			agent = f"{cls.PREFIX.lower()}-agent-{i % cls.AGENTS}"
+			saved.append((epc, epc, i, seen, "qplan"))
+			saved_day.append((f"{epc}-{day}", epc, day, i, seen, "qplan"))
+			zebra.append((epc, epc, "QPLAN-ITEM", 1, "Nos", statuses[i % len(statuses)], seen))
+			# Mostly finished requests, a few queued and a few Sent with an expired lease per agent.
+			k = i // cls.AGENTS
+			status = "Queued" if k % 10 == 0 else ("Sent" if k % 10 == 1 else "Done")
+			lease = frappe.utils.add_to_date(now, minutes=-5) if status == "Sent" else None
+			requests.append((f"{epc}-req", f"{epc}-req", agent, "noop", status, 30, i % 3, lease, seen, seen))
+			batch = f"{cls.PREFIX.lower()}-batch-{(i // cls.DEVICES) % 5}"
+			# Most events are consumed; a few per device are still pending for edge_consumer.
+			events.append(
+				(
+					f"{epc}-evt",
+					f"{epc}-evt",
+					device,
+					batch,
+					i,
+					event_types[i % len(event_types)],
+					seen,
+					int(i % 200 >= cls.DEVICES),
+					seen,
+				)
+			)
+			readings.append((f"{epc}-scale", device, i, 1.0, batch, i, seen, seen))
+
+		_bulk_insert("RFID Saved Tag", ["name", "epc", "reads", "last_seen", "device"], saved)
+		_bulk_insert("RFID Saved Tag Day", ["name", "epc", "day", "reads", "last_seen", "device"], saved_day)
+		_bulk_insert(
+			"RFID Zebra Tag", ["name", "epc", "item_code", "qty", "uom", "status", "modified"], zebra
+		)
+		_bulk_insert(
+			"RFID Agent Request",
+			[
+				"name",
+				"request_id",
+				"agent_id",
+				"command",
+				"status",
+				"timeout_sec",
+				"priority",
+				"lease_expires_at",
+				"creation",
+				"modified",
+			],
+			requests,
+		)
+		_bulk_insert(
+			"RFID Edge Event",
+			[
+				"name",
+				"event_id",
+				"device_id",
+				"batch_id",
+				"seq",
+				"event_type",
+				"received_at",
+				"processed",
+				"creation",
+			],
+			events,
+		)
+		_bulk_insert(
+			"RFID Scale Reading",
+			["event_id", "device", "ts_ms", "weight", "batch_id", "seq", "creation", "modified"],
+			readings,
+		)
+
+	def _captured(self, call, table: str) -> list[tuple[str, Any]]:
+		with patch.object(frappe.db, "sql", wraps=frappe.db.sql) as sql:
+			call()
+		statements = []
+		for args, kwargs in sql.call_args_list:
+			query = str(args[0] if args else kwargs.get("query"))
+			values = args[1] if len(args) > 1 else kwargs.get("values")
+			verb = query.lstrip().split(None, 1)[0].upper() if query.strip() else ""
+			if verb in ("SELECT", "UPDATE") and f"`tab{table}`" in query:
+				statements.append((LOCKING_CLAUSE.sub("", query.rstrip()), values))
+		self.assertTrue(statements, f"no statement on {table} captured")
+		return statements
+
+	def _explain(self, query: str, values: Any) -> dict[str, Any]:
+		sql = f"EXPLAIN FORMAT=JSON {query}"
+		rows = frappe.db.sql(sql, values) if values else frappe.db.sql(sql)
+		return json.loads(rows[0][0])
+
+	def assertIndexedPlan(self, call, table: str, keys: str | list[str]) -> None:
+		"""Each statement `call` runs on `table` uses its key in `keys` (one str: all of them), without
+		a full scan or filesort."""
+		statements = self._captured(call, table)
+		if isinstance(keys, str):
+			keys = [keys] * len(statements)
+		self.assertEqual(len(statements), len(keys), [q for q, _ in statements])
+		for (query, values), key in zip(statements, keys, strict=True):
+			plan = self._explain(query, values)
+			detail = f"{query}\n{json.dumps(plan, indent=1, default=str)}"
+			nodes = list(_walk(plan))
+			steps = [n for n in nodes if n.get("table_name") == f"tab{table}" and "access_type" in n]
+			self.assertTrue(steps, f"no access step for {table}:\n{detail}")
+			for step in steps:
+				self.assertNotEqual(step.get("access_type"), "ALL", f"full table scan:\n{detail}")
+				self.assertEqual(step.get("key"), key, f"unexpected index:\n{detail}")
+			# MariaDB nests a `filesort` block, MySQL flags `using_filesort`.
+			self.assertFalse(
+				any("filesort" in n or n.get("using_filesort") is True for n in nodes), f"filesort:\n{detail}"
+			)
+
+	def test_saved_tags_plans(self) -> None:
+		for order, key in (("last", "idx_last_seen"), ("reads", "idx_reads"), ("epc", "epc")):
+			with self.subTest(order=order):
+				self.assertIndexedPlan(
+					lambda o=order: api.get_saved_tags(order=o, limit=50), "RFID Saved Tag", [key]
+				)
+		for order, key in (("last", "idx_day_last_seen"), ("reads", "idx_day_reads"), ("epc", "idx_day_epc")):
+			with self.subTest(order=order, date=self.day):
+				self.assertIndexedPlan(
+					lambda o=order: api.get_saved_tags(order=o, limit=50, date=self.day),
+					"RFID Saved Tag Day",
+					[key],
+				)
+
+	def test_zebra_list_epcs_plan(self) -> None:
+		self.assertIndexedPlan(
+			lambda: api.zebra_list_epcs(limit=100), "RFID Zebra Tag", ["idx_modified_status_epc"]
+		)
+
+	def test_agent_claim_plans(self) -> None:
+		# Lease-expired Sent rows first, then Queued by priority, then one UPDATE leasing them by name.
+		self.assertIndexedPlan(
+			lambda: api.agent_poll(agent_id=self.agent_id, max_items=25),
+			"RFID Agent Request",
+			["idx_agent_status_lease", "idx_agent_status_priority_created", "PRIMARY"],
+		)
+
+	def _assert_keyset_pages(self, key: str, **kwargs) -> None:
+		first = api.query_edge_events(limit=10, **kwargs)
+		self.assertTrue(first.get("next_cursor"), kwargs)
+		self.assertIndexedPlan(lambda: api.query_edge_events(limit=10, **kwargs), "RFID Edge Event", [key])
+		self.assertIndexedPlan(
+			lambda: api.query_edge_events(limit=10, cursor=first["next_cursor"], **kwargs),
+			"RFID Edge Event",
+			[key],
+		)
+
+	def test_query_edge_events_plans(self) -> None:
+		for order in ("received", "received_asc"):
+			with self.subTest(order=order):
+				self._assert_keyset_pages("idx_received_name", order=order)
+			with self.subTest(order=order, event_type="ingest_tags"):
+				self._assert_keyset_pages("idx_type_received_name", order=order, event_type="ingest_tags")
+		with self.subTest(order="seq"):
+			self._assert_keyset_pages(
+				"uniq_device_batch_seq", order="seq", device_id=self.device_id, batch_id=self.batch_id
+			)
+
+	def test_batch_replay_plans(self) -> None:
+		# A small chunk makes the replay page (first page, `>` pages and the whole-timestamp reads).
+		with patch.object(batch_projection, "REPLAY_CHUNK", 25):
+			self.assertGreater(batch_projection.project_device(self.device_id)["events"], 25)
+			replay = partial(batch_projection.project_device, self.device_id)
+			self.assertIndexedPlan(replay, "RFID Edge Event", "idx_device_received_seq")
+			self.assertIndexedPlan(replay, "RFID Scale Reading", "idx_device_creation_seq")
+
+	def test_edge_consumer_claim_plan(self) -> None:
+		# The locked page and the head-of-queue check both walk the pending index in order.
+		self.assertIndexedPlan(
+			lambda: edge_consumer._claim(self.device_id, 10),
+			"RFID Edge Event",
+			"idx_processed_device_received",
+		)
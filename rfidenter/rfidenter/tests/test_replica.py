@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rfidenter.rfidenter import api, replica
+
+
+class TestReplicaRouting(FrappeTestCase):
+	def setUp(self) -> None:
+		frappe.set_user("Administrator")
+		frappe.cache().delete_value(replica.LAG_CACHE_KEY)
+		frappe.cache().delete_value(replica.FAILURE_LOG_KEY)
+
+	def tearDown(self) -> None:
+		frappe.cache().delete_value(replica.LAG_CACHE_KEY)
+		frappe.cache().delete_value(replica.FAILURE_LOG_KEY)
+
+	def test_unusable_replica_falls_back_to_primary(self) -> None:
+		primary = frappe.local.db
+		broken = MagicMock()
+		broken.sql.side_effect = Exception("replica down")
+
+		def fake_connect() -> bool:
+			frappe.local.primary_db = frappe.local.db
+			frappe.local.replica_db = broken
+			frappe.local.db = broken
+			return True
+
+		with (
+			patch.object(replica, "_replica_enabled", return_value=True),
+			patch.object(frappe, "connect_replica", side_effect=fake_connect) as connect,
+		):
+			res = api.list_antenna_rules()
+			self.assertTrue(res.get("ok"))
+			self.assertIs(frappe.local.db, primary)
+			self.assertFalse(hasattr(frappe.local, "primary_db"))
+			self.assertEqual(connect.call_count, 1)
+
+			# The failed lag check is cached, so the next read skips the replica entirely.
+			api.list_antenna_rules()
+			self.assertEqual(connect.call_count, 1)
+
+	def test_failed_lag_probe_logged_once_on_primary(self) -> None:
+		primary = frappe.local.db
+		denied = MagicMock()
+		denied.sql.side_effect = Exception("Access denied; you need the REPLICA MONITOR privilege")
+		logged_on = []
+
+		def fake_connect() -> bool:
+			frappe.local.primary_db = frappe.local.db
+			frappe.local.replica_db = denied
+			frappe.local.db = denied
+			return True
+
+		with (
+			patch.object(replica, "_replica_enabled", return_value=True),
+			patch.object(frappe, "connect_replica", side_effect=fake_connect) as connect,
+			patch.object(frappe, "log_error", side_effect=lambda **kw: logged_on.append(frappe.local.db)),
+		):
+			for _ in range(2):
+				# Expire the cached verdict so each read probes again.
+				frappe.cache().delete_value(replica.LAG_CACHE_KEY)
+				self.assertTrue(api.list_antenna_rules().get("ok"))
+
+		self.assertEqual(connect.call_count, 2)
+		self.assertEqual(logged_on, [primary])
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import time
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rfidenter.rfidenter import api, retention, site_settings
+
+
+class TestRetention(FrappeTestCase):
+	def setUp(self) -> None:
+		frappe.set_user("Administrator")
+		self.device_id = "test-device"
+		self.batch_id = "batch-1"
+		self.agent_id = "agent-1"
+		frappe.db.delete("RFID Edge Event", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch State", {"device_id": self.device_id})
+		frappe.db.delete("RFID Agent Request", {"agent_id": self.agent_id})
+		frappe.db.delete("RFID Seq Tracker", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch Summary", {"device_id": self.device_id})
+
+	def test_retention_purges_only_expired_rows(self) -> None:
+		old_req = api.agent_enqueue(agent_id=self.agent_id, command="ping", args={}, timeout_sec=5).get(
+			"request_id"
+		)
+		new_req = api.agent_enqueue(agent_id=self.agent_id, command="ping", args={}, timeout_sec=5).get(
+			"request_id"
+		)
+		old = frappe.utils.add_days(frappe.utils.now_datetime(), -30)
+		frappe.db.set_value("RFID Agent Request", old_req, "status", "Done", update_modified=False)
+		frappe.db.sql("UPDATE `tabRFID Agent Request` SET `modified`=%s WHERE `name`=%s", (old, old_req))
+
+		for seq, event_id in enumerate(("evt-ret-processed", "evt-ret-pending"), start=1):
+			api.edge_event_report(
+				event_id=event_id,
+				device_id=self.device_id,
+				batch_id=self.batch_id,
+				seq=seq,
+				event_type="weight",
+			)
+			frappe.db.set_value("RFID Edge Event", event_id, "received_at", old, update_modified=False)
+		frappe.db.set_value("RFID Edge Event", "evt-ret-processed", "processed", 1, update_modified=False)
+		frappe.db.set_value("RFID Edge Event", "evt-ret-pending", "processed", 0, update_modified=False)
+
+		with patch.object(
+			site_settings,
+			"get",
+			side_effect=lambda key, default=None: (
+				{"RFID Edge Event": {"days": 7}} if key == "rfidenter_retention" else default
+			),
+		):
+			policies = retention.get_policies()
+		deadline = time.monotonic() + 60
+		req = retention.purge_doctype(
+			"RFID Agent Request", policies["RFID Agent Request"], chunk=50, deadline=deadline
+		)
+		evt = retention.purge_doctype(
+			"RFID Edge Event", policies["RFID Edge Event"], chunk=50, deadline=deadline
+		)
+
+		self.assertGreaterEqual(req.get("deleted"), 1)
+		self.assertTrue(req.get("complete"))
+		self.assertFalse(frappe.db.exists("RFID Agent Request", old_req))
+		self.assertTrue(frappe.db.exists("RFID Agent Request", new_req))
+		self.assertGreaterEqual(evt.get("deleted"), 1)
+		self.assertFalse(frappe.db.exists("RFID Edge Event", "evt-ret-processed"))
+		self.assertTrue(frappe.db.exists("RFID Edge Event", "evt-ret-pending"))
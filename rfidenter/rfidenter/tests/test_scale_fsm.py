@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import unittest
+
+from rfidenter.rfidenter import scale_fsm
+
+
+class TestScaleFsm(unittest.TestCase):
+	def test_single_placement_locks_once(self) -> None:
+		ts = list(range(0, 6000, 50))
+		weights = [0.0 if t < 1000 or t >= 4000 else 5.0 for t in ts]
+		result = scale_fsm.run(ts, weights)
+
+		self.assertEqual(len(result["locks"]), 1)
+		self.assertAlmostEqual(result["locks"][0]["weight"], 5.0, places=2)
+		self.assertEqual(result["pauses"], [])
+		self.assertEqual(result["state"], scale_fsm.WAIT_EMPTY)
+
+	def test_moving_load_after_lock_pauses(self) -> None:
+		ts = list(range(0, 6000, 50))
+		weights = [0.0 if t < 1000 else (5.0 if t < 3000 else 5.5) for t in ts]
+		result = scale_fsm.run(ts, weights)
+
+		self.assertEqual(len(result["locks"]), 1)
+		self.assertEqual(len(result["pauses"]), 1)
+		self.assertEqual(result["state"], scale_fsm.PAUSED)
+
+	def test_default_params_on_synthetic_stream(self) -> None:
+		row = scale_fsm.benchmark(placements=100, seed=7)[0]
+
+		self.assertEqual(row["placements"], 100)
+		self.assertLessEqual(row["missed"], 10)
+		self.assertLess(row["false_lock_rate"], 0.1)
+		self.assertIsNotNone(row["latency_ms_p95"])
+
+	def test_shared_filters_match_fresh_runs(self) -> None:
+		stream = scale_fsm.generate_stream(20, seed=3)
+		filters: dict = {}
+		for overrides in scale_fsm.default_grid():
+			shared = scale_fsm.run(stream["ts"], stream["weights"], overrides, filters=filters)
+			self.assertEqual(shared, scale_fsm.run(stream["ts"], stream["weights"], overrides))
+
+		# One fast EMA for the whole grid, one tracking EMA per slow time constant.
+		self.assertEqual(len(filters), 1 + 3)
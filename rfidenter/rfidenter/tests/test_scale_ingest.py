@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rfidenter.rfidenter import api, scale_stream
+
+
+class TestScaleIngest(FrappeTestCase):
+	def setUp(self) -> None:
+		frappe.set_user("Administrator")
+		self.device_id = "test-device"
+		self.batch_id = "batch-1"
+		frappe.db.delete("RFID Edge Event", {"device_id": self.device_id})
+		frappe.db.delete("RFID Scale Reading", {"device": self.device_id})
+		frappe.db.delete("RFID Batch State", {"device_id": self.device_id})
+		frappe.db.delete("RFID Seq Tracker", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch Summary", {"device_id": self.device_id})
+		frappe.cache().delete_keys(f"{scale_stream.SEQ_SEEN_PREFIX}{self.device_id}:")
+
+	def test_scale_deadband_suppresses_small_moves(self) -> None:
+		scale = "test-scale"
+		frappe.cache().delete_value(f"{scale_stream.DEADBAND_PREFIX}{scale}")
+		ts = 1_730_000_000_000
+		readings = (
+			(1.000, False, True),  # first reading
+			(1.002, False, False),  # within epsilon
+			(1.002, True, True),  # stable flag flipped
+			(1.500, True, True),  # moved beyond epsilon
+			(1.500, True, False),  # unchanged
+		)
+		for i, (weight, stable, expect_published) in enumerate(readings):
+			res = api.ingest_scale_weight(device=scale, weight=weight, stable=stable, ts=ts + i * 100)
+			self.assertEqual(
+				res.get("published", False) and not res.get("suppressed"), expect_published, (i, res)
+			)
+
+		keepalive = api.ingest_scale_weight(device=scale, weight=1.5, stable=True, ts=ts + 60_000)
+		self.assertEqual(keepalive.get("reason"), "keepalive")
+		self.assertEqual(api.get_scale_weight(device=scale).get("suppressed_total"), 2)
+
+	def test_scale_retry_after_store_or_rollback(self) -> None:
+		frappe.cache().delete_value(f"{scale_stream.DEADBAND_PREFIX}{self.device_id}")
+		ts = 1_730_000_000_000
+
+		def send(event_id: str, weight: float, seq: int, offset: int) -> dict:
+			return api.ingest_scale_weight(
+				device=self.device_id,
+				weight=weight,
+				ts=ts + offset,
+				event_id=event_id,
+				batch_id=self.batch_id,
+				seq=seq,
+			)
+
+		self.assertTrue(send("evt-scale-r1", 3.0, 1, 0).get("published"))
+		# A retry of a stored reading is a duplicate, not a deadband suppression.
+		retry = send("evt-scale-r1", 3.0, 1, 0)
+		self.assertTrue(retry.get("duplicate"))
+		self.assertFalse(retry.get("suppressed"))
+
+		self.assertTrue(send("evt-scale-r2", 4.0, 2, 100).get("published"))
+		frappe.db.rollback()
+		# The rolled-back reading no longer holds the deadband, so its retry is stored.
+		again = send("evt-scale-r2", 4.0, 2, 100)
+		self.assertTrue(again.get("published"), again)
+		self.assertTrue(frappe.db.exists("RFID Scale Reading", {"event_id": "evt-scale-r2"}))
+
+	def test_scale_batch_ingest(self) -> None:
+		frappe.cache().delete_value(f"{scale_stream.DEADBAND_PREFIX}{self.device_id}")
+		ts = 1_730_000_000_000
+		readings = [
+			{"weight": 2.0, "stable": False, "ts": ts, "event_id": "evt-scale-b1", "seq": 1},
+			{"weight": 2.001, "stable": False, "ts": ts + 50, "event_id": "evt-scale-b2", "seq": 2},
+			{"weight": 2.4, "stable": True, "ts": ts + 100, "event_id": "evt-scale-b3", "seq": 3},
+			{"weight": "bad", "ts": ts + 150},
+		]
+		res = api.ingest_scale_weights(device=self.device_id, batch_id=self.batch_id, readings=readings)
+		self.assertEqual(
+			(res.get("rejected"), res.get("passed"), res.get("suppressed"), res.get("inserted")), (1, 2, 1, 2)
+		)
+		stored = frappe.db.get_value(
+			"RFID Scale Reading",
+			{"event_id": "evt-scale-b3"},
+			["ts_ms", "weight", "unit_code", "stable"],
+			as_dict=True,
+		)
+		self.assertEqual(
+			(stored.ts_ms, stored.weight, stored.unit_code, stored.stable), (ts + 100, 2.4, 1, 1)
+		)
+		self.assertFalse(frappe.db.exists("RFID Scale Reading", {"event_id": "evt-scale-b2"}))
+		self.assertFalse(frappe.db.exists("RFID Edge Event", {"device_id": self.device_id}))
+		self.assertEqual(
+			frappe.db.get_value("RFID Batch State", {"device_id": self.device_id}, "last_event_seq"), 3
+		)
+		self.assertEqual(api.get_scale_weight(device=self.device_id)["reading"].get("weight"), 2.4)
+
+		rollup = api.get_scale_rollup(device=self.device_id, since_ms=ts, until_ms=ts + 1000, bucket_ms=1000)
+		self.assertEqual(len(rollup["points"]), 1)
+		bucket = rollup["points"][0]
+		self.assertEqual(
+			(bucket["min"], bucket["max"], bucket["count"], bucket["stable_count"]), (2.0, 2.4, 2, 1)
+		)
+
+		frappe.cache().delete_value(f"{scale_stream.DEADBAND_PREFIX}{self.device_id}")
+		replay = api.ingest_scale_weights(
+			device=self.device_id, batch_id=self.batch_id, readings=readings[2:3]
+		)
+		self.assertEqual((replay.get("inserted"), replay.get("duplicates")), (0, 1))
+
+		# A bridge retry re-sends the suppressed reading too; the seq tracker counts each seq once.
+		api.ingest_scale_weights(device=self.device_id, batch_id=self.batch_id, readings=readings[:3])
+		tracker = frappe.db.get_value(
+			"RFID Seq Tracker", {"device_id": self.device_id, "batch_id": self.batch_id}, "event_count"
+		)
+		self.assertEqual(tracker, 3)
+
+	def test_scale_history_downsampled(self) -> None:
+		frappe.cache().delete_value(f"{scale_stream.HISTORY_PREFIX}{self.device_id}")
+		base = (int(frappe.utils.now_datetime().timestamp() * 1000) // 1000) * 1000 - 5000
+		readings = [{"weight": w, "ts": base + i * 100} for i, w in enumerate((1.0, 3.0, 2.0))]
+		readings.append({"weight": 5.0, "ts": base + 1500})
+		api.ingest_scale_weights(device=self.device_id, readings=readings)
+
+		res = api.get_scale_history(device=self.device_id, since_ms=base, bucket_ms=1000)
+		self.assertEqual(res.get("raw"), 4)
+		first, second = res["points"]
+		self.assertEqual((first["min"], first["max"], first["mean"], first["count"]), (1.0, 3.0, 2.0, 3))
+		self.assertEqual((second["ts"], second["count"]), (base + 1000, 1))
+
+	def test_scale_weights_multi_device(self) -> None:
+		other = f"{self.device_id}-2"
+		missing = f"{self.device_id}-missing"
+		for key in (self.device_id, other, missing):
+			frappe.cache().delete_value(f"{api.SCALE_CACHE_PREFIX}{key}")
+			frappe.cache().delete_value(f"{scale_stream.DEADBAND_PREFIX}{key}")
+		api.ingest_scale_weight(device=self.device_id, weight=1.25, stable=True)
+		api.ingest_scale_weight(device=other, weight=7.5, stable=False)
+
+		res = api.get_scale_weights(devices=[self.device_id, other, missing])
+		items = {item["device"]: item for item in res["items"]}
+		self.assertEqual(items[self.device_id]["reading"].get("weight"), 1.25)
+		self.assertEqual(items[other]["reading"].get("weight"), 7.5)
+		self.assertGreaterEqual(items[other]["age_ms"], 0)
+		self.assertFalse(items[missing]["ok"])
+		self.assertFalse(api.get_scale_weight(device=missing).get("ok"))
+
+		everyone = api.get_scale_weights(devices="*")
+		self.assertTrue(everyone["wildcard"])
+		self.assertTrue({self.device_id, other} <= {item["device"] for item in everyone["items"]})
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rfidenter.rfidenter import api
+
+
+class TestSeqTracker(FrappeTestCase):
+	def setUp(self) -> None:
+		frappe.set_user("Administrator")
+		self.device_id = "test-device"
+		self.batch_id = "batch-1"
+		frappe.db.delete("RFID Edge Event", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch State", {"device_id": self.device_id})
+		frappe.db.delete("RFID Seq Tracker", {"device_id": self.device_id})
+		frappe.db.delete("RFID Batch Summary", {"device_id": self.device_id})
+
+	def test_seq_tracker_flags_gap_and_regression(self) -> None:
+		for event_id, seq in (("evt-gap-1", 1), ("evt-gap-2", 4)):
+			api.edge_event_report(
+				event_id=event_id,
+				device_id=self.device_id,
+				batch_id=self.batch_id,
+				seq=seq,
+				event_type="weight",
+				payload={"value": 1.0},
+			)
+		frappe.local.response = frappe._dict()
+		res = api.edge_event_report(
+			event_id="evt-gap-3",
+			device_id=self.device_id,
+			batch_id=self.batch_id,
+			seq=2,
+			event_type="weight",
+			payload={"value": 1.0},
+		)
+		self.assertEqual(res.get("code"), "SEQ_REGRESSION")
+
+		out = api.list_seq_anomalies(device_id=self.device_id)
+		items = [row for row in out.get("items") or [] if row.get("batch_id") == self.batch_id]
+		self.assertEqual(len(items), 1)
+		self.assertEqual(items[0].get("first_seq"), 1)
+		self.assertEqual(items[0].get("last_seq"), 4)
+		self.assertEqual(items[0].get("missing"), 2)
+		self.assertEqual(items[0].get("regression_count"), 1)
@@ -8,6 +8,8 @@ from typing import Any
 
 import frappe
 
+from rfidenter.rfidenter import site_settings
+
 
 STALE_CLAIM_SEC = 120
 
@@ -139,21 +141,13 @@ def _finish_dedupe(
 	doc.save(ignore_permissions=True)
 
 
-def _get_site_setting(key: str, default: Any = None) -> Any:
-	try:
-		site_conf = frappe.get_site_config(silent=True) or {}
-	except Exception:
-		site_conf = {}
-	return site_conf.get(key, frappe.conf.get(key, default))
-
-
 def _consume_requires_ant_match() -> bool:
 	"""Whether Zebra consume must match `consume_ant_id`.
 
 	Default: False (any antenna read can consume).
 	"""
 
-	raw = _get_site_setting("rfidenter_zebra_consume_requires_ant_match", False)
+	raw = site_settings.get("rfidenter_zebra_consume_requires_ant_match", False)
 	if isinstance(raw, bool):
 		return raw
 	s = str(raw or "").strip().lower()
@@ -163,7 +157,7 @@ def _consume_requires_ant_match() -> bool:
 def _processing_claim_ttl_sec() -> int:
 	"""Seconds after which a stuck Processing tag can be reclaimed."""
 
-	raw = _get_site_setting("rfidenter_zebra_processing_ttl_sec", 180)
+	raw = site_settings.get("rfidenter_zebra_processing_ttl_sec", 180)
 	try:
 		value = int(float(raw))
 	except Exception:
@@ -179,7 +173,7 @@ def _get_epc_prefix() -> str:
 	This exists to reduce the chance of conflicts with other tags in the environment.
 	"""
 
-	prefix = _normalize_hex(_get_site_setting("rfidenter_zebra_epc_prefix", "5A42") or "")
+	prefix = _normalize_hex(site_settings.get("rfidenter_zebra_epc_prefix", "5A42") or "")
 	if not prefix:
 		return ""
 	# Ensure even length and cap so total length stays within 24 hex chars (96-bit EPC).